@@ -9,11 +9,19 @@ __author__ = "Neil Leiser"
 
 # Write your classes here
 import random
+from array import array
+from collections import deque
 
 class Card(object):
     """
     A class to define a basic card
     """
+    __slots__ = ('_number', '_colour', '_pick', '_code')
+
+    # how matches compares cards, used to index the cards in a deck
+    _matches_number = True
+    _matches_any = False
+
     def __init__(self,number,colour):
         """
         Define a card by its number and its colour
@@ -25,6 +33,8 @@ class Card(object):
         self._number = number
         self._colour = colour
         self._pick = 0
+        # the encoding of shared cards, which cannot be modified
+        self._code = None
 
     def get_number(self):
         """
@@ -42,18 +52,26 @@ class Card(object):
         """
         Sets the number of the card
 
+        Raises AttributeError if the card is shared
+
         Parameters:
         number(int): The number assigned to the card
         """
+        if self._code is not None:
+            raise AttributeError("cannot change the number of a shared card")
         self._number = number
 
     def set_colour(self,colour):
         """
         Changes the colour of the card
 
+        Raises AttributeError if the card is shared
+
         Parameters:
         colour(CardColour): The colour assigned to the card
         """
+        if self._code is not None:
+            raise AttributeError("cannot change the colour of a shared card")
         self._colour = colour
         
     def get_pickup_amount(self):
@@ -102,6 +120,9 @@ class SkipCard(Card):
     Subclass of Card
     Special Card which skips the turn of the next player
     """
+    __slots__ = ()
+    _matches_number = False
+
     def __init__(self,number,colour):
         """
         Define a card by its number and its colour
@@ -151,6 +172,9 @@ class ReverseCard(Card):
     Subclass of Card
     Special Card which reverses the order of turns
     """
+    __slots__ = ()
+    _matches_number = False
+
     def __init__(self,number,colour):
         """
         Define a card by its number and its colour
@@ -201,6 +225,9 @@ class Pickup2Card(Card):
     Subclass of Card
     Special Card which makes the next player pickup two cards
     """
+    __slots__ = ()
+    _matches_number = False
+
     def __init__(self,number,colour):
         """
         Define a card by its number and its colour
@@ -231,7 +258,7 @@ class Pickup2Card(Card):
         Perform a special card action
         Makes the next player pickup two cards
         """
-        game.get_turns().peak().get_deck().add_cards(game.pickup_pile.pick(2))
+        game.get_turns().peak().get_deck().add_cards(game.pickup(2))
 
     def __str__(self):
         """
@@ -251,6 +278,9 @@ class Pickup4Card(Card):
     Subclass of Card
     Special Card which makes the next player pickup four cards
     """
+    __slots__ = ()
+    _matches_any = True
+
     def __init__(self,number,colour):
         """
         Define a card by its number and its colour
@@ -278,7 +308,7 @@ class Pickup4Card(Card):
         Perform a special card action
         Makes the next player pickup four cards
         """
-        game.get_turns().peak().get_deck().add_cards(game.pickup_pile.pick(4))
+        game.get_turns().peak().get_deck().add_cards(game.pickup(4))
 
     def __str__(self):
         """
@@ -293,10 +323,108 @@ class Pickup4Card(Card):
         """
         return "Pickup4Card({0}, {1})".format(self._number,self._colour)
 
+class HandIndex(object):
+    """
+    An index of the cards in a deck by colour and by number, used to find the
+    first card in the deck which matches a card without checking every card
+    """
+    __slots__ = ('_cards', '_colours', '_numbers', '_any', '_next', '_size')
+
+    def __init__(self, cards):
+        """
+        Index a list of cards
+
+        parameters:
+        cards(list<Card>): The cards to index, in deck order
+        """
+        # the cards in the deck, by their position in the order they were added
+        self._cards = {}
+        self._colours = {}
+        self._numbers = {}
+        self._any = deque()
+        self._next = 0
+        self._size = 0
+
+        for card in cards:
+            self.add(card)
+
+    def get_size(self):
+        """
+        Returns the amount of cards in the index
+        """
+        return self._size
+
+    def add(self, card):
+        """
+        Add a card after every card already in the index
+
+        parameters:
+        card(Card): The card to add
+        """
+        position = self._next
+        self._next += 1
+        self._size += 1
+        self._cards[position] = card
+
+        if card._matches_any:
+            self._any.append(position)
+            return
+
+        bucket = self._colours.get(card._colour)
+        if bucket is None:
+            bucket = self._colours[card._colour] = deque()
+        bucket.append(position)
+
+        if card._matches_number:
+            bucket = self._numbers.get(card._number)
+            if bucket is None:
+                bucket = self._numbers[card._number] = deque()
+            bucket.append(position)
+
+    def find(self, top):
+        """
+        Returns the position of the first card which matches the top card
+        Returns None if no card matches
+
+        parameters:
+        top(Card): The card that has to be matched
+        """
+        cards = self._cards
+        first = None
+
+        for bucket in (self._colours.get(top._colour),
+                       self._numbers.get(top._number), self._any):
+            if not bucket:
+                continue
+
+            # cards are removed from buckets lazily
+            while bucket[0] not in cards:
+                bucket.popleft()
+                if not bucket:
+                    break
+            else:
+                if first is None or bucket[0] < first:
+                    first = bucket[0]
+
+        return first
+
+    def remove(self, position):
+        """
+        Remove a card from the index and return it
+
+        parameters:
+        position(int): The position of the card, as returned by find
+        """
+        self._size -= 1
+        return self._cards.pop(position)
+
+
 class Deck(object):
     """
     A Collection of ordered Uno cards
     """
+    __slots__ = ('_cards', '_length', '_rng', '_index', '_frozen')
+
     def __init__(self,starting_cards=None):
         """
         Defines a deck
@@ -311,11 +439,23 @@ class Deck(object):
             self._cards = starting_cards
             
         self._length = len(self._cards)
+        self._rng = random
+        self._index = None
+        # the cards as of the last snapshot, None once the deck has changed
+        self._frozen = None
         
     def get_cards(self):
         """
         Returns a list of cards in the deck
-        """
+        The list is the deck's own, and may be changed by the caller, so the
+        last snapshot is no longer reused once the list is handed out
+        A list kept across a later snapshot must be fetched again with
+        get_cards before it is changed, or that snapshot is reused
+        Subclasses may store their cards otherwise, so callers which do not
+        know the class of a deck take cards off it with pick_at, not by
+        changing the cards returned
+        """
+        self._frozen = None
         return self._cards
 
     def get_amount(self):
@@ -325,11 +465,30 @@ class Deck(object):
         self._length = len(self._cards) 
         return self._length
 
+    def get_rng(self):
+        """
+        Returns the random number generator used to shuffle the deck
+        """
+        return self._rng
+
+    def set_rng(self, rng):
+        """
+        Sets the source of randomness used to shuffle the deck
+
+        parameters:
+        rng(random.Random|int): random number generator to shuffle with,
+        or a seed to construct one from (None for the global random module)
+        """
+        self._rng = a2_support.make_rng(rng)
+
     def shuffle(self):
         """
         Shuffle the order of the cards in the deck
         """
-        random.shuffle(self._cards)
+        self._rng.shuffle(self._cards)
+        self._frozen = None
+        if self._index is not None:
+            self._index = HandIndex(self._cards)
 
     def pick(self, amount=1):
         """
@@ -338,20 +497,24 @@ class Deck(object):
         parameters:
         amount(int): the number of cards to be removed from the top of the deck
         """
-        pick_cards = []
-        
         if amount == None:
-            pick_cards = []
             return None
-        
-        elif self._cards ==0:
-            return None
-        
-        else:
-            for i in range(0,amount):
-                pick_cards.append(self._cards.pop(-1))
-            self._length = len(self._cards)
-            return pick_cards
+
+        cards = self._cards
+        if amount < 1:
+            return []
+        if amount > len(cards):
+            raise IndexError("not enough cards in the deck to pick")
+
+        # the top card of the deck is picked first
+        pick_cards = cards[:-amount - 1:-1]
+        del cards[-amount:]
+
+        self._length = len(cards)
+        self._frozen = None
+        if self._index is not None:
+            self._index = HandIndex(cards)
+        return pick_cards
 
     def add_card(self, card):
         """
@@ -362,6 +525,9 @@ class Deck(object):
         """
         self._cards.append(card)
         self._length = len(self._cards)
+        self._frozen = None
+        if self._index is not None:
+            self._index.add(card)
 
     def add_cards(self, cards):
         """
@@ -370,9 +536,87 @@ class Deck(object):
         parameters:
         card(list<Card>): list of cards to be placed on top of the deck
         """
-        for i in range(0,len(cards)):
-            self._cards.append(cards[i])
+        self._cards.extend(cards)
         self._length = len(self._cards)
+        self._frozen = None
+        if self._index is not None:
+            for card in cards:
+                self._index.add(card)
+
+    def enable_index(self):
+        """
+        Index the cards in the deck by colour and by number, so pick_match
+        does not check every card in the deck
+
+        The index is kept up to date by the methods of the deck, and is rebuilt
+        if the amount of cards in get_cards() is changed directly
+        """
+        self._index = HandIndex(self._cards)
+
+    def pick_match(self, top):
+        """
+        Take the first card in the deck which matches the top card off the
+        deck and return it
+        Returns None if no card matches
+
+        parameters:
+        top(Card): The card that has to be matched
+        """
+        cards = self._cards
+        index = self._index
+
+        if index is not None:
+            if index.get_size() != len(cards):
+                index = self._index = HandIndex(cards)
+
+            position = index.find(top)
+            if position is None:
+                return None
+
+            # equal cards are shared, the first in the deck was found
+            card = index.remove(position)
+            cards.remove(card)
+            self._length = len(cards)
+            self._frozen = None
+            return card
+
+        if top is not None and top._code is not None:
+            # shared cards are matched with a lookup in the match table
+            accepts = a2_support.MATCH_TABLE[top._code]
+            for i, card in enumerate(cards):
+                code = card._code
+                if accepts[code] if code is not None else card.matches(top):
+                    del cards[i]
+                    self._length -= 1
+                    self._frozen = None
+                    return card
+            return None
+
+        for i, card in enumerate(cards):
+            if card.matches(top):
+                del cards[i]
+                self._length -= 1
+                self._frozen = None
+                return card
+
+        return None
+
+    def pick_at(self, position):
+        """
+        Take the card at a position in the deck off the deck and return it
+
+        parameters:
+        position(int): the index of the card in get_cards()
+        """
+        cards = self._cards
+        card = cards[position]
+        del cards[position]
+
+        self._length = len(cards)
+        self._frozen = None
+        if self._index is not None:
+            self._index = HandIndex(cards)
+        return card
 
     def top(self):
         """
@@ -384,10 +628,472 @@ class Deck(object):
         else:
             return self._cards[-1]
 
+    def snapshot(self):
+        """
+        Returns the cards in the deck as a tuple, bottom card first
+        The same tuple is returned until the deck changes, so snapshots share
+        the cards of decks which have not changed between them
+        """
+        if self._frozen is None:
+            self._frozen = tuple(self._cards)
+        return self._frozen
+
+    def restore(self, snapshot):
+        """
+        Replace the cards in the deck with the cards of a snapshot
+        Does nothing if the deck has not changed since the snapshot was taken
+
+        parameters:
+        snapshot(tuple<Card>): cards returned by snapshot
+        """
+        if snapshot is self._frozen:
+            return
+
+        self._cards[:] = snapshot
+        self._length = len(snapshot)
+        self._frozen = snapshot
+        if self._index is not None:
+            self._index = HandIndex(self._cards)
+
+
+class LazyDeck(Deck):
+    """
+    Subclass of Deck
+    A deck which shuffles its cards as they are picked, rather than all at
+    once, so shuffling costs nothing and picking a card costs one step of a
+    Fisher-Yates shuffle
+
+    With a random number generator of its own, a lazy deck picks the same
+    cards as a deck shuffled by Deck.shuffle
+    """
+    __slots__ = ('_unsettled',)
+
+    def __init__(self, starting_cards=None):
+        """
+        Defines a deck
+
+        Parameters:
+        cards(list<Card>): A list of all the cards in the deck
+        (None if deck is empty)
+        """
+        super().__init__(starting_cards)
+        # the amount of cards at the bottom of the deck still to be shuffled
+        self._unsettled = 0
+
+    def _settle(self, amount):
+        """
+        Shuffle cards until the top 'amount' cards of the deck are in order
+
+        parameters:
+        amount(int): the number of cards which must be in order
+        """
+        cards = self._cards
+        unsettled = self._unsettled
+        randrange = self._rng.randrange
+
+        # the same steps as random.shuffle, from the top of the deck down
+        while unsettled and len(cards) - unsettled < amount:
+            position = unsettled - 1
+            if position:
+                swap = randrange(unsettled)
+                cards[position], cards[swap] = cards[swap], cards[position]
+            unsettled = position
+
+        self._unsettled = unsettled
+
+    def get_cards(self):
+        """
+        Returns a list of cards in the deck
+        Finishes shuffling the deck
+        """
+        self._settle(len(self._cards))
+        return super().get_cards()
+
+    def shuffle(self):
+        """
+        Shuffle the order of the cards in the deck
+        The cards are shuffled as they are picked
+        """
+        self._unsettled = len(self._cards)
+        self._frozen = None
+        if self._index is not None:
+            self.enable_index()
+
+    def pick(self, amount=1):
+        """
+        Take the first 'amount' of cards off the deck and return them
+
+        parameters:
+        amount(int): the number of cards to be removed from the top of the deck
+        """
+        cards = self._cards
+
+        if amount == 1 and cards and self._index is None:
+            # settle and pick the top card in one step, as most picks are single
+            position = len(cards) - 1
+            if position < self._unsettled:
+                self._unsettled = position
+                if position:
+                    swap = self._rng.randrange(position + 1)
+                    cards[position], cards[swap] = cards[swap], cards[position]
+            self._length = position
+            self._frozen = None
+            return [cards.pop()]
+
+        if amount is not None and 0 < amount <= len(cards):
+            self._settle(amount)
+        return super().pick(amount)
+
+    def enable_index(self):
+        """
+        Index the cards in the deck by colour and by number, so pick_match
+        does not check every card in the deck
+        Finishes shuffling the deck
+        """
+        self._settle(len(self._cards))
+        super().enable_index()
+
+    def pick_match(self, top):
+        """
+        Take the first card in the deck which matches the top card off the
+        deck and return it
+        Returns None if no card matches
+        Finishes shuffling the deck
+
+        parameters:
+        top(Card): The card that has to be matched
+        """
+        self._settle(len(self._cards))
+        return super().pick_match(top)
+
+    def pick_at(self, position):
+        """
+        Take the card at a position in the deck off the deck and return it
+        Finishes shuffling the deck
+
+        parameters:
+        position(int): the index of the card in get_cards()
+        """
+        self._settle(len(self._cards))
+        return super().pick_at(position)
+
+    def top(self):
+        """
+        Peaks the card on top of the deck and returns it
+        Returns None if the deck is empty
+        """
+        self._settle(1)
+        return super().top()
+
+    def snapshot(self):
+        """
+        Returns the cards in the deck as a tuple, bottom card first
+        Finishes shuffling the deck
+        """
+        self._settle(len(self._cards))
+        return super().snapshot()
+
+    def restore(self, snapshot):
+        """
+        Replace the cards in the deck with the cards of a snapshot
+
+        parameters:
+        snapshot(tuple<Card>): cards returned by snapshot
+        """
+        super().restore(snapshot)
+        self._unsettled = 0
+
+
+class DequeDeck(Deck):
+    """
+    Subclass of Deck
+    A deck which stores its cards in a deque
+    """
+    __slots__ = ()
+
+    def __init__(self, starting_cards=None):
+        """
+        Defines a deck
+
+        Parameters:
+        cards(iterable<Card>): The cards in the deck
+        (None if deck is empty)
+        """
+        super().__init__(deque(starting_cards or ()))
+
+    def get_cards(self):
+        """
+        Returns the deque of cards in the deck
+        The deque is the deck's own, and may be changed by the caller, but
+        cannot be sliced
+        """
+        return super().get_cards()
+
+    def shuffle(self):
+        """
+        Shuffle the order of the cards in the deck
+        """
+        cards = list(self._cards)
+        self._rng.shuffle(cards)
+        self._cards.clear()
+        self._cards.extend(cards)
+        self._frozen = None
+        if self._index is not None:
+            self._index = HandIndex(self._cards)
+
+    def pick(self, amount=1):
+        """
+        Take the first 'amount' of cards off the deck and return them
+
+        parameters:
+        amount(int): the number of cards to be removed from the top of the deck
+        """
+        if amount == None:
+            return None
+
+        cards = self._cards
+        if amount > len(cards):
+            raise IndexError("not enough cards in the deck to pick")
+
+        pick_cards = [cards.pop() for _ in range(amount)]
+
+        self._length = len(cards)
+        self._frozen = None
+        if self._index is not None:
+            self._index = HandIndex(cards)
+        return pick_cards
+
+    def restore(self, snapshot):
+        """
+        Replace the cards in the deck with the cards of a snapshot
+
+        parameters:
+        snapshot(tuple<Card>): cards returned by snapshot
+        """
+        if snapshot is self._frozen:
+            return
+
+        self._cards.clear()
+        self._cards.extend(snapshot)
+        self._length = len(snapshot)
+        self._frozen = snapshot
+        if self._index is not None:
+            self._index = HandIndex(self._cards)
+
+
+class CodeDeck(Deck):
+    """
+    Subclass of Deck
+    A deck which stores the codes of its cards in an array
+    Cards are returned as the shared card for their code
+    """
+    __slots__ = ()
+
+    def __init__(self, starting_cards=None):
+        """
+        Defines a deck
+
+        Parameters:
+        cards(iterable<Card>): The cards in the deck
+        (None if deck is empty)
+        """
+        super().__init__(array('H', map(a2_support.encode_card,
+                                        starting_cards or ())))
+
+    @classmethod
+    def from_codes(cls, codes):
+        """
+        Defines a deck from the codes of its cards, without encoding cards
+
+        Parameters:
+        codes(iterable<int>): The codes of the cards in the deck
+        """
+        deck = cls()
+        deck._cards.extend(codes)
+        deck._length = len(deck._cards)
+        return deck
+
+    def get_cards(self):
+        """
+        Returns a new list of the cards in the deck
+        Changing the list does not change the deck
+        """
+        return a2_support.decode_cards(self._cards)
+
+    def get_codes(self):
+        """
+        Returns the array of the codes of the cards in the deck
+        """
+        # the array may be changed by the caller
+        self._frozen = None
+        return self._cards
+
+    def shuffle(self):
+        """
+        Shuffle the order of the cards in the deck
+        """
+        self._rng.shuffle(self._cards)
+        self._frozen = None
+        if self._index is not None:
+            self._index = HandIndex(self.get_cards())
+
+    def pick(self, amount=1):
+        """
+        Take the first 'amount' of cards off the deck and return them
+
+        parameters:
+        amount(int): the number of cards to be removed from the top of the deck
+        """
+        if amount == None:
+            return None
+
+        codes = self._cards
+        if amount < 1:
+            return []
+        if amount > len(codes):
+            raise IndexError("not enough cards in the deck to pick")
+
+        pick_cards = a2_support.decode_cards(codes[:-amount - 1:-1])
+        del codes[-amount:]
+
+        self._length = len(codes)
+        self._frozen = None
+        if self._index is not None:
+            self._index = HandIndex(self.get_cards())
+        return pick_cards
+
+    def add_card(self, card):
+        """
+        Place a card on top of the deck
+
+        parameters:
+        card(Card): card to be placed on top of the deck
+        """
+        self._cards.append(a2_support.encode_card(card))
+        self._length = len(self._cards)
+        self._frozen = None
+        if self._index is not None:
+            self._index.add(card)
+
+    def add_cards(self, cards):
+        """
+        Place a list of cards on top of the deck
+
+        parameters:
+        card(list<Card>): list of cards to be placed on top of the deck
+        """
+        self._cards.extend(map(a2_support.encode_card, cards))
+        self._length = len(self._cards)
+        self._frozen = None
+        if self._index is not None:
+            for card in cards:
+                self._index.add(card)
+
+    def enable_index(self):
+        """
+        Index the cards in the deck by colour and by number, so pick_match
+        does not check every card in the deck
+        """
+        self._index = HandIndex(self.get_cards())
+
+    def pick_match(self, top):
+        """
+        Take the first card in the deck which matches the top card off the
+        deck and return it
+        Returns None if no card matches
+
+        parameters:
+        top(Card): The card that has to be matched
+        """
+        codes = self._cards
+        index = self._index
+
+        if index is not None:
+            if index.get_size() != len(codes):
+                index = self._index = HandIndex(self.get_cards())
+
+            position = index.find(top)
+            if position is None:
+                return None
+
+            card = index.remove(position)
+            codes.remove(a2_support.encode_card(card))
+            self._length = len(codes)
+            self._frozen = None
+            return card
+
+        accepts = a2_support.MATCH_TABLE[a2_support.encode_card(top)]
+        for i, code in enumerate(codes):
+            if accepts[code]:
+                del codes[i]
+                self._length -= 1
+                self._frozen = None
+                return a2_support.decode_card(code)
+
+        return None
+
+    def pick_at(self, position):
+        """
+        Take the card at a position in the deck off the deck and return it
+
+        parameters:
+        position(int): the index of the card in get_cards()
+        """
+        codes = self._cards
+        card = a2_support.decode_card(codes[position])
+        del codes[position]
+
+        self._length = len(codes)
+        self._frozen = None
+        if self._index is not None:
+            self._index = HandIndex(self.get_cards())
+        return card
+
+    def top(self):
+        """
+        Peaks the card on top of the deck and returns it
+        Returns None if the deck is empty
+        """
+        if self._length < 1:
+            return None
+        else:
+            return a2_support.decode_card(self._cards[-1])
+
+    def snapshot(self):
+        """
+        Returns the codes of the cards in the deck as bytes, bottom card first
+        The same bytes are returned until the deck changes
+        """
+        if self._frozen is None:
+            self._frozen = self._cards.tobytes()
+        return self._frozen
+
+    def restore(self, snapshot):
+        """
+        Replace the cards in the deck with the cards of a snapshot
+        Does nothing if the deck has not changed since the snapshot was taken
+
+        parameters:
+        snapshot(bytes): codes returned by snapshot
+        """
+        if snapshot is self._frozen:
+            return
+
+        codes = self._cards
+        del codes[:]
+        codes.frombytes(snapshot)
+        self._length = len(codes)
+        self._frozen = snapshot
+        if self._index is not None:
+            self._index = HandIndex(self.get_cards())
+
+
 class Player(object):
     """
     A player represents one of the players in a game of uno
     """
+    __slots__ = ('_name', '_deck')
+
     def __init__(self,name):
         """
         Defines the base type of player
@@ -421,10 +1127,7 @@ class Player(object):
         """
         Returns True if the player has an empty deck and has won the game
         """
-        if self._deck.get_cards() == []:
-            return True
-        else:
-            return False
+        return self._deck.get_amount() == 0
         
     def pick_card(self, putdown_pile):
         """
@@ -441,6 +1144,8 @@ class HumanPlayer(Player):
     Subclass of Player
     Player that selects cards to play using the GUI
     """
+    __slots__ = ()
+
     def __init__(self,name):
         """
         Defines the Human player
@@ -468,6 +1173,12 @@ class HumanPlayer(Player):
         return None
 
 class ComputerPlayer(Player):
+    """
+    Subclass of Player
+    Player that selects cards to play automatically
+    """
+    __slots__ = ()
+
     def __init__(self,name):
         """
         Defines the Computer player
@@ -494,22 +1205,13 @@ class ComputerPlayer(Player):
         parameters:
         putdown_pile(Deck): pile where the player has to play his cards
         """
-        check_match = 0
-        
-        for i in range(0,self.get_deck().get_amount()):
-            
-            #match could be found
-            if self.get_deck().get_cards()[i].matches(putdown_pile.top()):
-                check_match+=1
-                return self._deck.get_cards().pop(i)
+        return self._deck.pick_match(putdown_pile.top())
 
-        #No match could be found                
-        if check_match == 0:
-            return None
-                
+# imported once the classes above are defined, as a2_support builds its shared
+# cards and match table from them
+import a2_support
 
 
-    
 def main():
     print("Please run gui.py instead")
 
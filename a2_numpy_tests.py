@@ -0,0 +1,215 @@
+"""Tests for the parts of UNO++ which require NumPy
+CSSE1001
+Semester 2, 2018
+"""
+
+#!/usr/bin/env python3
+import random
+import tempfile
+
+from testrunner import OrderedTestCase, TestMaster
+
+import a2
+import a2_support
+import simulation
+import movelog
+import vector_engine
+import batch_ai
+import columnar
+from a2_sample_tests import TestMoveLog, deck_player
+
+
+class TestVectorEngine(OrderedTestCase):
+    def test_matches(self):
+        for top, top_card in enumerate(vector_engine.KINDS):
+            for kind, card in enumerate(vector_engine.KINDS):
+                self.assertEqual(vector_engine.MATCHES[top, kind], card.matches(top_card),
+                                 f"MATCHES disagrees with {card!r}.matches({top_card!r})")
+
+    def test_same_as_object_engine(self):
+        for recycle in (a2_support.RecyclePolicy.fail, a2_support.RecyclePolicy.draw):
+            rng = random.Random(2018)
+            cards = a2_support.build_deck(a2_support.FULL_DECK)
+
+            piles = []
+            expected = []
+            for _ in range(200):
+                pickup_pile = a2.Deck(list(cards))
+                pickup_pile.set_rng(rng)
+                pickup_pile.shuffle()
+                piles.append(a2.Deck(list(pickup_pile.get_cards())))
+
+                players = [vector_engine.LowestKindPlayer(str(seat)) for seat in range(3)]
+                simulation.deal(players, pickup_pile)
+                game = a2_support.UnoGame(pickup_pile, players, recycle)
+                expected.append(simulation.play_game(game))
+
+            games = vector_engine.VectorGames.from_pickup_piles(piles, recycle=recycle)
+            games.play()
+
+            self.assertListEqual(games.results(), expected,
+                                 f"VectorGames should play the same games as the object engine ({recycle})")
+
+    def test_lowest_kind_player(self):
+        cards = a2_support.decode_cards(a2_support.FULL_DECK_CODES)
+        top = a2.Deck([cards[0]])
+        for deck_class in (a2.Deck, a2.LazyDeck, a2.DequeDeck, a2.CodeDeck):
+            player = deck_player(deck_class, vector_engine.LowestKindPlayer)("0")
+            player.get_deck().add_cards(cards[10:17])
+            card = player.pick_card(top)
+            self.assertIsNotNone(card)
+            self.assertEqual(player.get_deck().get_amount(), 6,
+                             f"The card should be taken off a {deck_class.__name__}")
+
+    def test_reshuffle(self):
+        games = vector_engine.simulate(500, seed=7)
+        self.assertEqual(int(games.active.sum()), 0, "Every game should be finished or abandoned")
+        self.assertIs(bool((games.recycles > 0).any()), True, "Some games should recycle their piles")
+
+        cards = len(a2_support.FULL_DECK_CODES)
+        totals = games.pickup_size + games.played_size + games.hand_sizes.sum(axis=1)
+        self.assertIs(bool((totals == cards).all()), True, "Recycling should not lose or create cards")
+
+        deck = sorted(vector_engine.DECK_KINDS.tolist())
+        for game in range(len(games.top)):
+            held = games.pickup[game, :games.pickup_size[game]].tolist() \
+                + games.played[game, :games.played_size[game]].tolist()
+            for kind, count in enumerate(games.hands[game].sum(axis=0).tolist()):
+                held += [kind] * count
+            self.assertListEqual(sorted(held), deck,
+                                 "Recycling should keep every kind of card")
+
+
+class TestBatchAI(OrderedTestCase):
+    def test_choose_cards(self):
+        for cards in (a2_support.decode_cards(a2_support.FULL_DECK_CODES),
+                      a2_support.build_deck(a2_support.FULL_DECK)):
+            games = [simulation.new_game(cards, rng=seed) for seed in range(30)]
+            hands = [player.get_deck() for game in games for player in game.players]
+            hands.append(a2.Deck())
+            tops = [game.putdown_pile.top() for game in games for _ in game.players]
+            tops.append(tops[0])
+
+            expected = [next((i for i, card in enumerate(hand.get_cards()) if card.matches(top)), -1)
+                        for hand, top in zip(hands, tops)]
+            self.assertListEqual(batch_ai.choose_cards(hands, tops).tolist(), expected,
+                                 "choose_cards should choose the first matching card of each hand")
+
+            code_hands = [a2.CodeDeck(hand.get_cards()) for hand in hands]
+            self.assertListEqual(batch_ai.choose_cards(code_hands, tops).tolist(), expected)
+
+        self.assertListEqual(batch_ai.choose_cards([], []).tolist(), [])
+
+    def test_take_turns(self):
+        cards = a2_support.decode_cards(a2_support.FULL_DECK_CODES)
+        for player_class in (a2.ComputerPlayer, batch_ai.CodeComputerPlayer):
+            serial = [simulation.new_game(cards, rng=seed) for seed in range(30)]
+            batched = [simulation.new_game(cards, rng=seed, player_class=player_class)
+                       for seed in range(30)]
+
+            batch_ai.play_rounds(serial, 100, batched=False)
+            batch_ai.play_rounds(batched, 100, batched=True)
+
+            for game, other in zip(serial, batched):
+                self.assertEqual(game.is_over(), other.is_over())
+                for player, other_player in zip(game.players, other.players):
+                    self.assertListEqual(player.get_deck().get_cards(),
+                                         other_player.get_deck().get_cards(),
+                                         "take_turns should play the same turns as UnoGame.take_turn")
+
+    def test_replay_batched(self):
+        cards = a2_support.decode_cards(a2_support.FULL_DECK_CODES)
+        games = [simulation.new_game(cards, rng=seed, player_class=batch_ai.CodeComputerPlayer)
+                 for seed in range(20)]
+        logs = [movelog.MoveLog(game, seed) for seed, game in enumerate(games)]
+
+        batch_ai.play_rounds(games, 200, batched=True)
+
+        for game, log in zip(games, logs):
+            self.assertEqual(TestMoveLog.game_state(movelog.replay(log.to_bytes())),
+                             TestMoveLog.game_state(game),
+                             "Batched turns should be logged as UnoGame.take_turn logs them")
+
+
+class TestColumnar(OrderedTestCase):
+    def test_play_row(self):
+        cards = a2_support.decode_cards(a2_support.FULL_DECK_CODES)
+        result, row = columnar.play_row(cards, 3)
+        expected = simulation.play_game(simulation.new_game(cards, rng=3))
+
+        self.assertEqual(len(row), len(columnar.COLUMNS))
+        self.assertEqual(result, expected, "Recording a row should not change the game")
+        self.assertEqual(row[0], 3)
+        self.assertEqual(row[1], -1 if expected.winner is None else expected.winner)
+        self.assertEqual(row[2], expected.turns)
+        self.assertLessEqual(sum(row[4:8]), row[2], "A turn should play at most one card")
+
+        rows = [columnar.play_row(cards, seed)[1] for seed in range(20)]
+        for row in rows:
+            if row[8] == 0:
+                # a pickup pile which was never recycled was never short
+                self.assertGreaterEqual(row[3], 2 * row[6] + 4 * row[7],
+                                        "Cards picked up by pickup cards should be drawn")
+        self.assertTrue(any(row[3] > row[2] for row in rows),
+                        "Every card added to a hand should be counted, not turns")
+
+    def test_stale_chunks(self):
+        with tempfile.TemporaryDirectory() as directory:
+            columnar.export_games(directory, 3)
+            with self.assertRaises(FileExistsError):
+                columnar.ColumnWriter(directory)
+            with self.assertRaises(FileExistsError):
+                columnar.export_tournament(directory, 3, workers=1)
+            self.assertEqual(len(columnar.load_columns(directory)["seed"]), 3)
+
+    def test_chunks(self):
+        cards = a2_support.decode_cards(a2_support.FULL_DECK_CODES)
+        rows = [columnar.play_row(cards, seed)[1] for seed in range(7)]
+
+        with tempfile.TemporaryDirectory() as directory:
+            with columnar.ColumnWriter(directory, chunk_size=3) as writer:
+                for row in rows[:4]:
+                    writer.add_row(row)
+                writer.add_columns({name: [row[i] for row in rows[4:]]
+                                    for i, (name, _) in enumerate(columnar.COLUMNS)})
+            self.assertEqual(writer.rows, 7)
+            self.assertEqual(writer.chunks, 3, "Every chunk but the last should be full")
+
+            columns = columnar.load_columns(directory)
+            for i, (name, dtype) in enumerate(columnar.COLUMNS):
+                self.assertEqual(columns[name].dtype, dtype)
+                self.assertListEqual(columns[name].tolist(), [row[i] for row in rows],
+                                     "Rows should be loaded in the order written")
+
+            columns = columnar.load_columns(directory, ["turns"])
+            self.assertListEqual(list(columns), ["turns"])
+
+    def test_shard(self):
+        with tempfile.TemporaryDirectory() as directory:
+            shard = (directory, 1234, 20, 3, simulation.MAX_TURNS)
+            result = columnar.play_shard(shard)
+            columns = columnar.load_columns(directory)
+
+        self.assertEqual(len(columns["seed"]), 20)
+        self.assertEqual(int((columns["winner"] < 0).sum()), result.unfinished)
+        self.assertEqual(result.games, 20)
+
+        cards = a2_support.decode_cards(a2_support.FULL_DECK_CODES)
+        seed = int(columns["seed"][5])
+        self.assertEqual(columnar.play_row(cards, seed)[1][2], columns["turns"][5],
+                         "A game should be replayed from the seed in its row")
+
+
+def main():
+    test_cases = [
+        TestVectorEngine,
+        TestBatchAI,
+        TestColumnar,
+    ]
+
+    master = TestMaster()
+    master.run(test_cases)
+
+
+if __name__ == '__main__':
+    main()
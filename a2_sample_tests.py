@@ -6,11 +6,29 @@ Semester 2, 2018
 __version__ = '1.0.0'
 
 #!/usr/bin/env python3
+import asyncio
+import json
+import os
+import random
+import tempfile
+
 from testrunner import OrderedTestCase, TestMaster
 from testrunner import skipIfFailed
 
 import a2
 import a2_support
+import simulation
+import tournament
+import mcts
+import movelog
+import archive
+import server
+import loadtest
+import router
+import persistence
+import benchmark
+import instrument
+import metrics
 
 CARD_CLASS = {
     '__init__': 3,
@@ -68,6 +86,20 @@ PLAYER_SUBCLASSES = [
 ]
 
 
+def deck_player(deck_class, player_class=a2.ComputerPlayer):
+    """
+    Returns a subclass of player_class whose hand is stored in a deck_class.
+    """
+    class DeckPlayer(player_class):
+        __slots__ = ()
+
+        def __init__(self, name):
+            super().__init__(name)
+            self._deck = deck_class()
+
+    return DeckPlayer
+
+
 class TestDesign(OrderedTestCase):
     def test_card_defined(self):
         """Card class is defined"""
@@ -453,6 +485,168 @@ class TestDeck(OrderedTestCase):
 
         self.assertListEqual(deck.get_cards(), cards, "Deck.get_cards returns incorrectly")
 
+    def test_deck_set_rng(self):
+        cards = [a2.Card(number, a2_support.CardColour.red) for number in range(10)]
+        deck1 = a2.Deck(starting_cards=cards.copy())
+        deck2 = a2.Deck(starting_cards=cards.copy())
+        deck1.set_rng(random.Random(42))
+        deck2.set_rng(random.Random(42))
+
+        deck1.shuffle()
+        deck2.shuffle()
+        self.assertListEqual(deck1.get_cards(), deck2.get_cards(),
+                             "Decks shuffled with equally seeded generators should match")
+
+    def test_deck_pick_match(self):
+        cards = [
+            a2.SkipCard(-1, a2_support.CardColour.red),
+            a2.Card(3, a2_support.CardColour.red),
+            a2.Card(2, a2_support.CardColour.green),
+            a2.Pickup4Card(-1, a2_support.CardColour.black),
+        ]
+        for indexed in (False, True):
+            deck = a2.Deck(starting_cards=cards.copy())
+            if indexed:
+                deck.enable_index()
+
+            self.assertIs(deck.pick_match(a2.Card(2, a2_support.CardColour.blue)), cards[2],
+                          "Deck.pick_match should match by number")
+            self.assertIs(deck.pick_match(a2.Card(9, a2_support.CardColour.red)), cards[0],
+                          "Deck.pick_match should pick the first matching card")
+            self.assertIs(deck.pick_match(a2.Card(9, a2_support.CardColour.blue)), cards[3],
+                          "Deck.pick_match should pick cards which match anything")
+            self.assertIsNone(deck.pick_match(a2.Card(9, a2_support.CardColour.blue)))
+            self.assertListEqual(deck.get_cards(), [cards[1]])
+
+    def test_deck_index_same_as_scan(self):
+        rng = random.Random(1001)
+        cards = a2_support.decode_cards(a2_support.FULL_DECK_CODES)
+
+        scanned = a2.Deck()
+        indexed = a2.Deck()
+        indexed.enable_index()
+        for _ in range(2000):
+            if rng.random() < 0.5:
+                new_cards = rng.sample(cards, rng.randint(1, 3))
+                scanned.add_cards(new_cards)
+                indexed.add_cards(new_cards)
+            else:
+                top = rng.choice(cards)
+                self.assertIs(indexed.pick_match(top), scanned.pick_match(top),
+                              "An indexed deck should pick the same card as an unindexed deck")
+        self.assertListEqual(indexed.get_cards(), scanned.get_cards())
+
+    def test_deck_index_rebuilt(self):
+        deck = a2.Deck()
+        deck.enable_index()
+        deck.add_card(a2.Card(4, a2_support.CardColour.red))
+        deck.add_card(a2.Card(1, a2_support.CardColour.blue))
+        deck.get_cards().pop()
+
+        self.assertIsNone(deck.pick_match(a2.Card(1, a2_support.CardColour.blue)),
+                          "The index should follow changes to get_cards()")
+
+    def test_deck_pick_too_many(self):
+        cards = [a2.Card(1, a2_support.CardColour.blue), a2.Card(3, a2_support.CardColour.red)]
+        deck = a2.Deck(starting_cards=cards.copy())
+
+        with self.assertRaises(IndexError):
+            deck.pick(amount=3)
+        self.assertListEqual(deck.get_cards(), cards,
+                             "Deck.pick should not remove cards if there are not enough to pick")
+
+    def test_deck_storage(self):
+        cards = a2_support.decode_cards(a2_support.FULL_DECK_CODES[:20])
+
+        for deck_class in (a2.DequeDeck, a2.CodeDeck):
+            expected = a2.Deck(starting_cards=list(cards))
+            deck = deck_class(starting_cards=cards)
+
+            self.assertEqual(deck.get_amount(), 20)
+            self.assertIs(deck.top(), expected.top(), f"{deck_class.__name__}.top returns wrong card")
+            self.assertListEqual(deck.pick(amount=7), expected.pick(amount=7),
+                                 f"{deck_class.__name__}.pick returns wrong cards")
+
+            deck.add_cards(cards[:3])
+            expected.add_cards(cards[:3])
+            deck.add_card(cards[5])
+            expected.add_card(cards[5])
+            self.assertListEqual(list(deck.get_cards()), expected.get_cards(),
+                                 f"{deck_class.__name__} cards are invalid after adding cards")
+
+            top = cards[4]
+            self.assertIs(deck.pick_match(top), expected.pick_match(top))
+            with self.assertRaises(IndexError):
+                deck.pick(amount=100)
+
+    def test_code_deck_from_codes(self):
+        deck = a2.CodeDeck.from_codes(a2_support.FULL_DECK_CODES)
+        self.assertEqual(deck.get_amount(), len(a2_support.FULL_DECK_CODES))
+        self.assertIs(deck.top(), a2_support.decode_card(a2_support.FULL_DECK_CODES[-1]))
+
+    def test_deck_pick_at(self):
+        cards = a2_support.decode_cards(a2_support.FULL_DECK_CODES)[:10]
+
+        for deck_class in (a2.Deck, a2.LazyDeck, a2.DequeDeck, a2.CodeDeck):
+            deck = deck_class(cards.copy())
+            self.assertIs(deck.pick_at(3), cards[3], f"{deck_class.__name__}.pick_at picks the wrong card")
+            self.assertListEqual(list(deck.get_cards()), cards[:3] + cards[4:])
+            self.assertIs(deck.top(), cards[-1])
+
+    def test_deck_hands(self):
+        cards = a2_support.decode_cards(a2_support.FULL_DECK_CODES)
+        expected = simulation.play_game(simulation.new_game(cards, rng=11))
+        game = simulation.new_game(cards, rng=11)
+        expected_events = [(game.players.index(event.player), event.action, event.card,
+                            event.pickups, event.reversed) for event in game.iter_turns()]
+
+        for deck_class in (a2.Deck, a2.LazyDeck, a2.DequeDeck, a2.CodeDeck):
+            player_class = deck_player(deck_class)
+            game = simulation.new_game(cards, rng=11, player_class=player_class)
+            self.assertEqual(simulation.play_game(game), expected,
+                             f"Hands stored in a {deck_class.__name__} should play the same game")
+
+            game = simulation.new_game(cards, rng=11, player_class=player_class)
+            events = [(game.players.index(event.player), event.action, event.card,
+                       event.pickups, event.reversed) for event in game.iter_turns()]
+            self.assertListEqual(events, expected_events,
+                                 f"iter_turns should work with hands stored in a {deck_class.__name__}")
+
+    def test_lazy_deck_shuffle(self):
+        cards = a2_support.decode_cards(a2_support.FULL_DECK_CODES)
+        deck = a2.LazyDeck(cards.copy())
+        deck.shuffle()
+
+        self.assertEqual(deck.get_amount(), len(cards))
+        self.assertEqual(deck._unsettled, len(cards),
+                         "LazyDeck.shuffle should not move any cards")
+
+        picked = deck.pick(7)
+        self.assertEqual(deck._unsettled, len(cards) - 7)
+
+        remaining = deck.get_cards()
+        self.assertEqual(deck._unsettled, 0)
+        self.assertCountEqual(picked + remaining, cards)
+
+    def test_lazy_deck_same_as_shuffle(self):
+        cards = a2_support.decode_cards(a2_support.FULL_DECK_CODES)
+
+        for seed in range(20):
+            deck = a2.Deck(cards.copy())
+            deck.set_rng(random.Random(seed))
+            deck.shuffle()
+            lazy = a2.LazyDeck(cards.copy())
+            lazy.set_rng(random.Random(seed))
+            lazy.shuffle()
+
+            self.assertIs(lazy.top(), deck.top())
+            self.assertEqual(lazy.pick(7), deck.pick(7))
+            self.assertEqual(lazy.pick(), deck.pick())
+            lazy.add_cards(cards[:2])
+            deck.add_cards(cards[:2])
+            self.assertEqual(lazy.pick(3), deck.pick(3))
+            self.assertEqual(lazy.get_cards(), deck.get_cards())
+
     @skipIfFailed(test_name='test_deck_pick')
     def test_deck_top(self):
         cards = [
@@ -542,6 +736,1034 @@ class TestPlayer(OrderedTestCase):
         self.assertIsInstance(picked, a2.Card, "ComputerPlayer.pick_card should return an instance of Card (or a subclass) if it is possible to play a card")
 
 
+class TestWinner(OrderedTestCase):
+    def test_initial_winner(self):
+        players = [a2.ComputerPlayer("Anna Truffet"), a2.ComputerPlayer("Brae Webb")]
+        players[0].get_deck().add_card(a2.Card(3, a2_support.CardColour.red))
+        game = a2_support.UnoGame(a2.Deck(starting_cards=[a2.Card(1, a2_support.CardColour.red)]),
+                                  players)
+
+        self.assertIs(game.is_over(), True, "A player with an empty hand has won")
+        self.assertIs(game.winner, players[1])
+
+    def test_winner_on_last_card(self):
+        players = [a2.ComputerPlayer("Anna Truffet"), a2.ComputerPlayer("Brae Webb")]
+        for player in players:
+            player.get_deck().add_card(a2.Card(3, a2_support.CardColour.red))
+        players[0].get_deck().add_card(a2.Card(7, a2_support.CardColour.green))
+        deck = a2.Deck(starting_cards=[a2.Card(1, a2_support.CardColour.blue),
+                                       a2.Card(1, a2_support.CardColour.red)])
+        game = a2_support.UnoGame(deck, players)
+
+        self.assertIs(game.is_over(), False)
+        game.take_turn(players[1])
+        self.assertIs(game.is_over(), True, "Playing the last card in a hand should win the game")
+        self.assertIs(game.winner, players[1])
+
+    def test_hand_emptied_outside_turn(self):
+        players = [a2.ComputerPlayer("Anna Truffet"), a2.ComputerPlayer("Brae Webb")]
+        for player in players:
+            player.get_deck().add_card(a2.Card(3, a2_support.CardColour.red))
+        deck = a2.Deck(starting_cards=[a2.Card(1, a2_support.CardColour.blue)])
+        game = a2_support.UnoGame(deck, players)
+
+        self.assertIs(game.is_over(), False)
+        players[0].get_deck().pick_at(0)
+        self.assertIs(game.check_hands(), True,
+                      "A hand emptied outside a turn should be found by check_hands")
+        self.assertIs(game.is_over(), True)
+        self.assertIs(game.winner, players[0])
+
+
+class TestRecycle(OrderedTestCase):
+    def loadGame(self, recycle):
+        self._cards = [
+            a2.Card(1, a2_support.CardColour.red),
+            a2.Card(2, a2_support.CardColour.blue),
+            a2.Card(3, a2_support.CardColour.green),
+        ]
+        self._players = [a2.ComputerPlayer("Ashleigh Richardson"),
+                         a2.ComputerPlayer("Brae Webb")]
+        for player in self._players:
+            player.get_deck().add_card(a2.Card(9, a2_support.CardColour.yellow))
+        self._game = a2_support.UnoGame(a2.Deck(starting_cards=self._cards.copy()),
+                                        self._players, recycle=recycle)
+
+        # play both remaining cards from the pickup pile
+        for card in self._game.pickup(2):
+            self._game.putdown_pile.add_card(card)
+        self._special = a2.Pickup4Card(-1, a2_support.CardColour.black)
+        self._game.special_pile.add_card(self._special)
+
+    def test_fail(self):
+        self.loadGame(a2_support.RecyclePolicy.fail)
+        with self.assertRaises(IndexError):
+            self._game.pickup()
+        self.assertIs(self._game.is_over(), False)
+
+    def test_draw(self):
+        self.loadGame(a2_support.RecyclePolicy.draw)
+        self.assertListEqual(self._game.pickup(), [])
+        self.assertIs(self._game.is_over(), True, "Running out of cards should end the game")
+        self.assertIsNone(self._game.winner, "A drawn game should have no winner")
+
+    def test_reshuffle(self):
+        self.loadGame(a2_support.RecyclePolicy.reshuffle)
+        top = self._game.putdown_pile.top()
+
+        picked = self._game.pickup(4)
+        self.assertEqual(len(picked), 3, "Only the recycled cards can be picked up")
+        self.assertCountEqual(picked, [self._cards[2], self._cards[1], self._special])
+        self.assertListEqual(self._game.putdown_pile.get_cards(), [top],
+                             "The top card should stay on the putdown pile")
+        self.assertEqual(self._game.special_pile.get_amount(), 0)
+        self.assertEqual(self._game.recycles, 1)
+
+        self.assertListEqual(self._game.pickup(), [], "There are no more cards to recycle")
+        self.assertEqual(self._game.recycles, 1, "Nothing should be recycled")
+
+
+class TestCardEncoding(OrderedTestCase):
+    def test_encode_round_trip(self):
+        for card in a2_support.build_deck(a2_support.FULL_DECK):
+            shared = a2_support.decode_card(a2_support.encode_card(card))
+            self.assertIs(shared.__class__, card.__class__)
+            self.assertEqual(shared.get_colour(), card.get_colour())
+            self.assertEqual(shared.get_number(), card.get_number())
+
+    def test_encode_out_of_range(self):
+        with self.assertRaises(ValueError):
+            a2_support.encode_card(a2.Card(23, a2_support.CardColour.red))
+
+    def test_build_deck_codes(self):
+        deck = a2_support.build_deck(a2_support.FULL_DECK)
+        self.assertListEqual(list(a2_support.FULL_DECK_CODES),
+                             [a2_support.encode_card(card) for card in deck],
+                             "FULL_DECK_CODES should encode build_deck(FULL_DECK)")
+
+    def test_shared_cards(self):
+        code = a2_support.encode_card(a2.SkipCard(-1, a2_support.CardColour.green))
+        card = a2_support.decode_card(code)
+
+        self.assertIs(card, a2_support.decode_card(code), "decode_card should return a shared card")
+        self.assertEqual(a2_support.encode_card(card), code)
+        with self.assertRaises(AttributeError):
+            card.set_number(3)
+        with self.assertRaises(AttributeError):
+            card.set_colour(a2_support.CardColour.red)
+
+    def test_match_table(self):
+        deck = a2_support.build_deck(a2_support.FULL_DECK)
+        for top in deck:
+            for card in deck:
+                shared = a2_support.decode_card(a2_support.encode_card(card))
+                shared_top = a2_support.decode_card(a2_support.encode_card(top))
+                self.assertIs(a2_support.card_matches(shared, shared_top), card.matches(top),
+                              f"card_matches disagrees with {card!r}.matches({top!r})")
+
+    def test_card_matches_unshared(self):
+        card = a2.Card(23, a2_support.CardColour.green)
+        self.assertIs(a2_support.card_matches(card, a2.Card(23, a2_support.CardColour.red)), True)
+        self.assertIs(a2_support.card_matches(card, a2.SkipCard(-1, a2_support.CardColour.red)), False)
+
+
+class TestSlots(OrderedTestCase):
+    def test_no_instance_dict(self):
+        objects = [
+            a2.Card(1, a2_support.CardColour.red),
+            a2.SkipCard(1, a2_support.CardColour.red),
+            a2.ReverseCard(1, a2_support.CardColour.red),
+            a2.Pickup2Card(1, a2_support.CardColour.red),
+            a2.Pickup4Card(1, a2_support.CardColour.black),
+            a2.Deck(),
+            a2.HumanPlayer("Test Player"),
+            a2.ComputerPlayer("Test Player"),
+            a2_support.TurnManager([]),
+        ]
+        for obj in objects:
+            self.assertIs(hasattr(obj, '__dict__'), False,
+                          f"{obj.__class__.__name__} should not have an instance dictionary")
+
+
+class TestSnapshot(OrderedTestCase):
+    @staticmethod
+    def game_state(game):
+        return ([list(deck.get_cards()) for deck in (game.pickup_pile, game.putdown_pile, game.special_pile)],
+                [list(player.get_deck().get_cards()) for player in game.players],
+                game.current_player(), game.get_turns().peak(), game.recycles,
+                game.is_over(), game.winner)
+
+    def test_restore(self):
+        cards = a2_support.decode_cards(a2_support.FULL_DECK_CODES)
+
+        for seed in range(20):
+            game = simulation.new_game(cards, rng=seed)
+            for _ in range(10):
+                if not game.is_over():
+                    game.take_turn(game.next_player())
+
+            state = self.game_state(game)
+            snapshot = game.snapshot()
+            simulation.play_game(game)
+
+            game.restore(snapshot)
+            self.assertEqual(self.game_state(game), state,
+                             "UnoGame.restore should return to the state of the snapshot")
+
+    def test_snapshot_shares_unchanged(self):
+        cards = a2_support.decode_cards(a2_support.FULL_DECK_CODES)
+        game = simulation.new_game(cards, rng=1)
+
+        first = game.snapshot()
+        game.take_turn(game.next_player())
+        second = game.snapshot()
+
+        for pile, other in zip(first[:3] + first[3], second[:3] + second[3]):
+            if pile == other:
+                self.assertIs(pile, other, "Unchanged decks should be shared between snapshots")
+        self.assertIs(game.snapshot()[0], game.snapshot()[0])
+
+        game.putdown_pile.get_cards().append(cards[0])
+        self.assertIsNot(game.snapshot()[1], second[1],
+                         "A pile changed through get_cards should be captured again")
+
+        for deck_class in (a2.Deck, a2.LazyDeck, a2.DequeDeck):
+            deck = deck_class(cards[:10])
+            deck.shuffle()
+            snapshot = deck.snapshot()
+            deck.get_cards().pop()
+            self.assertEqual(len(deck.snapshot()), len(snapshot) - 1,
+                             f"A {deck_class.__name__} changed through get_cards "
+                             f"should be captured again")
+
+    def test_deck_storage_restore(self):
+        cards = a2_support.decode_cards(a2_support.FULL_DECK_CODES)
+
+        for deck_class in (a2.Deck, a2.LazyDeck, a2.DequeDeck, a2.CodeDeck):
+            deck = deck_class(cards[:20])
+            deck.shuffle()
+            snapshot = deck.snapshot()
+            expected = list(deck.get_cards())
+
+            deck.pick(5)
+            deck.add_card(cards[30])
+            deck.restore(snapshot)
+            self.assertListEqual(list(deck.get_cards()), expected,
+                                 f"{deck_class.__name__}.restore should return to the snapshot")
+            self.assertEqual(deck.get_amount(), 20)
+
+
+class TestMCTS(OrderedTestCase):
+    def test_pick_card(self):
+        cards = a2_support.decode_cards(a2_support.FULL_DECK_CODES)
+
+        for seed in range(10):
+            game = simulation.new_game(cards, rng=seed)
+            searcher = mcts.MCTSPlayer("MCTS", game, budget=None, rollouts=30, rng=seed)
+            hand = game.players[0].get_deck().get_cards()
+            searcher.get_deck().add_cards(hand)
+            game.players[0] = searcher
+            game.get_turns()._players[0] = searcher
+
+            others = [list(player.get_deck().get_cards()) for player in game.players[1:]]
+            pickup = list(game.pickup_pile.get_cards())
+            state = game.rng.getstate()
+            top = game.putdown_pile.top()
+            before = searcher.get_deck().get_amount()
+
+            card = searcher.pick_card(game.putdown_pile)
+            if card is None:
+                self.assertFalse(any(card.matches(top) for card in hand))
+                continue
+
+            self.assertTrue(card.matches(top), "MCTSPlayer should pick a matching card")
+            self.assertEqual(searcher.get_deck().get_amount(), before - 1,
+                             "MCTSPlayer should take the card from its hand")
+            self.assertListEqual([player.get_deck().get_cards() for player in game.players[1:]], others,
+                                 "Searching should not change the other hands")
+            self.assertListEqual(game.pickup_pile.get_cards(), pickup,
+                                 "Searching should not change the pickup pile")
+            self.assertEqual(game.rng.getstate(), state,
+                             "Searching should not use the game's generator")
+            self.assertIs(game.current_player(), searcher)
+
+    def test_without_game(self):
+        searcher = mcts.MCTSPlayer("MCTS")
+        red = a2.Card(3, a2_support.CardColour.red)
+        blue = a2.Card(5, a2_support.CardColour.blue)
+        searcher.get_deck().add_cards([blue, red])
+
+        self.assertIsNone(searcher.pick_card(a2.Deck([a2.Card(1, a2_support.CardColour.green)])))
+        self.assertIs(searcher.pick_card(a2.Deck([a2.Card(1, a2_support.CardColour.red)])), red,
+                      "MCTSPlayer without a game should play its matching card")
+        self.assertListEqual(searcher.get_deck().get_cards(), [blue])
+
+    def test_plays_games(self):
+        cards = a2_support.decode_cards(a2_support.FULL_DECK_CODES)
+        game = simulation.new_game(cards, rng=3)
+        searcher = mcts.MCTSPlayer("MCTS", game, budget=None, rollouts=10, rng=3)
+        searcher.get_deck().add_cards(game.players[1].get_deck().get_cards())
+        game.players[1] = searcher
+        game.get_turns()._players[1] = searcher
+        log = movelog.MoveLog(game, 3)
+
+        result = simulation.play_game(game)
+        self.assertIsNotNone(result.winner, "A game with an MCTSPlayer should be finished")
+        self.assertEqual(log.turns, result.turns, "Rollouts should not be recorded as turns")
+        replayed = movelog.replay(log.to_bytes())
+        self.assertListEqual([player.get_deck().get_cards() for player in replayed.players],
+                             [player.get_deck().get_cards() for player in game.players])
+
+
+class TestMoveLog(OrderedTestCase):
+    @staticmethod
+    def game_state(game):
+        return ([list(deck.get_cards()) for deck in (game.pickup_pile, game.putdown_pile, game.special_pile)],
+                [list(player.get_deck().get_cards()) for player in game.players],
+                game.get_turns().snapshot(), game.recycles, game.is_over(),
+                None if game.winner is None else game.players.index(game.winner))
+
+    def test_varint(self):
+        buffer = bytearray()
+        values = [0, 1, 127, 128, 300, 2 ** 64]
+        for value in values:
+            movelog.write_varint(buffer, value)
+
+        offset = 0
+        for value in values:
+            read, offset = movelog.read_varint(buffer, offset)
+            self.assertEqual(read, value)
+        self.assertEqual(offset, len(buffer))
+
+    def test_replay(self):
+        cards = a2_support.decode_cards(a2_support.FULL_DECK_CODES)
+
+        for policy in (a2_support.RecyclePolicy.reshuffle, a2_support.RecyclePolicy.draw):
+            for seed in range(15):
+                game = simulation.new_game(cards, rng=seed, recycle=policy)
+                log = movelog.MoveLog(game, seed)
+                result = simulation.play_game(game)
+
+                data = log.to_bytes()
+                self.assertEqual(log.turns, result.turns, "MoveLog should record every turn")
+                self.assertEqual(movelog.read_seed(data), seed)
+                self.assertEqual(self.game_state(movelog.replay(data)), self.game_state(game),
+                                 "replay should rebuild the logged game")
+
+    def test_replay_turns(self):
+        cards = a2_support.decode_cards(a2_support.FULL_DECK_CODES)
+        game = simulation.new_game(cards, rng=5)
+        log = movelog.MoveLog(game)
+
+        states = []
+        for _ in range(60):
+            states.append(self.game_state(game))
+            game.take_turn(game.next_player())
+
+        data = log.to_bytes()
+        self.assertIsNone(movelog.read_seed(data))
+        for turns in (0, 1, 25, 59):
+            self.assertEqual(self.game_state(movelog.replay(data, turns)), states[turns],
+                             "replay should rebuild the game after the given amount of turns")
+
+        with self.assertRaises(ValueError):
+            movelog.replay(b"not a log")
+        with self.assertRaises(ValueError):
+            movelog.MoveLog(simulation.new_game(cards, rng=-3), -3)
+
+
+class TestArchive(OrderedTestCase):
+    def test_archive(self):
+        cards = a2_support.decode_cards(a2_support.FULL_DECK_CODES)
+        logs = []
+        for seed in range(12):
+            game = simulation.new_game(cards, rng=seed)
+            log = movelog.MoveLog(game, seed)
+            simulation.play_game(game)
+            logs.append(log.to_bytes())
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "games.unoarc")
+            with archive.ArchiveWriter(path) as writer:
+                for i, log in enumerate(logs):
+                    self.assertEqual(writer.add(log), i)
+
+            with archive.Archive(path) as games:
+                self.assertEqual(len(games), len(logs))
+                for i in (7, 0, 11, 3):
+                    self.assertEqual(games.get_log(i), logs[i],
+                                     "Archive.get_log should return the log of the game")
+
+                expected = movelog.replay(logs[7], 30)
+                game = games.get_game(7, turns=30)
+                for player, other in zip(game.players, expected.players):
+                    self.assertListEqual(player.get_deck().get_cards(), other.get_deck().get_cards())
+                self.assertListEqual(game.putdown_pile.get_cards(), expected.putdown_pile.get_cards())
+
+                with self.assertRaises(IndexError):
+                    games.get_log(len(logs))
+
+    def test_not_archive(self):
+        with tempfile.TemporaryDirectory() as directory:
+            empty = os.path.join(directory, "empty")
+            other = os.path.join(directory, "other")
+            open(empty, "wb").close()
+            with open(other, "wb") as file:
+                file.write(b"not an archive" * 10)
+
+            for path in (empty, other):
+                with self.assertRaises(ValueError):
+                    archive.Archive(path)
+
+            path = os.path.join(directory, "none.unoarc")
+            archive.ArchiveWriter(path).close()
+            with archive.Archive(path) as games:
+                self.assertEqual(len(games), 0)
+
+
+class TestServer(OrderedTestCase):
+    def test_load_test(self):
+        latencies, results, _, _ = asyncio.run(loadtest.load_test(tables=20, seed=4))
+
+        self.assertEqual(len(results), 20)
+        self.assertGreater(len(latencies), 0)
+        self.assertListEqual(latencies, sorted(latencies))
+        for result in results:
+            self.assertEqual(result["type"], "over")
+        self.assertEqual(loadtest.percentile([1, 2, 3, 4], 0.5), 2)
+        self.assertEqual(loadtest.percentile([1, 2, 3, 4], 1.0), 4)
+
+    def test_protocol(self):
+        async def session():
+            game_server = server.GameServer(seed=2)
+            port = await game_server.start(server.HOST, 0)
+            reader, writer = await asyncio.open_connection(server.HOST, port)
+            try:
+                writer.write(b'{"name": "Tester"}\n')
+                messages = []
+                while not messages or messages[-1]["type"] != "turn":
+                    messages.append(json.loads(await reader.readline()))
+
+                # a position outside the hand is refused, and asked again
+                writer.write(b'{"play": 999}\n')
+                messages.append(json.loads(await reader.readline()))
+                writer.write(b'{"play": null}\n')
+                messages.append(json.loads(await reader.readline()))
+            finally:
+                writer.close()
+                await game_server.close()
+            return messages
+
+        messages = asyncio.run(session())
+        start = messages[0]
+        self.assertEqual(start["type"], "start")
+        self.assertEqual(start["players"][0], "Tester")
+
+        hand = messages[-3]["hand"]
+        self.assertEqual(messages[-2]["type"], "error", "An invalid move should be refused")
+        self.assertEqual(messages[-1]["type"], "event")
+        self.assertEqual(messages[-1]["seat"], 0)
+        self.assertEqual(messages[-1]["action"], "draw")
+        self.assertEqual(len(messages[-1]["pickups"]), 1)
+        self.assertEqual(len(hand), 7 + sum(len(message["pickups"]) for message in messages[1:-3]
+                                            if message["target"] == 0))
+
+    def test_bad_rejoin(self):
+        async def session(store, hello):
+            game_server = server.GameServer(seed=2, store=store)
+            game_server.resume()
+            port = await game_server.start(server.HOST, 0)
+            reader, writer = await asyncio.open_connection(server.HOST, port)
+            try:
+                writer.write(hello + b"\n")
+                return json.loads(await reader.readline())
+            finally:
+                writer.close()
+                await game_server.close()
+
+        with tempfile.TemporaryDirectory() as directory:
+            with persistence.GameStore(os.path.join(directory, "tables.sqlite")) as store:
+                store.checkpoint(1, server.Table(1, 7, "Tester").game, 7)
+                store.flush()
+
+                for hello in (b'{"name": "Tester", "table": []}',
+                              b'{"name": "Tester", "table": true}',
+                              b'{"name": "Tester", "table": 3}',
+                              b'{"name": "Thief", "table": 1}'):
+                    self.assertEqual(asyncio.run(session(store, hello))["type"], "error",
+                                     "A table which cannot be rejoined should be refused")
+
+    def test_rejoin_after_leaving(self):
+        async def join(port, hello):
+            reader, writer = await asyncio.open_connection(server.HOST, port)
+            try:
+                writer.write(json.dumps(hello).encode() + b"\n")
+                messages = [json.loads(await reader.readline())]
+                while messages[-1]["type"] not in ("turn", "error", "over"):
+                    messages.append(json.loads(await reader.readline()))
+            finally:
+                writer.close()
+            return messages
+
+        async def wait_for_suspended(game_server, amount):
+            for _ in range(100):
+                if game_server.suspended() == amount:
+                    break
+                await asyncio.sleep(0.01)
+            return game_server.suspended()
+
+        async def session():
+            game_server = server.GameServer(seed=2)
+            port = await game_server.start(server.HOST, 0)
+            try:
+                first = await join(port, {"name": "Tester"})
+                table_id = first[0]["table"]
+                suspended = [await wait_for_suspended(game_server, 1)]
+                stolen = await join(port, {"name": "Thief", "table": table_id})
+                suspended.append(game_server.suspended())
+                second = await join(port, {"name": "Tester", "table": table_id})
+                suspended.append(await wait_for_suspended(game_server, 1))
+                third = await join(port, {"name": "Tester", "table": table_id})
+            finally:
+                await game_server.close()
+            return first, stolen, second, third, suspended
+
+        first, stolen, second, third, suspended = asyncio.run(session())
+        self.assertListEqual(suspended, [1, 1, 1],
+                             "A table left before its end should wait for its client")
+        self.assertEqual(stolen[-1]["type"], "error",
+                         "A table should only be rejoined by the player in its seat")
+        for rejoined in (second, third):
+            self.assertEqual(rejoined[0]["table"], first[0]["table"])
+            self.assertDictEqual(rejoined[-1], first[-1], "A rejoined table should ask for the same turn")
+
+    def test_check_move(self):
+        table = server.Table(1, 7, "Tester")
+        top = table.game.putdown_pile.top()
+        cards = table.remote.get_deck().get_cards()
+
+        self.assertIsNotNone(table.check_move({}))
+        self.assertIsNotNone(table.check_move({"play": True}))
+        self.assertIsNotNone(table.check_move({"play": len(cards)}))
+        for position, card in enumerate(cards):
+            problem = table.check_move({"play": position})
+            self.assertEqual(problem is None, a2_support.card_matches(card, top))
+        self.assertIsNone(table.check_move({"play": None}))
+
+
+class TestRouter(OrderedTestCase):
+    def test_route(self):
+        table_router = router.Router(shards=3)
+        routes = [table_router.route() for _ in range(4)]
+
+        self.assertListEqual([table_id for table_id, _ in routes], [1, 2, 3, 4])
+        self.assertListEqual([shard for _, shard in routes], [0, 1, 2, 0],
+                             "Tables should open on the least loaded shard")
+        self.assertListEqual(table_router.open_tables, [2, 1, 1])
+
+        del table_router.owners[2]
+        table_router.open_tables[1] -= 1
+        self.assertTupleEqual(table_router.route(), (5, 1))
+
+    def test_route_hello(self):
+        table_router = router.Router(shards=3)
+        self.assertTupleEqual(table_router.route_hello(b'{"name": "a"}'), (1, 0, True))
+        self.assertTupleEqual(table_router.route_hello(b'not json'), (2, 1, True))
+        self.assertTupleEqual(table_router.route_hello(b'{"name": "b", "table": 2}'), (2, 1, False),
+                              "A rejoin should be routed to the table's owner")
+        self.assertListEqual(table_router.open_tables, [1, 1, 0], "A rejoin should open no table")
+        for table in (7, "2", True, -1):
+            hello = json.dumps({"name": "b", "table": table}).encode()
+            self.assertTupleEqual(table_router.route_hello(hello), (0, 2, False),
+                                  f"No shard owns table {table!r}")
+        self.assertEqual(table_router.tables, 2)
+
+    def test_shards(self):
+        async def session():
+            table_router = router.Router(shards=2, seed=1)
+            port = await table_router.start(server.HOST, 0)
+            try:
+                _, results = await loadtest.run_clients(server.HOST, port, 10)
+                # wait for the shards to report every table closed
+                for _ in range(100):
+                    if not table_router.owners:
+                        break
+                    await asyncio.sleep(0.01)
+            finally:
+                await table_router.close()
+            return table_router, results
+
+        table_router, results = asyncio.run(session())
+        self.assertEqual(len(results), 10)
+        self.assertEqual(table_router.tables, 10)
+        self.assertDictEqual(table_router.owners, {}, "Closed tables should be forgotten")
+        self.assertListEqual(table_router.open_tables, [0, 0])
+
+    def test_rejoin_open_table(self):
+        async def session():
+            table_router = router.Router(shards=2, seed=1)
+            port = await table_router.start(server.HOST, 0)
+            try:
+                reader, writer = await asyncio.open_connection(server.HOST, port)
+                writer.write(b'{"name": "a"}\n')
+                start = json.loads(await reader.readline())
+
+                rejoin_reader, rejoin_writer = await asyncio.open_connection(server.HOST, port)
+                # the opening line is split, and followed by another line
+                rejoin_writer.write(b'{"name": "b", ')
+                await rejoin_writer.drain()
+                await asyncio.sleep(0.01)
+                rejoin_writer.write(b'"table": %d}\n{"play": null}\n' % start["table"])
+                refused = json.loads(await rejoin_reader.readline())
+                rejoin_writer.close()
+                await asyncio.sleep(0.05)
+                owners = dict(table_router.owners)
+
+                writer.close()
+                await asyncio.sleep(0.05)
+            finally:
+                await table_router.close()
+            return start, refused, owners, table_router
+
+        start, refused, owners, table_router = asyncio.run(session())
+        self.assertEqual(start["type"], "start")
+        self.assertDictEqual(refused, {"type": "error",
+                                       "message": f"no table {start['table']} to rejoin"})
+        self.assertDictEqual(owners, {start["table"]: 0},
+                             "A refused rejoin should leave its table open")
+        self.assertDictEqual(table_router.owners, {start["table"]: 0},
+                             "A table left before its end should stay with its shard")
+        self.assertEqual(table_router.tables, 1)
+
+    def test_resume_shards(self):
+        async def join(port, hello):
+            reader, writer = await asyncio.open_connection(server.HOST, port)
+            try:
+                writer.write(json.dumps(hello).encode() + b"\n")
+                messages = [json.loads(await reader.readline())]
+                while messages[-1]["type"] not in ("turn", "error", "over"):
+                    messages.append(json.loads(await reader.readline()))
+            finally:
+                writer.close()
+            return messages
+
+        async def session(directory, hellos):
+            table_router = router.Router(shards=2, seed=4, directory=directory)
+            port = await table_router.start(server.HOST, 0)
+            owners = dict(table_router.owners)
+            try:
+                joined = []
+                for hello in hellos:
+                    joined.append(await join(port, hello))
+                    # wait for the shard to suspend the table left
+                    await asyncio.sleep(0.05)
+            finally:
+                await table_router.close()
+            return owners, joined, table_router
+
+        with tempfile.TemporaryDirectory() as directory:
+            _, (first, second), _ = asyncio.run(session(directory, [
+                {"name": "Tester"}, {"name": "Tester", "table": 1}]))
+            owners, (third, new), table_router = asyncio.run(session(directory, [
+                {"name": "Tester", "table": 1}, {"name": "Other"}]))
+
+        self.assertEqual(first[0]["table"], 1)
+        self.assertDictEqual(owners, {1: 0}, "A restarted router should route to resumed tables")
+        for rejoined in (second, third):
+            self.assertEqual(rejoined[0]["table"], 1)
+            self.assertDictEqual(rejoined[-1], first[-1], "A rejoined table should ask for the same turn")
+        self.assertEqual(new[0]["table"], 2, "Resumed tables should keep their identifiers")
+        self.assertListEqual(table_router.open_tables, [1, 1])
+
+
+class TestPersistence(OrderedTestCase):
+    def test_checkpoint(self):
+        cards = a2_support.decode_cards(a2_support.FULL_DECK_CODES)
+        game = simulation.new_game(cards, rng=6)
+        for _ in range(25):
+            game.take_turn(game.next_player())
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "tables.sqlite")
+            with persistence.GameStore(path) as store:
+                store.checkpoint(3, game, seed=6, turns=25)
+                store.flush()
+                saved = store.load(3)
+                self.assertIsNone(store.load(4))
+                self.assertEqual(store.last_table(), 3)
+
+        self.assertEqual((saved.table_id, saved.seed, saved.turns), (3, 6, 25))
+        resumed = saved.game
+        for pile in ("pickup_pile", "putdown_pile", "special_pile"):
+            self.assertListEqual(getattr(resumed, pile).get_cards(), getattr(game, pile).get_cards())
+        for player, other in zip(resumed.players, game.players):
+            self.assertEqual(player.get_name(), other.get_name())
+            self.assertListEqual(player.get_deck().get_cards(), other.get_deck().get_cards())
+        self.assertTupleEqual(resumed.get_turns().snapshot(), game.get_turns().snapshot())
+        self.assertEqual(resumed.recycles, game.recycles)
+        self.assertIs(resumed.recycle, game.recycle)
+
+        for _ in range(10):
+            self.assertEqual(resumed.take_turn(resumed.next_player()),
+                             game.take_turn(game.next_player()),
+                             "A resumed game should play on as the game did")
+
+    def test_code_deck_hands(self):
+        cards = a2_support.decode_cards(a2_support.FULL_DECK_CODES)
+        game = simulation.new_game(cards, rng=6, player_class=deck_player(a2.CodeDeck))
+        for _ in range(25):
+            game.take_turn(game.next_player())
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "tables.sqlite")
+            with persistence.GameStore(path) as store:
+                store.checkpoint(3, game)
+                store.flush()
+                saved = store.load(3)
+
+        for player, other in zip(saved.game.players, game.players):
+            self.assertListEqual(player.get_deck().get_cards(), other.get_deck().get_cards(),
+                                 "Hands stored as codes should be checkpointed")
+
+    def test_writer_error(self):
+        cards = a2_support.decode_cards(a2_support.FULL_DECK_CODES)
+        game = simulation.new_game(cards, rng=6)
+        game.players[0].get_deck().add_card(a2.Card(23, a2_support.CardColour.red))
+
+        with tempfile.TemporaryDirectory() as directory:
+            store = persistence.GameStore(os.path.join(directory, "tables.sqlite"))
+            store.checkpoint(1, game)
+            with self.assertRaises(ValueError, msg="flush should raise the writer's error"):
+                store.flush()
+            with self.assertRaises(ValueError, msg="close should raise the writer's error"):
+                store.close()
+
+    def test_write_behind(self):
+        cards = a2_support.decode_cards(a2_support.FULL_DECK_CODES)
+        games = [simulation.new_game(cards, rng=seed) for seed in range(5)]
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "tables.sqlite")
+            with persistence.GameStore(path, flush_interval=60) as store:
+                for _ in range(30):
+                    for table_id, game in enumerate(games):
+                        if not game.is_over():
+                            game.take_turn(game.next_player())
+                        store.checkpoint(table_id, game)
+                store.flush()
+                self.assertEqual(store.rows, len(games),
+                                 "Only the latest checkpoint of a table should be written")
+                self.assertEqual(store.transactions, 1)
+
+            with persistence.GameStore(path) as store:
+                unfinished = store.unfinished()
+        self.assertListEqual([saved.table_id for saved in unfinished],
+                             [table_id for table_id, game in enumerate(games) if not game.is_over()])
+
+    def test_server_resume(self):
+        async def play(path, hello, moves):
+            store = persistence.GameStore(path)
+            game_server = server.GameServer(seed=3, store=store)
+            resumed = game_server.resume()
+            port = await game_server.start(server.HOST, 0)
+            reader, writer = await asyncio.open_connection(server.HOST, port)
+            messages = []
+            try:
+                writer.write(json.dumps(hello).encode() + b"\n")
+                while moves:
+                    message = json.loads(await reader.readline())
+                    messages.append(message)
+                    if message["type"] == "turn":
+                        moves -= 1
+                        if moves:
+                            writer.write(b'{"play": null}\n')
+            finally:
+                writer.close()
+                await game_server.close()
+                store.close()
+            return resumed, messages
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "tables.sqlite")
+            resumed, first = asyncio.run(play(path, {"name": "Tester"}, 3))
+            self.assertEqual(resumed, 0)
+
+            table_id = first[0]["table"]
+            resumed, second = asyncio.run(play(path, {"name": "Tester", "table": table_id}, 1))
+
+        self.assertEqual(resumed, 1)
+        self.assertEqual(second[0]["table"], table_id)
+        self.assertEqual(second[0]["players"], first[0]["players"])
+        self.assertDictEqual(second[-1], first[-1], "A rejoined table should ask for the same turn")
+
+
+class TestBenchmark(OrderedTestCase):
+    def test_run_benchmarks(self):
+        names = [case.name for case in benchmark.BENCHMARKS]
+        self.assertEqual(len(names), len(set(names)), "Benchmarks should have distinct names")
+
+        results = benchmark.run_benchmarks(benchmark.BENCHMARKS[:3], warmup=0, repeat=3,
+                                           min_time=0.001)
+        self.assertListEqual(list(results["results"]), names[:3])
+        for result in results["results"].values():
+            self.assertLessEqual(result["min"], result["median"])
+            self.assertLessEqual(result["median"], result["max"])
+            self.assertGreater(result["min"], 0)
+
+    def test_baseline(self):
+        baseline = {"python": "3", "machine": "test",
+                    "results": {"fast": {"median": 100.0, "min": 90.0, "max": 110.0},
+                                "slow": {"median": 100.0, "min": 90.0, "max": 110.0},
+                                "gone": {"median": 100.0, "min": 90.0, "max": 110.0}}}
+        results = {"python": "3", "machine": "test",
+                   "results": {"fast": {"median": 80.0, "min": 70.0, "max": 90.0},
+                               "slow": {"median": 125.0, "min": 120.0, "max": 130.0},
+                               "new": {"median": 100.0, "min": 90.0, "max": 110.0}}}
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "baseline.json")
+            benchmark.save_baseline(path, baseline)
+            self.assertDictEqual(benchmark.load_baseline(path), baseline)
+
+        comparison = benchmark.compare(baseline, results, threshold=0.2)
+        self.assertListEqual([(name, regressed) for name, *_, regressed in comparison],
+                             [("fast", False), ("slow", True)],
+                             "Only benchmarks slower beyond the threshold should regress")
+        self.assertAlmostEqual(comparison[1][3], 1.25)
+        self.assertIs(benchmark.compare(baseline, results, threshold=0.3)[1][4], False)
+
+
+class TestInstrument(OrderedTestCase):
+    def test_profile_simulation(self):
+        profile = instrument.TurnProfile()
+        self.assertListEqual(simulation.simulate(20, rng=7, profile=profile),
+                             simulation.simulate(20, rng=7),
+                             "Profiled games should play as unprofiled games do")
+
+        summary = profile.summary()
+        phases = summary["phases"]
+        actions = summary["actions"]
+        self.assertEqual(phases["pick_card"]["calls"], summary["turns"])
+        self.assertEqual(sum(actions.values()), summary["turns"])
+        self.assertEqual(phases["match"]["calls"], actions["play"] + actions["discard"])
+        self.assertEqual(phases["effect"]["calls"], actions["play"])
+        self.assertEqual(phases["pile"]["calls"], actions["play"] + actions["draw"])
+        self.assertEqual(phases["win_check"]["calls"], actions["play"] + actions["discard"])
+        self.assertEqual(phases["record"]["calls"], 0, "Games without a recorder record nothing")
+        self.assertEqual(sum(card["calls"] for card in summary["cards"].values()),
+                         actions["play"])
+        self.assertLessEqual(sum(phase["total_ns"] for phase in phases.values()),
+                             summary["turn_ns"])
+        self.assertAlmostEqual(sum(phase["share"] for phase in phases.values()), 1.0)
+        json.dumps(summary)
+
+        merged = instrument.TurnProfile()
+        merged.merge(profile)
+        merged.merge(profile)
+        self.assertEqual(merged.turns, 2 * profile.turns)
+        self.assertListEqual(merged.actions, [2 * amount for amount in profile.actions])
+        self.assertListEqual(merged.calls, [2 * calls for calls in profile.calls])
+        self.assertDictEqual(merged.cards, {name: [2 * calls, 2 * total]
+                                            for name, (calls, total) in profile.cards.items()})
+
+    def test_attach(self):
+        cards = a2_support.decode_cards(a2_support.FULL_DECK_CODES)
+        game = simulation.new_game(cards, rng=3)
+        movelog.MoveLog(game, 3)
+        profile = instrument.TurnProfile()
+        profile.attach(game)
+        draws = sum(game.take_turn(game.next_player()) is None for _ in range(30))
+
+        self.assertEqual(profile.turns, 30)
+        self.assertEqual(profile.actions[instrument.DRAW], draws)
+        self.assertEqual(profile.calls[instrument.RECORD], 30, "Every turn should be recorded")
+
+        profile.detach(game)
+        game.take_turn(game.next_player())
+        self.assertEqual(profile.turns, 30, "A detached game should not be timed")
+
+    def test_select_card(self):
+        cards = a2_support.decode_cards(a2_support.FULL_DECK_CODES)
+        game = simulation.new_game(cards, rng=3)
+        profile = instrument.TurnProfile()
+        profile.attach(game)
+
+        player = game.next_player()
+        top = game.putdown_pile.top()
+        hand = player.get_deck()
+        card = next(card for card in hand.get_cards() if card.matches(top))
+        hand.pick_at(hand.get_cards().index(card))
+        game.select_card(player, card)
+
+        self.assertEqual(profile.turns, 0, "Selecting a card is not a turn taken by take_turn")
+        self.assertEqual(profile.actions[instrument.PLAY], 1, "A selected card should be timed")
+        self.assertEqual(profile.calls[instrument.MATCH], 0, "A selected card is not matched")
+        self.assertEqual(profile.calls[instrument.EFFECT], 1)
+        self.assertEqual(profile.calls[instrument.WIN_CHECK], 1)
+        self.assertListEqual(list(profile.cards), [card.__class__.__name__])
+
+
+class TestMetrics(OrderedTestCase):
+    def test_histogram(self):
+        histogram = metrics.Histogram((1.0, 2.0))
+        for value in (0.5, 1.0, 1.5, 3.0):
+            histogram.observe(value)
+
+        self.assertListEqual(histogram.counts, [2, 1, 1])
+        self.assertListEqual(histogram.lines("h"),
+                             ['h_bucket{le="1"} 2', 'h_bucket{le="2"} 3',
+                              'h_bucket{le="+Inf"} 4', "h_sum 6.0", "h_count 4"])
+
+    def test_scrape(self):
+        async def session():
+            game_server = server.GameServer(seed=5)
+            server_metrics = metrics.ServerMetrics(game_server)
+            metrics_port = await server_metrics.start(server.HOST, 0)
+            port = await game_server.start(server.HOST, 0)
+            try:
+                await loadtest.run_clients(server.HOST, port, 10)
+                samples = await metrics.scrape(server.HOST, metrics_port)
+
+                reader, writer = await asyncio.open_connection(server.HOST, metrics_port)
+                writer.write(b"GET / HTTP/1.1\r\n\r\n")
+                missing = await reader.read()
+                writer.close()
+            finally:
+                await game_server.close()
+                await server_metrics.close()
+            return game_server, samples, missing
+
+        game_server, samples, missing = asyncio.run(session())
+        self.assertTrue(missing.startswith(b"HTTP/1.1 404"))
+        self.assertEqual(samples["uno_tables_opened_total"], 10)
+        self.assertEqual(samples["uno_tables_active"], 0)
+        self.assertEqual(samples["uno_turns_total"], game_server.turns)
+        self.assertEqual(samples["uno_recycles_total"], game_server.recycles)
+        self.assertGreater(samples["uno_turns_per_second"], 0)
+
+        count = samples["uno_ai_turn_seconds_count"]
+        self.assertGreater(count, 0)
+        self.assertLess(count, game_server.turns, "Only computer turns should be timed")
+        self.assertEqual(samples['uno_ai_turn_seconds_bucket{le="+Inf"}'], count)
+
+
+class TestSimulation(OrderedTestCase):
+    def test_new_game(self):
+        cards = a2_support.build_deck(a2_support.FULL_DECK)
+        game = simulation.new_game(cards, player_count=4)
+
+        self.assertEqual(len(game.players), 4, "new_game should seat player_count players")
+        for player in game.players:
+            self.assertIsInstance(player, a2.ComputerPlayer)
+            self.assertEqual(player.get_deck().get_amount(), simulation.HAND_SIZE,
+                             "new_game should deal a full hand to each player")
+        self.assertEqual(game.pickup_pile.get_amount(),
+                         len(cards) - 4 * simulation.HAND_SIZE - 1,
+                         "new_game should deal hands and the first card from the pickup pile")
+
+    def test_play_game(self):
+        cards = a2_support.build_deck(a2_support.FULL_DECK)
+        for _ in range(20):
+            game = simulation.new_game(cards)
+            result = simulation.play_game(game)
+
+            self.assertGreater(result.turns, 0, "play_game should take turns")
+            if result.winner is not None:
+                self.assertIs(game.players[result.winner].has_won(), True,
+                              "play_game winner should have an empty hand")
+
+    def test_simulate(self):
+        results = simulation.simulate(25)
+        self.assertEqual(len(results), 25, "simulate should return a result per game")
+
+    def test_seeded_games(self):
+        cards = a2_support.decode_cards(a2_support.FULL_DECK_CODES)
+
+        for seed in range(10):
+            first = simulation.new_game(cards, rng=seed)
+            second = simulation.new_game(cards, rng=random.Random(seed))
+            for player, other in zip(first.players, second.players):
+                self.assertListEqual(player.get_deck().get_cards(), other.get_deck().get_cards(),
+                                     "Games with the same seed should deal the same hands")
+
+            self.assertEqual(simulation.play_game(first), simulation.play_game(second),
+                             "Games with the same seed should play out the same")
+            self.assertEqual(first.recycles, second.recycles)
+
+        self.assertListEqual(simulation.simulate(20, rng=7), simulation.simulate(20, rng=7),
+                             "simulate with the same seed should play the same games")
+
+    def test_make_rng(self):
+        rng = random.Random(3)
+        self.assertIs(a2_support.make_rng(rng), rng)
+        self.assertIs(a2_support.make_rng(None), random)
+        self.assertEqual(a2_support.make_rng(3).random(), random.Random(3).random())
+        self.assertEqual(a2_support.generate_name(5), a2_support.generate_name(5))
+
+        deck = a2.Deck()
+        deck.set_rng(11)
+        game = a2_support.UnoGame(a2.Deck([a2.Card(1, a2_support.CardColour.red)]),
+                                  [], rng=deck.get_rng())
+        self.assertIs(game.rng, deck.get_rng(), "UnoGame should shuffle with the given generator")
+        self.assertIs(game.pickup_pile.get_rng(), deck.get_rng())
+
+    def test_iter_turns(self):
+        cards = a2_support.decode_cards(a2_support.FULL_DECK_CODES)
+        expected = simulation.play_game(simulation.new_game(cards, rng=3))
+        game = simulation.new_game(cards, rng=3)
+        events = list(game.iter_turns())
+
+        self.assertEqual(len(events), expected.turns,
+                         "iter_turns should take the same turns as play_game")
+        self.assertIs(events[-1].player, game.winner)
+        self.assertIs(next(game.iter_turns(), None), None, "A finished game should have no turns")
+
+        for event in events:
+            if event.action is a2_support.TurnAction.draw:
+                self.assertIs(event.target, event.player)
+                self.assertTupleEqual(event.pickups, (event.card,))
+            elif event.card.__class__ in (a2.Pickup2Card, a2.Pickup4Card):
+                self.assertIsNot(event.target, event.player)
+                self.assertGreater(len(event.pickups), 0, "Pickup cards should give the next player cards")
+            else:
+                self.assertIs(event.target, None)
+            self.assertEqual(event.reversed, event.action is a2_support.TurnAction.play
+                             and event.card.__class__ is a2.ReverseCard)
+
+        game = simulation.new_game(cards, rng=3)
+        self.assertEqual(len(list(game.iter_turns(max_turns=10))), 10)
+        self.assertEqual(len(list(game.iter_turns())), expected.turns - 10,
+                         "Stopping early should leave the game where it was")
+
+
+class TestTournament(OrderedTestCase):
+    def test_play_shard_reproducible(self):
+        first = tournament.play_shard((1234, 30, 3, simulation.MAX_TURNS))
+        second = tournament.play_shard((1234, 30, 3, simulation.MAX_TURNS))
+
+        self.assertEqual(first.games, 30)
+        self.assertListEqual(first.wins, second.wins,
+                             "Shards with the same seed should have the same winners")
+        self.assertEqual(first.lengths, second.lengths,
+                         "Shards with the same seed should have the same game lengths")
+
+    def test_merge(self):
+        first = tournament.play_shard((1, 20, 3, simulation.MAX_TURNS))
+        second = tournament.play_shard((2, 10, 3, simulation.MAX_TURNS))
+        wins = [a + b for a, b in zip(first.wins, second.wins)]
+
+        first.merge(second)
+        self.assertEqual(first.games, 30)
+        self.assertListEqual(first.wins, wins)
+        self.assertEqual(sum(first.wins) + first.unfinished, 30)
+        self.assertEqual(sum(first.lengths.values()), 30)
+
+    def test_shard_seeds(self):
+        self.assertListEqual(tournament.shard_seeds(5, 4), tournament.shard_seeds(5, 4))
+        self.assertEqual(len(set(tournament.shard_seeds(5, 4))), 4,
+                         "Each shard should have a different seed")
+
+
 def main():
     test_cases = [
         TestDesign,
@@ -549,6 +1771,22 @@ def main():
         TestDeck,
         TestPlayer,
         TestGameplay,
+        TestWinner,
+        TestRecycle,
+        TestCardEncoding,
+        TestSlots,
+        TestSnapshot,
+        TestSimulation,
+        TestTournament,
+        TestMCTS,
+        TestMoveLog,
+        TestArchive,
+        TestServer,
+        TestRouter,
+        TestPersistence,
+        TestBenchmark,
+        TestInstrument,
+        TestMetrics,
     ]
 
     master = TestMaster()
@@ -3,7 +3,10 @@ CSSE1001 Semester 2, 2018
 UNO++ Support Code
 """
 import random
+from collections import namedtuple
 from enum import Enum
+from itertools import islice
+from time import perf_counter_ns
 
 from a2 import Card, SkipCard, ReverseCard, Pickup2Card, Pickup4Card
 from a2 import Deck, Player, ComputerPlayer, HumanPlayer
@@ -57,10 +60,165 @@ FULL_DECK = [
 SPECIAL_CARDS = [Pickup4Card]
 
 
+class RecyclePolicy(Enum):
+    """
+    What a game does when its pickup pile runs out of cards.
+    """
+    # raise an IndexError, as picking from an empty deck does
+    fail = "fail"
+    # shuffle the played cards, except the top card, back into the pickup pile
+    reshuffle = "reshuffle"
+    # end the game without a winner
+    draw = "draw"
+
+
+class TurnAction(Enum):
+    """
+    What a player did with their turn.
+    """
+    # played a card which matched the top of the putdown pile
+    play = "play"
+    # picked up a card instead of playing one
+    draw = "draw"
+    # picked a card which could not be played, and lost it
+    discard = "discard"
+
+
+TurnEvent = namedtuple("TurnEvent", ["player", "action", "card", "target",
+                                     "pickups", "reversed"])
+TurnEvent.__doc__ = """
+A single turn taken in a game, as yielded by UnoGame.iter_turns.
+
+Attributes:
+    player (Player): The player who took the turn.
+    action (TurnAction): What the player did with their turn.
+    card (Card): The card played, drawn or discarded,
+                 None if the player drew from an empty pickup pile.
+    target (Player): The player who picked up cards during the turn, the
+                     player themselves when drawing, or the next player when
+                     a pickup card is played. None if no cards were picked up.
+    pickups (tuple<Card>): The cards the target picked up.
+    reversed (bool): True iff the order of turns was reversed.
+"""
+
+# card encoding: (type, colour, number) packed into a small integer
+CARD_TYPES = (Card, SkipCard, ReverseCard, Pickup2Card, Pickup4Card)
+CARD_COLOURS = tuple(CardColour)
+CARD_NUMBERS = range(-1, 10)
+CARD_CODES = len(CARD_TYPES) * len(CARD_COLOURS) * len(CARD_NUMBERS)
+
+_TYPE_OFFSETS = {card_type: index * len(CARD_COLOURS) * len(CARD_NUMBERS)
+                 for index, card_type in enumerate(CARD_TYPES)}
+_COLOUR_OFFSETS = {colour: index * len(CARD_NUMBERS)
+                   for index, colour in enumerate(CARD_COLOURS)}
+
+
+def encode_card(card):
+    """
+    Encode the type, colour and number of a card as a small integer.
+
+    Codes are ordered by card type, then colour, then number.
+
+    Parameters:
+        card (Card): The card to encode.
+
+    Returns:
+        (int): The code of the card, between 0 and CARD_CODES.
+
+    Raises:
+        ValueError: If the card's number is not in CARD_NUMBERS.
+    """
+    if card._code is not None:
+        return card._code
+
+    number = card.get_number()
+    if number not in CARD_NUMBERS:
+        raise ValueError(f"cannot encode {card!r}, number out of range")
+
+    return (_TYPE_OFFSETS[card.__class__] + _COLOUR_OFFSETS[card.get_colour()]
+            + number - CARD_NUMBERS.start)
+
+
+def _intern_card(code):
+    """
+    (Card) Constructs the shared card for a code.
+
+    Parameters:
+        code (int): The code of the card.
+    """
+    rest, number = divmod(code, len(CARD_NUMBERS))
+    card_type, colour = divmod(rest, len(CARD_COLOURS))
+
+    card = CARD_TYPES[card_type](CARD_NUMBERS[number], CARD_COLOURS[colour])
+    card._code = code
+    return card
+
+
+# a single shared, unmodifiable card for each code
+_SHARED_CARDS = [_intern_card(code) for code in range(CARD_CODES)]
+
+
+def decode_card(code):
+    """
+    (Card) Returns the shared card for a code.
+
+    The same card is returned for every call with a code, and it cannot be
+    modified, so it may appear in many decks and games at once.
+
+    Parameters:
+        code (int): The code of the card.
+    """
+    return _SHARED_CARDS[code]
+
+
+def _build_match_table():
+    """
+    (list<bytes>) Returns the result of matching every pair of shared cards,
+    using Card.matches.
+    """
+    return [bytes(card.matches(top) for card in _SHARED_CARDS)
+            for top in _SHARED_CARDS]
+
+
+# MATCH_TABLE[top code][card code] is 1 iff the card can be placed on top
+MATCH_TABLE = _build_match_table()
+
+
+def card_matches(card, top):
+    """
+    Determines if a card can be placed on top of another card.
+
+    Shared cards are matched with a lookup in MATCH_TABLE, other cards fall
+    back to Card.matches.
+
+    Parameters:
+        card (Card): The card to be placed.
+        top (Card): The card on top of the pile.
+
+    Returns:
+        (bool): True iff the card matches the top card.
+    """
+    if card._code is not None and top._code is not None:
+        return MATCH_TABLE[top._code][card._code] == 1
+    return card.matches(top)
+
+
+def decode_cards(codes):
+    """
+    (list<Card>) Returns the shared cards for a sequence of codes.
+
+    Parameters:
+        codes (iterable<int>): The codes of the cards.
+    """
+    return list(map(_SHARED_CARDS.__getitem__, codes))
+
+
 class TurnManager:
     """
     A class to manage the order of turns amongst game players.
     """
+    __slots__ = ("_players", "_direction", "_location", "_max")
+
     def __init__(self, players):
         """
         Construct a new turn manager to based on game players.
@@ -102,6 +260,27 @@ class TurnManager:
         location %= self._max
         return self._players[location]
 
+    def snapshot(self):
+        """
+        (tuple<int, bool>) Returns the location and direction of play.
+        """
+        return self._location, self._direction
+
+    def restore(self, snapshot):
+        """
+        Return to the location and direction of play of a snapshot.
+
+        Parameters:
+            snapshot (tuple<int, bool>): The state returned by snapshot.
+        """
+        self._location, self._direction = snapshot
+
+    def get_direction(self):
+        """
+        (bool) Returns True iff turns are taken in the order players started in.
+        """
+        return self._direction
+
     def reverse(self):
         """
         Reverse the order of turns.
@@ -118,20 +297,50 @@ class TurnManager:
         return self._players[self._location]
 
 
+def make_rng(seed=None):
+    """
+    (random.Random): Returns a random number generator for the given seed.
+
+    Parameters:
+        seed (int|random.Random): The seed of a new, independent generator,
+                                  or a generator which is returned as is.
+                                  If None, the global random module is used.
+    """
+    if seed is None:
+        return random
+    if isinstance(seed, (int, str, bytes)):
+        return random.Random(seed)
+    return seed
+
+
 class UnoGame:
     """
     A game of Uno++.
     """
-    def __init__(self, deck, players):
+    def __init__(self, deck, players, recycle=RecyclePolicy.fail, rng=None):
         """
         Construct a game of uno from a pickup pile and list of players.
 
+        The pickup pile is shuffled by the game when recycling played cards,
+        so a game whose pickup pile was shuffled by a seeded generator, and
+        which is given the same generator, plays out the same every time.
+
         Parameters:
             deck (Deck): The pile of cards to pickup from.
             players (list<Player>): The players in this game of uno.
+            recycle (RecyclePolicy): What to do when the pickup pile runs out.
+            rng (random.Random|int): The random number generator, or seed,
+                                     the game shuffles with. If None, the
+                                     pickup pile's own generator is kept.
         """
+        if rng is not None:
+            deck.set_rng(rng)
+
         self.pickup_pile = deck
+        self.rng = deck.get_rng()
         self.players = players
+        self.recycle = recycle
+        self.recycles = 0
 
         self._turns = TurnManager(players)
 
@@ -139,8 +348,15 @@ class UnoGame:
         self.special_pile = Deck()
 
         self._is_over = False
+        self._checked = False
         self.winner = None
 
+        # told of every turn and recycle when set, see movelog.MoveLog
+        self.recorder = None
+        # times each phase of the turns taken and cards selected when set,
+        # see instrument.TurnProfile
+        self.profile = None
+
     def next_player(self):
         """
         Changes to the next player in the game and returns an instance of them.
@@ -171,7 +387,27 @@ class UnoGame:
     def is_over(self):
         """
         (bool): True iff the game has been won. Assigns the winner variable.
+
+        Players are checked for an empty hand the first time this is called,
+        afterwards a player wins as soon as a card leaving their hand in
+        take_turn, select_card or finish_turn empties it. Only these methods
+        notice a hand being emptied, so after taking cards off a hand in any
+        other way, such as with Deck.pick or Deck.pick_at, call check_hands.
         """
+        if not self._checked:
+            self.check_hands()
+
+        return self._is_over
+
+    def check_hands(self):
+        """
+        Check every player for an empty hand, and assign a player with one as
+        the winner.
+
+        Returns:
+            (bool): True iff the game is over.
+        """
+        self._checked = True
         for player in self.players:
             if player.has_won():
                 self.winner = player
@@ -179,9 +415,124 @@ class UnoGame:
 
         return self._is_over
 
+    def _check_won(self, player):
+        """
+        Assign the winner if a card leaving the player's hand emptied it.
+
+        Parameters:
+            player (Player): The player who lost a card from their hand.
+        """
+        if player.get_deck().get_amount() == 0:
+            self.winner = player
+            self._is_over = True
+
+    def pickup(self, amount=1):
+        """
+        Take cards off the top of the pickup pile.
+
+        If the pickup pile does not have enough cards, the recycle policy of
+        the game decides what happens. When reshuffling, a pickup pile which
+        is still short after recycling gives up the cards it has. When the
+        game ends as a draw, no cards are picked up.
+
+        Parameters:
+            amount (int): The amount of cards to pickup.
+
+        Returns:
+            (list<Card>): The cards picked up, top card first.
+
+        Raises:
+            IndexError: If the pickup pile is short and the policy is to fail.
+        """
+        available = self.pickup_pile.get_amount()
+
+        if available < amount:
+            if self.recycle is RecyclePolicy.reshuffle:
+                self.recycle_piles()
+                amount = min(amount, self.pickup_pile.get_amount())
+            elif self.recycle is RecyclePolicy.draw:
+                self.winner = None
+                self._is_over = True
+                return []
+
+        return self.pickup_pile.pick(amount)
+
+    def recycle_piles(self):
+        """
+        Shuffle every played card, except the top of the putdown pile, back
+        into the pickup pile. Does nothing if there are no such cards.
+        """
+        putdown = self.putdown_pile
+        if putdown.get_amount() < 2 and self.special_pile.get_amount() == 0:
+            return
+
+        top = putdown.pick()
+        cards = putdown.pick(putdown.get_amount())
+        putdown.add_cards(top)
+
+        cards.extend(self.special_pile.pick(self.special_pile.get_amount()))
+
+        self.pickup_pile.add_cards(cards)
+        self.pickup_pile.shuffle()
+        self.recycles += 1
+
+        if self.recorder is not None:
+            self.recorder.recycled(self.pickup_pile.get_cards())
+
+    def snapshot(self):
+        """
+        Capture the state of the game, so it can be restored later.
+
+        Each pile and hand is captured by its deck's snapshot, which shares
+        the cards of a deck which has not changed since its last snapshot,
+        rather than copying them. The random number generator is not captured.
+
+        Returns:
+            (tuple): The state of the game, only to be passed to restore.
+        """
+        return (self.pickup_pile.snapshot(), self.putdown_pile.snapshot(),
+                self.special_pile.snapshot(),
+                tuple([player.get_deck().snapshot() for player in self.players]),
+                self._turns.snapshot(), self.recycles,
+                self._is_over, self._checked, self.winner)
+
+    def restore(self, snapshot):
+        """
+        Return to the state of a snapshot of this game.
+
+        Decks which have not changed since the snapshot are left as they are,
+        so restoring costs at most the size of the changed piles and hands.
+
+        Parameters:
+            snapshot (tuple): The state returned by snapshot.
+        """
+        (pickup, putdown, special, hands, turns, self.recycles,
+         self._is_over, self._checked, self.winner) = snapshot
+
+        self.pickup_pile.restore(pickup)
+        self.putdown_pile.restore(putdown)
+        self.special_pile.restore(special)
+        for player, hand in zip(self.players, hands):
+            player.get_deck().restore(hand)
+        self._turns.restore(turns)
+
     def select_card(self, player, card):
         """Perform actions for a player selecting a card
 
+        Parameters:
+            player (Player): The selecting player.
+            card (Card): The card to select.
+        """
+        profile = self.profile
+        if profile is None:
+            self._select_card(player, card)
+        else:
+            self._time_select_card(player, card, profile, perf_counter_ns())
+
+    def _select_card(self, player, card):
+        """
+        Perform actions for a player selecting a card, without timing them.
+
         Parameters:
             player (Player): The selecting player.
             card (Card): The card to select.
@@ -192,21 +543,160 @@ class UnoGame:
         else:
             self.putdown_pile.add_card(card)
 
+        self._check_won(player)
+
+        if self.recorder is not None:
+            self.recorder.played(card)
+
+    def _time_select_card(self, player, card, profile, start, matched=None):
+        """
+        Perform actions for a player selecting a card, timing each phase.
+
+        Parameters:
+            player (Player): The selecting player.
+            card (Card): The card to select.
+            profile (TurnProfile): The profile to add the times to.
+            start (int): The clock, in nanoseconds, when the play started.
+            matched (int): The clock when the card was matched against the
+                           top of the putdown pile, None if it was not.
+        """
+        card.play(player, self)
+        played = perf_counter_ns()
+        if card.__class__ in SPECIAL_CARDS:
+            self.special_pile.add_card(card)
+        else:
+            self.putdown_pile.add_card(card)
+        piled = perf_counter_ns()
+
+        self._check_won(player)
+        checked = perf_counter_ns()
+
+        recorded = None
+        if self.recorder is not None:
+            self.recorder.played(card)
+            recorded = perf_counter_ns()
+
+        profile.add_play(card, start, matched, played, piled, checked,
+                         recorded)
+
+    def draw(self, player):
+        """
+        Perform actions for a player picking up a card instead of playing one.
+
+        Parameters:
+            player (Player): The drawing player.
+        """
+        player.get_deck().add_cards(self.pickup())
+
+        if self.recorder is not None:
+            self.recorder.drew()
+
     def take_turn(self, player):
         """
         Takes the turn of the given player by having them select a card.
 
         Parameters:
             player (Player): The player whose turn it is.
+
+        Returns:
+            (Card): The card the player picked from their hand,
+                    None if they picked up a card instead.
         """
+        profile = self.profile
+        if profile is None:
+            card = player.pick_card(self.putdown_pile)
+            self._finish_turn(player, card)
+            return card
+
+        start = perf_counter_ns()
         card = player.pick_card(self.putdown_pile)
+        picked = perf_counter_ns()
+        self._time_finish_turn(player, card, profile)
+        profile.add_turn(start, picked, perf_counter_ns())
+        return card
+
+    def finish_turn(self, player, card):
+        """
+        Complete a player's turn with the card they took from their hand.
 
+        A card which matches the top of the putdown pile is played, any other
+        card is discarded, and a player who took no card picks one up.
+
+        Parameters:
+            player (Player): The player whose turn it is.
+            card (Card): The card the player took from their hand, or None.
+
+        Returns:
+            (TurnAction): What the player did with their turn.
+        """
+        profile = self.profile
+        if profile is None:
+            return self._finish_turn(player, card)
+        return self._time_finish_turn(player, card, profile)
+
+    def _finish_turn(self, player, card):
+        """
+        Complete a player's turn, without timing it, see finish_turn.
+
+        Parameters:
+            player (Player): The player whose turn it is.
+            card (Card): The card the player took from their hand, or None.
+
+        Returns:
+            (TurnAction): What the player did with their turn.
+        """
         if card is None:
-            player.get_deck().add_cards(self.pickup_pile.pick())
-            return
+            self.draw(player)
+            return TurnAction.draw
+
+        if card_matches(card, self.putdown_pile.top()):
+            self._select_card(player, card)
+            return TurnAction.play
+
+        self._check_won(player)
+
+        if self.recorder is not None:
+            self.recorder.passed(card)
+        return TurnAction.discard
 
-        if card.matches(self.putdown_pile.top()):
-            self.select_card(player, card)
+    def _time_finish_turn(self, player, card, profile):
+        """
+        Complete a player's turn, timing each phase, see finish_turn.
+
+        Parameters:
+            player (Player): The player whose turn it is.
+            card (Card): The card the player took from their hand, or None.
+            profile (TurnProfile): The profile to add the times to.
+
+        Returns:
+            (TurnAction): What the player did with their turn.
+        """
+        recorder = self.recorder
+        recorded = None
+        start = perf_counter_ns()
+
+        if card is None:
+            player.get_deck().add_cards(self.pickup())
+            piled = perf_counter_ns()
+            if recorder is not None:
+                recorder.drew()
+                recorded = perf_counter_ns()
+            profile.add_draw(start, piled, recorded)
+            return TurnAction.draw
+
+        matches = card_matches(card, self.putdown_pile.top())
+        matched = perf_counter_ns()
+        if matches:
+            self._time_select_card(player, card, profile, start, matched)
+            return TurnAction.play
+
+        self._check_won(player)
+        checked = perf_counter_ns()
+        if recorder is not None:
+            recorder.passed(card)
+            recorded = perf_counter_ns()
+        profile.add_discard(start, matched, checked, recorded)
+        return TurnAction.discard
 
     def take_turns(self):
         """
@@ -218,6 +708,54 @@ class UnoGame:
             if player.has_won():
                 return
 
+    def iter_turns(self, max_turns=None):
+        """
+        Lazily play the game, taking the next player's turn each time an
+        event is asked for, until the game is over.
+
+        Turns are taken in the same order as UnoApp.step. Stopping iteration
+        early leaves the game as it was after the last turn yielded.
+
+        Parameters:
+            max_turns (int): The most turns to take, if None, there is no limit.
+
+        Yields:
+            (TurnEvent): What happened in each turn, after it was taken.
+
+        Raises:
+            IndexError: If the pickup pile runs out and the policy is to fail.
+        """
+        turns = self._turns
+        taken = 0
+
+        while not self.is_over() and (max_turns is None or taken < max_turns):
+            player = turns.next()
+            hand = player.get_deck()
+            target = turns.peak()
+            target_hand = target.get_deck()
+            top = self.putdown_pile.top()
+            direction = turns.get_direction()
+            before = hand.get_amount()
+            target_before = target_hand.get_amount()
+
+            card = self.take_turn(player)
+            taken += 1
+
+            if card is None:
+                pickups = tuple(islice(hand.get_cards(), before, None))
+                yield TurnEvent(player, TurnAction.draw,
+                                pickups[0] if pickups else None,
+                                player if pickups else None, pickups, False)
+            elif card_matches(card, top):
+                pickups = tuple(islice(target_hand.get_cards(),
+                                       target_before, None))
+                yield TurnEvent(player, TurnAction.play, card,
+                                target if pickups else None, pickups,
+                                turns.get_direction() != direction)
+            else:
+                yield TurnEvent(player, TurnAction.discard, card, None, (),
+                                False)
+
 
 def build_deck(structure, range_cards=(Card, )):
     """
@@ -247,13 +785,49 @@ def build_deck(structure, range_cards=(Card, )):
     return deck
 
 
-def generate_name():
+def build_deck_codes(structure, range_cards=(Card, )):
+    """
+    Construct the codes of a deck from a simplified deck structure.
+
+    Equivalent to encoding every card of build_deck(structure, range_cards).
+
+    Parameters:
+        structure (list<tuple>): The simplified deck structure.
+        range_cards (tuple<Card>): Cards whose numbers should be updated from -1.
+
+    Returns:
+        (list<int>): The code of each card in the deck.
+    """
+    codes = []
+
+    for (card, (start, end)) in structure:
+        # encode the card numbered -1, and step the number if it is ranged
+        code = _TYPE_OFFSETS[card.__class__] \
+            + _COLOUR_OFFSETS[card.get_colour()]
+        if card.__class__ in range_cards:
+            codes.extend(range(code + start - CARD_NUMBERS.start,
+                               code + end - CARD_NUMBERS.start))
+        else:
+            codes.extend([code] * (end - start))
+
+    return codes
+
+
+FULL_DECK_CODES = tuple(build_deck_codes(FULL_DECK))
+
+
+def generate_name(rng=None):
     """
     (str): Selects a random name from a list of player names.
+
+    Parameters:
+        rng (random.Random|int): The random number generator, or seed, to
+                                 select with. If None, the global random
+                                 module is used.
     """
     with open("players.txt", "r") as file:
         names = file.readlines()
-    return random.choice(names).strip()
+    return make_rng(rng).choice(names).strip()
 
 
 def main():
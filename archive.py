@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+UNO++ Replay Archive
+
+Stores the move logs of many games in a single file, followed by an index of
+the offset of each log. The archive is read through mmap, so the log of any
+game is found with a lookup in the index and decoded without reading the
+rest of the file.
+
+Layout, with every integer an unsigned 64 bit little-endian integer:
+    MAGIC, log 0, log 1, ..., log n - 1,
+    index: the offset of log 0, ..., the offset of log n - 1, the index offset,
+    footer: the index offset, n, MAGIC
+"""
+import mmap
+import random
+import struct
+import sys
+import time
+from array import array
+
+from a2_support import FULL_DECK_CODES, decode_cards
+from movelog import MoveLog, replay
+from simulation import new_game, play_game
+
+MAGIC = b"UNOARC01"
+
+OFFSET = struct.Struct("<Q")
+OFFSETS = struct.Struct("<2Q")
+FOOTER = struct.Struct("<2Q8s")
+
+
+class ArchiveWriter:
+    """
+    Appends move logs to a new archive file.
+
+    The archive can only be read once the writer has been closed.
+    """
+    def __init__(self, path):
+        """
+        Create an archive file, replacing any file at the path.
+
+        Parameters:
+            path (str): The path of the archive.
+        """
+        self._file = open(path, "wb")
+        self._file.write(MAGIC)
+        self._offsets = array("Q")
+        self._position = len(MAGIC)
+
+    def add(self, log):
+        """
+        Append the log of a game to the archive.
+
+        Parameters:
+            log (bytes): A move log, such as MoveLog.to_bytes().
+
+        Returns:
+            (int): The index of the game in the archive.
+        """
+        self._offsets.append(self._position)
+        self._file.write(log)
+        self._position += len(log)
+        return len(self._offsets) - 1
+
+    def close(self):
+        """
+        Write the index and footer of the archive and close its file.
+        """
+        if self._file.closed:
+            return
+
+        index_offset = self._position
+        self._offsets.append(index_offset)
+        if sys.byteorder != "little":
+            self._offsets.byteswap()
+
+        self._file.write(self._offsets.tobytes())
+        self._file.write(FOOTER.pack(index_offset, len(self._offsets) - 1,
+                                     MAGIC))
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class Archive:
+    """
+    A read-only, memory mapped archive of move logs.
+    """
+    def __init__(self, path):
+        """
+        Open an archive written by ArchiveWriter.
+
+        Parameters:
+            path (str): The path of the archive.
+
+        Raises:
+            ValueError: If the file is not an archive.
+        """
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        except ValueError:
+            # an empty file cannot be mapped
+            self._file.close()
+            raise ValueError(f"{path} is not an UNO++ archive")
+
+        data = self._map
+        if len(data) < len(MAGIC) + OFFSET.size + FOOTER.size \
+                or data[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not an UNO++ archive")
+
+        self._index, self._games, magic = FOOTER.unpack_from(
+            data, len(data) - FOOTER.size)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not an UNO++ archive")
+
+    def __len__(self):
+        """
+        (int) Returns the amount of games in the archive.
+        """
+        return self._games
+
+    def get_log(self, game):
+        """
+        Read the log of a game, without reading any other part of the archive.
+
+        Parameters:
+            game (int): The index of the game.
+
+        Returns:
+            (bytes): The move log of the game.
+
+        Raises:
+            IndexError: If the archive has no game with the index.
+        """
+        if not 0 <= game < self._games:
+            raise IndexError(f"game {game} is not in the archive")
+
+        start, end = OFFSETS.unpack_from(self._map,
+                                         self._index + game * OFFSET.size)
+        return self._map[start:end]
+
+    def get_game(self, game, turns=None):
+        """
+        Rebuild a game from the archive.
+
+        Parameters:
+            game (int): The index of the game.
+            turns (int): The amount of turns to replay,
+                         if None, every recorded turn is replayed.
+
+        Returns:
+            (UnoGame): The game as it was after the turns were taken.
+        """
+        return replay(self.get_log(game), turns)
+
+    def close(self):
+        """
+        Unmap the archive and close its file.
+        """
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def write_games(path, games):
+    """
+    Play seeded games between computer players and archive their logs.
+
+    Parameters:
+        path (str): The path of the archive.
+        games (int): The amount of games to play, seeded 0 upwards.
+    """
+    cards = decode_cards(FULL_DECK_CODES)
+
+    with ArchiveWriter(path) as writer:
+        for seed in range(games):
+            game = new_game(cards, rng=seed)
+            log = MoveLog(game, seed)
+            play_game(game)
+            writer.add(log.to_bytes())
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else "games.unoarc"
+    games = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    lookups = 1000
+
+    start = time.perf_counter()
+    write_games(path, games)
+    elapsed = time.perf_counter() - start
+    print(f"Archived {games} games in {elapsed:.2f}s")
+
+    rng = random.Random(0)
+    with Archive(path) as archive:
+        picks = [rng.randrange(len(archive)) for _ in range(lookups)]
+
+        start = time.perf_counter()
+        for game in picks:
+            archive.get_log(game)
+        log_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for game in picks:
+            archive.get_game(game, turns=57)
+        turn_time = time.perf_counter() - start
+
+    print(f"Reading a random game's log: {log_time / lookups * 1e6:.1f}us")
+    print(f"Rebuilding a random game at turn 57: "
+          f"{turn_time / lookups * 1e6:.0f}us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+UNO++ Batched Computer Players
+
+Chooses the cards of many computer players, in many games, with a single
+lookup in MATCH_TABLE. The hands are packed into one array of card codes,
+padded to the longest hand, and the first matching card of every hand is
+found at once, so the same cards are chosen as ComputerPlayer.pick_card
+would choose, one hand at a time. Requires NumPy.
+"""
+import sys
+import time
+from itertools import chain
+from operator import attrgetter
+
+import numpy as np
+
+from a2 import Deck, CodeDeck, ComputerPlayer
+from a2_support import FULL_DECK_CODES, CARD_CODES, MATCH_TABLE
+from a2_support import encode_card, decode_cards
+from simulation import MAX_TURNS, new_game
+
+# the code hands are padded with, which matches no card
+PAD = CARD_CODES
+
+# reads the code of a shared card, or None for a card which is not shared
+CARD_CODE = attrgetter("_code")
+
+# MATCH_CODES[top code, card code] is True iff the card can be placed on top
+MATCH_CODES = np.zeros((CARD_CODES + 1, CARD_CODES + 1), dtype=bool)
+MATCH_CODES[:CARD_CODES, :CARD_CODES] = np.frombuffer(
+    b"".join(MATCH_TABLE), dtype=np.uint8).reshape(CARD_CODES, CARD_CODES)
+
+
+class CodeComputerPlayer(ComputerPlayer):
+    """
+    A computer player who keeps their hand as a CodeDeck, so take_turns
+    chooses their cards in batches.
+    """
+    __slots__ = ()
+
+    def __init__(self, name):
+        """
+        Construct a computer player with an empty hand.
+
+        Parameters:
+            name (str): The player's name.
+        """
+        super().__init__(name)
+        self._deck = CodeDeck()
+
+
+def choose_cards(hands, tops):
+    """
+    Find the first card in each hand which matches its top card.
+
+    Hands stored as a CodeDeck are read without visiting each card, so they
+    are chosen from faster than hands stored as a list of cards, whose codes
+    are read one card at a time.
+
+    Parameters:
+        hands (list<Deck>): The hands to choose from.
+        tops (list<Card>): The top card of the putdown pile for each hand.
+
+    Returns:
+        (np.ndarray<int>): The position in get_cards() of the chosen card in
+                           each hand, or -1 if no card in the hand matches.
+
+    Raises:
+        ValueError: If a card in the hands or tops cannot be encoded.
+    """
+    if not hands:
+        return np.zeros(0, dtype=np.intp)
+
+    lengths = np.array(list(map(Deck.get_amount, hands)), dtype=np.intp)
+    total = int(lengths.sum())
+
+    if all(isinstance(hand, CodeDeck) for hand in hands):
+        codes = np.frombuffer(b"".join([hand.get_codes().tobytes()
+                                        for hand in hands]), dtype=np.uint16)
+        top_codes = np.array(list(map(encode_card, tops)), dtype=np.intp)
+    else:
+        cards = chain.from_iterable(map(Deck.get_cards, hands))
+        try:
+            codes = np.fromiter(map(CARD_CODE, cards), dtype=np.uint16,
+                                count=total)
+            top_codes = np.array(list(map(CARD_CODE, tops)), dtype=np.intp)
+        except TypeError:
+            # a card is not shared, so its code is None and every card is
+            # encoded instead
+            cards = chain.from_iterable(map(Deck.get_cards, hands))
+            codes = np.fromiter(map(encode_card, cards), dtype=np.uint16,
+                                count=total)
+            top_codes = np.array(list(map(encode_card, tops)), dtype=np.intp)
+
+    width = max(int(lengths.max()), 1)
+    padded = np.full((len(hands), width), PAD, dtype=np.uint16)
+    padded[np.arange(width) < lengths[:, None]] = codes
+
+    matches = MATCH_CODES[top_codes[:, None], padded]
+    first = matches.argmax(axis=1)
+    found = matches[np.arange(len(hands)), first]
+    return np.where(found, first, -1)
+
+
+def pick_cards(hands, tops):
+    """
+    Take the first card in each hand which matches its top card off the hand,
+    as Deck.pick_match does for a single hand.
+
+    Parameters:
+        hands (list<Deck>): The hands to pick from.
+        tops (list<Card>): The top card of the putdown pile for each hand.
+
+    Returns:
+        (list<Card>): The card taken from each hand, or None for each hand
+                      without a matching card.
+    """
+    return [hand.pick_at(position) if position >= 0 else None
+            for hand, position in zip(hands, choose_cards(hands, tops).tolist())]
+
+
+def take_turns(games):
+    """
+    Take the turn of the next player in each of many games.
+
+    Each game moves on to its next player and takes their turn, as
+    UnoGame.take_turn(game.next_player()) does. The cards of players who play
+    as a ComputerPlayer and keep their hand as a CodeDeck are chosen together
+    by pick_cards, and their turns finished by UnoGame.finish_turn. Every
+    other player takes their turn by UnoGame.take_turn, as reading the codes
+    of a hand stored as a list costs more than choosing its card one hand at
+    a time.
+
+    Parameters:
+        games (list<UnoGame>): The games to take a turn in.
+    """
+    batched_games = []
+    batched_players = []
+    for game in games:
+        player = game.next_player()
+        if player.__class__.pick_card is ComputerPlayer.pick_card \
+                and isinstance(player.get_deck(), CodeDeck):
+            batched_games.append(game)
+            batched_players.append(player)
+        else:
+            game.take_turn(player)
+
+    if not batched_games:
+        return
+
+    cards = pick_cards([player.get_deck() for player in batched_players],
+                       [game.putdown_pile.top() for game in batched_games])
+    for game, player, card in zip(batched_games, batched_players, cards):
+        game.finish_turn(player, card)
+
+
+def play_rounds(games, rounds, batched):
+    """
+    Take a turn in every unfinished game, for a number of rounds.
+
+    Parameters:
+        games (list<UnoGame>): The games to play.
+        rounds (int): The amount of turns to take in each game.
+        batched (bool): Whether turns are taken together by take_turns,
+                        or one game at a time by UnoGame.take_turn.
+
+    Returns:
+        (int): The amount of turns taken.
+    """
+    turns = 0
+    for _ in range(rounds):
+        playing = [game for game in games if not game.is_over()]
+        if batched:
+            take_turns(playing)
+        else:
+            for game in playing:
+                game.take_turn(game.next_player())
+        turns += len(playing)
+    return turns
+
+
+def decision_time(hands, tops, batched):
+    """
+    Measure the time taken to choose a card from each of many hands.
+
+    Parameters:
+        hands (list<Deck>): The hands to choose from, which are restored
+                            after each card is taken.
+        tops (list<Card>): The top card of the putdown pile for each hand.
+        batched (bool): Whether cards are chosen together by choose_cards,
+                        or one hand at a time by Deck.pick_match.
+
+    Returns:
+        (float): The mean seconds taken for each hand.
+    """
+    snapshots = [hand.snapshot() for hand in hands]
+
+    start = time.perf_counter()
+    if batched:
+        choose_cards(hands, tops)
+    else:
+        for hand, top in zip(hands, tops):
+            hand.pick_match(top)
+    elapsed = time.perf_counter() - start
+
+    for hand, snapshot in zip(hands, snapshots):
+        hand.restore(snapshot)
+    return elapsed / len(hands)
+
+
+def main():
+    tables = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    cards = decode_cards(FULL_DECK_CODES)
+
+    games = [new_game(cards, rng=seed) for seed in range(tables)]
+    hands = [player.get_deck() for game in games for player in game.players]
+    tops = [game.putdown_pile.top() for game in games
+            for _ in game.players]
+
+    print(f"Decision time per hand, {len(hands)} hands:")
+    for name, decks in (("Deck", hands),
+                        ("CodeDeck", [CodeDeck(hand.get_cards())
+                                      for hand in hands])):
+        for batched in (False, True):
+            method = "choose_cards" if batched else "pick_match"
+            seconds = min(decision_time(decks, tops, batched)
+                          for _ in range(5))
+            print(f"    {name}, {method}: {seconds * 1e9:.0f}ns")
+
+    print(f"Turns per second across {tables} tables:")
+    for player_class in (ComputerPlayer, CodeComputerPlayer):
+        for batched in (False, True):
+            games = [new_game(cards, rng=seed, player_class=player_class)
+                     for seed in range(tables)]
+
+            start = time.perf_counter()
+            turns = play_rounds(games, min(rounds, MAX_TURNS), batched)
+            elapsed = time.perf_counter() - start
+
+            name = "take_turns" if batched else "UnoGame.take_turn"
+            print(f"    {player_class.__name__}, {name}: "
+                  f"{turns / elapsed:,.0f}")
+
+
+if __name__ == "__main__":
+    main()
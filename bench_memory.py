@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+UNO++ Memory Benchmark
+
+Measures the memory held by live, dealt games of UNO++, both for games built
+from freshly allocated cards and for games built from shared cards, with the
+cards, decks, players and turn managers declaring __slots__ and without.
+
+Objects without __slots__ are instances of copies of their classes which
+keep their attributes in a __dict__, as the classes did before declaring
+__slots__. Every figure is measured by tracemalloc over many live copies of
+the same objects, so it includes each object's share of the memory the
+interpreter allocates for instances of its class.
+"""
+import gc
+import sys
+import tracemalloc
+from array import array
+from collections import deque
+
+from a2 import Card, Deck, Player, ComputerPlayer
+from a2_support import FULL_DECK, FULL_DECK_CODES, build_deck, decode_cards
+from a2_support import CardColour, TurnManager, UnoGame
+from simulation import new_game
+
+# the classes which declare __slots__, and everything derived from them
+SLOTTED_CLASSES = (Card, Deck, Player, TurnManager)
+
+# the copy of each slotted class without __slots__, by the slotted class
+_unslotted_classes = {}
+
+
+def slot_names(cls):
+    """
+    (list<str>) Returns the name of every slot of a class and its bases.
+
+    Parameters:
+        cls (type): The class.
+    """
+    return [name for base in reversed(cls.__mro__)
+            for name in base.__dict__.get("__slots__", ())]
+
+
+def unslotted_class(cls):
+    """
+    (type) Returns a copy of a class and its bases without __slots__, whose
+    instances keep the same attributes in a __dict__.
+
+    The copy has the same methods, but is only measured, never used.
+
+    Parameters:
+        cls (type): The slotted class.
+    """
+    if cls is object:
+        return object
+
+    unslotted = _unslotted_classes.get(cls)
+    if unslotted is None:
+        slots = cls.__dict__.get("__slots__", ())
+        namespace = {name: value for name, value in cls.__dict__.items()
+                     if name not in slots
+                     and name not in ("__slots__", "__dict__", "__weakref__")}
+        bases = tuple(unslotted_class(base) for base in cls.__bases__)
+        unslotted = _unslotted_classes[cls] = type(cls.__name__, bases,
+                                                   namespace)
+    return unslotted
+
+
+def copy_object(obj, slots, memo):
+    """
+    Copy the objects of a game, with or without __slots__.
+
+    Cards, decks, players, turn managers, games and the containers holding
+    them are copied. Any other object, such as a random number generator or
+    a colour, is shared with the original.
+
+    Parameters:
+        obj (object): The object to copy.
+        slots (bool): Whether slotted objects are copied as instances of
+                      their own class, or of its unslotted_class.
+        memo (dict<int, object>): The copy of each object already copied,
+                                  by the object's id, so objects shared
+                                  between copies stay shared.
+
+    Returns:
+        (object): The copy.
+    """
+    copy = memo.get(id(obj))
+    if copy is not None:
+        return copy
+
+    cls = obj.__class__
+    if cls in (list, tuple, deque):
+        copy = cls(copy_object(item, slots, memo) for item in obj)
+    elif cls is array:
+        copy = array(obj.typecode, obj)
+    elif isinstance(obj, SLOTTED_CLASSES):
+        copy = object.__new__(cls if slots else unslotted_class(cls))
+        for name in slot_names(cls):
+            if hasattr(obj, name):
+                setattr(copy, name,
+                        copy_object(getattr(obj, name), slots, memo))
+    elif isinstance(obj, UnoGame):
+        copy = object.__new__(cls)
+        for name, value in vars(obj).items():
+            setattr(copy, name, copy_object(value, slots, memo))
+    else:
+        return obj
+
+    memo[id(obj)] = copy
+    return copy
+
+
+def live_bytes(objects, slots):
+    """
+    Measure the memory held by live copies of objects.
+
+    Objects shared by the originals, such as shared cards, are copied once
+    and shared by the copies.
+
+    Parameters:
+        objects (list<object>): The objects to copy.
+        slots (bool): Whether the copies declare __slots__.
+
+    Returns:
+        (float): The mean amount of bytes held by each copy.
+    """
+    live = [None] * len(objects)
+    memo = {}
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+
+    for i, obj in enumerate(objects):
+        live[i] = copy_object(obj, slots, memo)
+    # the memo is not held by the copies
+    del memo
+
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    return (after - before) / len(objects)
+
+
+def main():
+    games = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    instances = 10 * games
+
+    print(f"Bytes per live instance ({instances} instances), with __slots__ "
+          f"and without:")
+    for name, make in [("Card", lambda: Card(1, CardColour.red)),
+                       ("Deck", Deck),
+                       ("ComputerPlayer", lambda: ComputerPlayer("Computer")),
+                       ("TurnManager", lambda: TurnManager([]))]:
+        objects = [make() for _ in range(instances)]
+        slotted = live_bytes(objects, slots=True)
+        unslotted = live_bytes(objects, slots=False)
+        print(f"    {name}: {slotted:.0f} (without __slots__ "
+              f"{unslotted:.0f}, {1 - slotted / unslotted:.0%} smaller)")
+
+    cards = decode_cards(FULL_DECK_CODES)
+    print(f"Bytes per live game ({games} games), with __slots__ and without:")
+    for name, shared in (("own cards", False), ("shared cards", True)):
+        objects = [new_game(cards if shared else build_deck(FULL_DECK))
+                   for _ in range(games)]
+        slotted = live_bytes(objects, slots=True)
+        unslotted = live_bytes(objects, slots=False)
+        print(f"    {name}: {slotted:.0f} (without __slots__ "
+              f"{unslotted:.0f}, {1 - slotted / unslotted:.0%} smaller)")
+
+
+if __name__ == "__main__":
+    main()
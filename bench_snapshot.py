@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+UNO++ Snapshot Benchmark
+
+Measures how many times per second a game in progress can be cloned with
+copy.deepcopy, captured with UnoGame.snapshot, and returned to a snapshot
+with UnoGame.restore after a few turns have been played.
+"""
+import copy
+import random
+import sys
+import timeit
+
+from a2_support import FULL_DECK_CODES, decode_cards
+from simulation import new_game
+
+OPENING_TURNS = 20
+LOOKAHEAD_TURNS = 5
+
+
+def play_turns(game, turns):
+    """
+    Play up to the given amount of turns of a game.
+
+    Parameters:
+        game (UnoGame): The game to play.
+        turns (int): The amount of turns to play.
+    """
+    for _ in range(turns):
+        if game.is_over():
+            return
+        game.take_turn(game.next_player())
+
+
+def midgame(seed):
+    """
+    Construct a game which is still being played after its opening turns.
+
+    Parameters:
+        seed (int): The first seed to try constructing the game with.
+
+    Returns:
+        (UnoGame): A game in progress.
+    """
+    cards = decode_cards(FULL_DECK_CODES)
+    while True:
+        game = new_game(cards, rng=seed)
+        play_turns(game, OPENING_TURNS)
+        if not game.is_over():
+            return game
+        seed += 1
+
+
+def deepcopy_game(game):
+    """
+    (UnoGame) Returns a deep copy of a game.
+
+    Parameters:
+        game (UnoGame): The game to copy.
+    """
+    # decks without a generator of their own shuffle with the random module,
+    # which is shared rather than copied
+    return copy.deepcopy(game, {id(random): random})
+
+
+def per_second(function, number):
+    """
+    (float) Returns the amount of calls of a function made per second.
+
+    Parameters:
+        function (callable): The function to call without arguments.
+        number (int): The amount of calls in each timed repeat.
+    """
+    return number / min(timeit.repeat(function, number=number, repeat=5))
+
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    game = midgame(0)
+    state = game.snapshot()
+
+    def lookahead():
+        game.restore(state)
+        play_turns(game, LOOKAHEAD_TURNS)
+
+    def lookahead_snapshot():
+        lookahead()
+        game.snapshot()
+
+    results = [
+        ("deepcopy", per_second(lambda: deepcopy_game(game), number // 10)),
+        ("snapshot (cached, nothing changed)",
+         per_second(game.snapshot, number)),
+        ("restore (cached, nothing changed)",
+         per_second(lambda: game.restore(state), number)),
+        ("restore + lookahead", per_second(lookahead, number)),
+        ("restore + lookahead + snapshot",
+         per_second(lookahead_snapshot, number)),
+    ]
+
+    print(f"Per second, on a game after {OPENING_TURNS} turns "
+          f"(lookahead of {LOOKAHEAD_TURNS} turns):")
+    for name, rate in results:
+        print(f"    {name}: {rate:,.0f}")
+
+
+if __name__ == "__main__":
+    main()
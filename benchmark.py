@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+UNO++ Engine Benchmarks
+
+Times the core operations of a2.py and a2_support.py, from matching a single
+card to playing whole games, so slowdowns can be caught before they ship.
+
+Every benchmark prepares fresh state, runs a batch of operations on it, and
+is timed per operation, repeating batches until at least MIN_TIME has been
+spent running them. Each benchmark is run to warm up, then timed over
+several repeats, and the median of the repeats is kept. Results can be saved
+as a JSON baseline and later compared against, flagging every benchmark
+whose median is slower than the baseline's by more than a threshold.
+
+Usage:
+    python benchmark.py                          time every benchmark
+    python benchmark.py save <baseline.json>     time and save a baseline
+    python benchmark.py compare <baseline.json> [threshold]
+                                                 time and compare, exiting
+                                                 with 1 on a regression
+"""
+import gc
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+
+from a2 import Card, SkipCard, ReverseCard, Pickup2Card, Pickup4Card
+from a2 import Deck, ComputerPlayer
+from a2_support import FULL_DECK, FULL_DECK_CODES, CardColour, build_deck
+from a2_support import decode_cards
+from simulation import new_game, play_game
+
+WARMUP = 1
+REPEAT = 9
+# the least seconds each timed sample of a benchmark runs for
+MIN_TIME = 0.05
+THRESHOLD = 0.1
+
+HAND_SIZES = (1, 7, 20, 50)
+
+
+class Benchmark:
+    """
+    A timed batch of operations on freshly prepared state.
+    """
+    def __init__(self, name, setup, run):
+        """
+        Construct a benchmark.
+
+        Parameters:
+            name (str): The name results are saved under.
+            setup (callable): Returns the state a run is given, untimed.
+            run (callable): Runs the batch of operations on the state, and
+                            returns the amount of operations run.
+        """
+        self.name = name
+        self.setup = setup
+        self.run = run
+
+    def time(self, min_time=MIN_TIME):
+        """
+        Time runs on freshly prepared state, until the runs have taken at
+        least min_time seconds.
+
+        Parameters:
+            min_time (float): The least seconds spent running operations.
+
+        Returns:
+            (float): The mean seconds taken by each operation.
+        """
+        elapsed = 0.0
+        operations = 0
+
+        gc.collect()
+        gc.disable()
+        try:
+            while elapsed < min_time or operations == 0:
+                state = self.setup()
+                start = time.perf_counter()
+                operations += self.run(state)
+                elapsed += time.perf_counter() - start
+        finally:
+            gc.enable()
+
+        return elapsed / operations
+
+
+FULL_DECK_CARDS = decode_cards(FULL_DECK_CODES)
+
+
+def random_cards(amount, seed):
+    """
+    (list<Card>) Returns cards drawn at random from the full deck.
+
+    Parameters:
+        amount (int): The amount of cards to draw.
+        seed (int): The seed the cards are drawn with.
+    """
+    rng = random.Random(seed)
+    return [rng.choice(FULL_DECK_CARDS) for _ in range(amount)]
+
+
+def matches_benchmark(card_class):
+    """
+    (Benchmark) Times card_class.matches against random top cards.
+
+    Parameters:
+        card_class (type): The subclass of Card to time.
+    """
+    colour = CardColour.black if card_class is Pickup4Card else CardColour.red
+    tops = random_cards(1000, 1)
+
+    def setup():
+        return card_class(3, colour).matches, tops
+
+    def run(state):
+        matches, tops = state
+        for top in tops:
+            matches(top)
+        return len(tops)
+
+    return Benchmark(f"{card_class.__name__}.matches", setup, run)
+
+
+def deck_pick(state):
+    """(int) Picks the top card of a deck a thousand times."""
+    pick = state.pick
+    for _ in range(1000):
+        pick()
+    return 1000
+
+
+def deck_add_cards(state):
+    """(int) Adds a hand of cards to a deck a thousand times."""
+    deck, cards = state
+    add_cards = deck.add_cards
+    for _ in range(1000):
+        add_cards(cards)
+    return 1000
+
+
+def deck_shuffle(deck):
+    """(int) Shuffles a deck a hundred times."""
+    shuffle = deck.shuffle
+    for _ in range(100):
+        shuffle()
+    return 100
+
+
+def shuffled_deck():
+    """
+    (Deck) Returns the full deck, with a seeded generator of its own.
+    """
+    deck = Deck(list(FULL_DECK_CARDS))
+    deck.set_rng(0)
+    return deck
+
+
+def pick_card_benchmark(hand_size):
+    """
+    (Benchmark) Times ComputerPlayer.pick_card with hands of a given size.
+
+    Parameters:
+        hand_size (int): The amount of cards in each hand.
+    """
+    hands = [random_cards(hand_size, seed) for seed in range(200)]
+    putdown_piles = [Deck(random_cards(1, -seed - 1)) for seed in range(200)]
+
+    def setup():
+        players = []
+        for hand, putdown_pile in zip(hands, putdown_piles):
+            player = ComputerPlayer("Computer")
+            player.get_deck().add_cards(hand)
+            players.append((player.pick_card, putdown_pile))
+        return players
+
+    def run(players):
+        for pick_card, putdown_pile in players:
+            pick_card(putdown_pile)
+        return len(players)
+
+    return Benchmark(f"ComputerPlayer.pick_card[{hand_size}]", setup, run)
+
+
+def build_full_deck(_):
+    """(int) Builds the full deck twenty times."""
+    for _ in range(20):
+        build_deck(FULL_DECK)
+    return 20
+
+
+def midgame_turns():
+    """
+    (list<UnoGame>) Returns seeded games, each ten turns in.
+    """
+    games = [new_game(FULL_DECK_CARDS, rng=seed) for seed in range(100)]
+    for game in games:
+        for _ in range(10):
+            if not game.is_over():
+                game.take_turn(game.next_player())
+    return games
+
+
+def take_turns(games):
+    """(int) Takes up to twenty turns in each game."""
+    turns = 0
+    for game in games:
+        for _ in range(20):
+            if game.is_over():
+                break
+            game.take_turn(game.next_player())
+            turns += 1
+    return turns
+
+
+def full_games(_):
+    """(int) Plays ten seeded games to completion."""
+    for seed in range(10):
+        play_game(new_game(FULL_DECK_CARDS, rng=seed))
+    return 10
+
+
+BENCHMARKS = (
+    [matches_benchmark(card_class) for card_class
+     in (Card, SkipCard, ReverseCard, Pickup2Card, Pickup4Card)]
+    + [Benchmark("Deck.pick", lambda: Deck(FULL_DECK_CARDS * 10), deck_pick),
+       Benchmark("Deck.add_cards",
+                 lambda: (Deck(), FULL_DECK_CARDS[:7]), deck_add_cards),
+       Benchmark("Deck.shuffle", shuffled_deck, deck_shuffle)]
+    + [pick_card_benchmark(hand_size) for hand_size in HAND_SIZES]
+    + [Benchmark("build_deck(FULL_DECK)", lambda: None, build_full_deck),
+       Benchmark("UnoGame.take_turn", midgame_turns, take_turns),
+       Benchmark("play_game", lambda: None, full_games)]
+)
+
+
+def measure(benchmark, warmup=WARMUP, repeat=REPEAT, min_time=MIN_TIME):
+    """
+    Time a benchmark.
+
+    Parameters:
+        benchmark (Benchmark): The benchmark to time.
+        warmup (int): The amount of untimed samples before timing.
+        repeat (int): The amount of timed samples.
+        min_time (float): The least seconds each sample runs for.
+
+    Returns:
+        (dict<str, float>): The median, fastest and slowest nanoseconds taken
+                            per operation, over the timed runs.
+    """
+    for _ in range(warmup):
+        benchmark.time(min_time)
+
+    times = [benchmark.time(min_time) * 1e9 for _ in range(repeat)]
+    return {"median": statistics.median(times), "min": min(times),
+            "max": max(times)}
+
+
+def run_benchmarks(benchmarks=BENCHMARKS, warmup=WARMUP, repeat=REPEAT,
+                   min_time=MIN_TIME):
+    """
+    Time every benchmark.
+
+    Parameters:
+        benchmarks (list<Benchmark>): The benchmarks to time.
+        warmup (int): The amount of untimed samples of each benchmark.
+        repeat (int): The amount of timed samples of each benchmark.
+        min_time (float): The least seconds each sample runs for.
+
+    Returns:
+        (dict): The results of each benchmark by name, and the machine they
+                were measured on, as saved in a baseline.
+    """
+    return {"python": platform.python_version(),
+            "machine": platform.platform(),
+            "results": {benchmark.name: measure(benchmark, warmup, repeat,
+                                                min_time)
+                        for benchmark in benchmarks}}
+
+
+def save_baseline(path, results):
+    """
+    Save the results of run_benchmarks as a JSON baseline.
+
+    Parameters:
+        path (str): The path of the baseline.
+        results (dict): The results to save.
+    """
+    with open(path, "w") as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+
+
+def load_baseline(path):
+    """
+    (dict) Returns the results saved in a JSON baseline.
+
+    Parameters:
+        path (str): The path of the baseline.
+    """
+    with open(path) as file:
+        return json.load(file)
+
+
+def compare(baseline, results, threshold=THRESHOLD):
+    """
+    Compare the medians of results against a baseline.
+
+    Parameters:
+        baseline (dict): The results of the baseline.
+        results (dict): The results to compare.
+        threshold (float): The fraction a median may grow by before it is
+                           a regression.
+
+    Returns:
+        (list<tuple<str, float, float, float, bool>>): For each benchmark in
+                both results, its name, baseline and new median, the ratio
+                of the new median to the baseline's, and whether it is a
+                regression.
+    """
+    comparison = []
+    for name, result in results["results"].items():
+        old = baseline["results"].get(name)
+        if old is None:
+            continue
+        ratio = result["median"] / old["median"]
+        comparison.append((name, old["median"], result["median"], ratio,
+                           ratio > 1 + threshold))
+    return comparison
+
+
+def print_results(results):
+    """
+    Print the results of run_benchmarks.
+
+    Parameters:
+        results (dict): The results to print.
+    """
+    for name, result in results["results"].items():
+        print(f"{name:36} {result['median']:12,.0f}ns "
+              f"(min {result['min']:,.0f}, max {result['max']:,.0f})")
+
+
+def main():
+    mode = sys.argv[1] if len(sys.argv) > 1 else None
+    path = sys.argv[2] if len(sys.argv) > 2 else "baseline.json"
+
+    results = run_benchmarks()
+
+    if mode == "compare":
+        threshold = float(sys.argv[3]) if len(sys.argv) > 3 else THRESHOLD
+        baseline = load_baseline(path)
+        if baseline["machine"] != results["machine"] \
+                or baseline["python"] != results["python"]:
+            print(f"Warning: the baseline was measured with Python "
+                  f"{baseline['python']} on {baseline['machine']}")
+
+        comparison = compare(baseline, results, threshold)
+        for name, old, new, ratio, regressed in comparison:
+            flag = "REGRESSION" if regressed else ""
+            print(f"{name:36} {old:12,.0f}ns -> {new:12,.0f}ns "
+                  f"{ratio - 1:+7.1%} {flag}")
+
+        regressions = sum(regressed for *_, regressed in comparison)
+        print(f"{regressions} regressions beyond {threshold:.0%}")
+        sys.exit(1 if regressions else 0)
+
+    print_results(results)
+    if mode == "save":
+        save_baseline(path, results)
+        print(f"Saved baseline to {path}")
+
+
+if __name__ == "__main__":
+    main()
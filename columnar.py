@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+"""
+UNO++ Columnar Results
+
+Writes the results of simulated games as columns of NumPy arrays, one row
+per game, so they can be analysed without parsing each row. Rows are
+buffered into chunks of a fixed size, and each full chunk is written to its
+own .npz file, so the memory used stays the same however many games are
+written. Requires NumPy.
+"""
+import glob
+import os
+import random
+import sys
+import time
+from multiprocessing import Pool, cpu_count
+
+import numpy as np
+
+from a2 import SkipCard, ReverseCard, Pickup2Card, Pickup4Card
+from a2_support import FULL_DECK_CODES, decode_cards
+from simulation import PLAYER_COUNT, MAX_TURNS, new_game, play_game
+from tournament import SHARD_SIZE, TournamentResult, shard_seeds
+
+CHUNK_SIZE = 65536
+
+# the name and type of each column, in order
+COLUMNS = (
+    ("seed", np.uint64),
+    ("winner", np.int8),
+    ("turns", np.uint32),
+    # the cards added to hands, by drawing or by Pickup2 and Pickup4 cards
+    ("draws", np.uint32),
+    ("skips", np.uint16),
+    ("reverses", np.uint16),
+    ("pickup2s", np.uint16),
+    ("pickup4s", np.uint16),
+    ("recycles", np.uint16),
+)
+
+# the special cards counted by type, in the order of their columns
+SPECIAL_TYPES = (SkipCard, ReverseCard, Pickup2Card, Pickup4Card)
+
+
+class GameStats:
+    """
+    Counts the cards added to the players' hands, and the special cards
+    played by type, in a game.
+
+    Set as the recorder of a dealt game, in place of a MoveLog.
+    """
+    __slots__ = ("_players", "_dealt", "_removed", "specials")
+
+    def __init__(self, players):
+        """
+        Construct empty statistics for the players of a dealt game.
+
+        Parameters:
+            players (list<Player>): The players of the game.
+        """
+        self._players = players
+        self._dealt = self._held()
+        # the cards taken off the players' hands, whether played or not
+        self._removed = 0
+        self.specials = dict.fromkeys(SPECIAL_TYPES, 0)
+
+    def _held(self):
+        """
+        (int) Returns the amount of cards in the players' hands.
+        """
+        return sum(player.get_deck().get_amount() for player in self._players)
+
+    def draws(self):
+        """
+        Count the cards added to the players' hands since they were dealt,
+        whether drawn in place of a turn or picked up by a Pickup2Card or
+        Pickup4Card.
+
+        As a pickup pile which runs out may hand over fewer cards than were
+        asked for, the cards are counted from the size of the hands.
+
+        Returns:
+            (int): The amount of cards added to the hands.
+        """
+        return self._held() - self._dealt + self._removed
+
+    def played(self, card):
+        """
+        Count a card being played, and a special card by its type.
+
+        Parameters:
+            card (Card): The card played.
+        """
+        self._removed += 1
+        if card.__class__ in self.specials:
+            self.specials[card.__class__] += 1
+
+    def drew(self):
+        """
+        Ignore a player picking up a card, which is counted by draws.
+        """
+
+    def passed(self, card):
+        """
+        Count a player picking a card which could not be played.
+
+        Parameters:
+            card (Card): The card which could not be played.
+        """
+        self._removed += 1
+
+    def recycled(self, cards):
+        """
+        Ignore played cards being recycled, which the game counts itself.
+
+        Parameters:
+            cards (list<Card>): The cards of the pickup pile, in order.
+        """
+
+
+def play_row(cards, seed, player_count=PLAYER_COUNT, max_turns=MAX_TURNS):
+    """
+    Play a seeded game between computer players and describe it as a row.
+
+    Parameters:
+        cards (list<Card>): The cards to build the pickup pile from.
+        seed (int): The seed of the game.
+        player_count (int): The amount of computer players in the game.
+        max_turns (int): The amount of turns after which the game is abandoned.
+
+    Returns:
+        (tuple<GameResult, tuple<int>>): The outcome of the game, and its row
+                                         with a value for each of COLUMNS.
+    """
+    game = new_game(cards, player_count, rng=seed)
+    stats = game.recorder = GameStats(game.players)
+    result = play_game(game, max_turns)
+
+    winner = -1 if result.winner is None else result.winner
+    row = (seed, winner, result.turns, stats.draws(),
+           *(stats.specials[card_type] for card_type in SPECIAL_TYPES),
+           game.recycles)
+    return result, row
+
+
+def make_empty_directory(directory):
+    """
+    Create a directory to write chunks into, if needed, so no chunks of an
+    earlier run are loaded with the new ones.
+
+    Parameters:
+        directory (str): The directory to write chunks into.
+
+    Raises:
+        FileExistsError: If the directory already holds any files.
+    """
+    os.makedirs(directory, exist_ok=True)
+    if os.listdir(directory):
+        raise FileExistsError(f"{directory} is not empty")
+
+
+class ColumnWriter:
+    """
+    Streams rows of results into a directory of .npz chunks.
+
+    Each chunk holds an array for each of COLUMNS, and every chunk but the
+    last holds chunk_size rows.
+    """
+    def __init__(self, directory, chunk_size=CHUNK_SIZE):
+        """
+        Start writing chunks into a directory, which is created if needed.
+
+        Parameters:
+            directory (str): The empty directory to write chunks into.
+            chunk_size (int): The amount of rows in each chunk.
+
+        Raises:
+            FileExistsError: If the directory already holds any files.
+        """
+        make_empty_directory(directory)
+        self._directory = directory
+        self._chunk_size = chunk_size
+        self._buffer = {name: np.empty(chunk_size, dtype=dtype)
+                        for name, dtype in COLUMNS}
+        self._filled = 0
+        self.chunks = 0
+        self.rows = 0
+
+    def add_row(self, row):
+        """
+        Append a single row.
+
+        Parameters:
+            row (tuple<int>): A value for each of COLUMNS.
+        """
+        for (name, _), value in zip(COLUMNS, row):
+            self._buffer[name][self._filled] = value
+        self._filled += 1
+        self.rows += 1
+
+        if self._filled == self._chunk_size:
+            self.flush()
+
+    def add_columns(self, columns):
+        """
+        Append many rows at once.
+
+        Parameters:
+            columns (dict<str, np.ndarray>): The values of each of COLUMNS,
+                                             by name, all of the same length.
+        """
+        amount = len(columns[COLUMNS[0][0]])
+        start = 0
+
+        while start < amount:
+            count = min(amount - start, self._chunk_size - self._filled)
+            for name, _ in COLUMNS:
+                self._buffer[name][self._filled:self._filled + count] = \
+                    columns[name][start:start + count]
+            self._filled += count
+            self.rows += count
+            start += count
+
+            if self._filled == self._chunk_size:
+                self.flush()
+
+    def flush(self):
+        """
+        Write the buffered rows as a chunk, if there are any.
+        """
+        if self._filled == 0:
+            return
+
+        path = os.path.join(self._directory, f"chunk-{self.chunks:06d}.npz")
+        np.savez(path, **{name: column[:self._filled]
+                          for name, column in self._buffer.items()})
+        self.chunks += 1
+        self._filled = 0
+
+    def close(self):
+        """
+        Write the last, partly filled, chunk.
+        """
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def load_columns(directory, names=None):
+    """
+    Load the columns written by a ColumnWriter.
+
+    Parameters:
+        directory (str): The directory the chunks were written into.
+        names (list<str>): The columns to load, if None, every column.
+
+    Returns:
+        (dict<str, np.ndarray>): The values of each column, by name, with the
+                                 rows of every chunk in the order written.
+                                 The chunks of every shard written by
+                                 export_tournament are loaded, in shard order.
+    """
+    names = [name for name, _ in COLUMNS] if names is None else names
+    parts = {name: [] for name in names}
+
+    # chunks are named so they sort in the order written, within and across
+    # the shards of a tournament
+    paths = glob.glob(os.path.join(directory, "**", "chunk-*.npz"),
+                      recursive=True)
+    for path in sorted(paths):
+        with np.load(path) as chunk:
+            for name in names:
+                parts[name].append(chunk[name])
+
+    dtypes = dict(COLUMNS)
+    return {name: np.concatenate(arrays) if arrays
+            else np.empty(0, dtype=dtypes[name])
+            for name, arrays in parts.items()}
+
+
+def export_games(directory, games, first_seed=0, chunk_size=CHUNK_SIZE):
+    """
+    Play games seeded from first_seed upwards, and write their rows.
+
+    Parameters:
+        directory (str): The empty directory to write chunks into.
+        games (int): The amount of games to play.
+        first_seed (int): The seed of the first game.
+        chunk_size (int): The amount of rows in each chunk.
+    """
+    cards = decode_cards(FULL_DECK_CODES)
+
+    with ColumnWriter(directory, chunk_size) as writer:
+        for seed in range(first_seed, first_seed + games):
+            writer.add_row(play_row(cards, seed)[1])
+
+
+def play_shard(shard):
+    """
+    Play a shard of a tournament and write a row for each game.
+
+    Every game is seeded from the shard's seed, and its seed is written in
+    its row, so any game can be replayed alone with new_game(cards, rng=seed).
+
+    Parameters:
+        shard (tuple<str, int, int, int, int>): The directory to write chunks
+                                                into, the seed, amount of
+                                                games, player count and
+                                                maximum turns.
+
+    Returns:
+        (TournamentResult): The statistics of the shard's games.
+    """
+    directory, seed, games, player_count, max_turns = shard
+    cards = decode_cards(FULL_DECK_CODES)
+    rng = random.Random(seed)
+
+    result = TournamentResult(player_count)
+    with ColumnWriter(directory) as writer:
+        for _ in range(games):
+            game, row = play_row(cards, rng.getrandbits(64), player_count,
+                                 max_turns)
+            result.add_result(game)
+            writer.add_row(row)
+
+    return result
+
+
+def export_tournament(directory, games, seed=0, workers=None,
+                      player_count=PLAYER_COUNT, max_turns=MAX_TURNS,
+                      shard_size=SHARD_SIZE):
+    """
+    Play a tournament across a pool of worker processes, with every shard
+    writing its rows into a directory of its own.
+
+    The shards are seeded by shard_seeds, as in run_tournament, but each
+    game is then given a seed of its own by play_shard, so it can be
+    replayed alone. The games played therefore differ from those of
+    run_tournament with the same seed.
+
+    Parameters:
+        directory (str): The empty directory to write each shard's
+                         directory into.
+        games (int): The amount of games to play.
+        seed (int): The seed the tournament is reproduced from.
+        workers (int): The amount of worker processes,
+                       if None, one per available core.
+        player_count (int): The amount of computer players in each game.
+        max_turns (int): The amount of turns after which a game is abandoned.
+        shard_size (int): The amount of games played by each shard.
+
+    Returns:
+        (TournamentResult): The merged statistics of every game.
+
+    Raises:
+        FileExistsError: If the directory already holds any files.
+    """
+    make_empty_directory(directory)
+
+    sizes = [shard_size] * (games // shard_size)
+    if games % shard_size:
+        sizes.append(games % shard_size)
+
+    shards = [(os.path.join(directory, f"shard-{index:06d}"), shard_seed,
+               size, player_count, max_turns)
+              for index, (shard_seed, size)
+              in enumerate(zip(shard_seeds(seed, len(sizes)), sizes))]
+
+    result = TournamentResult(player_count)
+    with Pool(workers or cpu_count()) as pool:
+        for shard_result in pool.imap(play_shard, shards):
+            result.merge(shard_result)
+
+    return result
+
+
+def main():
+    directory = sys.argv[1] if len(sys.argv) > 1 else "results"
+    games = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+
+    start = time.perf_counter()
+    result = export_tournament(directory, games)
+    elapsed = time.perf_counter() - start
+    print(f"Exported {result.games} games in {elapsed:.2f}s "
+          f"({result.games / elapsed:.0f} games/s)")
+
+    size = sum(os.path.getsize(path) for path in glob.glob(
+        os.path.join(directory, "**", "chunk-*.npz"), recursive=True))
+    print(f"Wrote {size:,} bytes ({size / result.games:.1f} bytes per game)")
+
+    start = time.perf_counter()
+    columns = load_columns(directory)
+    elapsed = time.perf_counter() - start
+    print(f"Loaded {len(columns['seed'])} rows in {elapsed * 1000:.1f}ms")
+
+    finished = columns["winner"] >= 0
+    print(f"Mean turns: {columns['turns'].mean():.1f}, "
+          f"finished: {finished.mean():.1%}")
+    for name in ("draws", "skips", "reverses", "pickup2s", "pickup4s"):
+        print(f"Mean {name} per game: {columns[name].mean():.2f}")
+
+
+if __name__ == "__main__":
+    main()
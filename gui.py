@@ -3,12 +3,14 @@ CSSE1001 Semester 2, 2018
 UNO++ GUI Support Code
 """
 
+import sys
 import tkinter as tk
 from tkinter import messagebox
 
 from a2 import HumanPlayer, ComputerPlayer, Deck
 from a2 import SkipCard, ReverseCard, Pickup2Card, Pickup4Card
-from a2_support import FULL_DECK, build_deck, UnoGame, generate_name
+from a2_support import FULL_DECK_CODES, decode_cards, UnoGame, generate_name
+from a2_support import RecyclePolicy, make_rng
 
 __version__ = "1.0.1"
 
@@ -418,8 +420,9 @@ class UnoApp:
         for player in self.game.players:
             players.append(player.__class__(player.get_name()))
 
-        # generate a new deck
-        pickup_pile = Deck(build_deck(FULL_DECK))
+        # generate a new deck, shuffled by the same generator as the old game
+        pickup_pile = Deck(decode_cards(FULL_DECK_CODES))
+        pickup_pile.set_rng(self.game.rng)
         pickup_pile.shuffle()
 
         # make players pickup cards
@@ -427,7 +430,8 @@ class UnoApp:
             cards = pickup_pile.pick(7)
             player.get_deck().add_cards(cards)
 
-        self.game = UnoGame(pickup_pile, players)
+        self.game = UnoGame(pickup_pile, players,
+                            recycle=RecyclePolicy.reshuffle, rng=self.game.rng)
         self.render_decks()
         self.update()
 
@@ -456,7 +460,7 @@ class UnoApp:
 
         # pick the card if it matches
         if card.matches(self.game.putdown_pile.top()):
-            card = player.get_deck().get_cards().pop(slot)
+            card = player.get_deck().pick_at(slot)
             self.game.select_card(player, card)
 
             # wait for next move
@@ -467,10 +471,8 @@ class UnoApp:
         if not self.game.current_player().is_playable():
             return
 
-        # select card from deck
-        next_card = self.game.pickup_pile.pick()
-        # add card to players deck
-        self.game.current_player().get_deck().add_cards(next_card)
+        # add a card from the pickup pile to the players deck
+        self.game.draw(self.game.current_player())
 
         # wait for next move
         self.step()
@@ -568,12 +570,16 @@ def main():
     root = tk.Tk()
     root.title("Uno++")
 
+    # an optional seed replays the same games
+    rng = make_rng(int(sys.argv[1]) if len(sys.argv) > 1 else None)
+
     # build a list of players for the game
-    players = [HumanPlayer("Ravi"), HumanPlayer(generate_name()),
-               ComputerPlayer(generate_name())]
+    players = [HumanPlayer("Ravi"), HumanPlayer(generate_name(rng)),
+               ComputerPlayer(generate_name(rng))]
 
     # build a pickup pile
-    pickup_pile = Deck(build_deck(FULL_DECK))
+    pickup_pile = Deck(decode_cards(FULL_DECK_CODES))
+    pickup_pile.set_rng(rng)
     pickup_pile.shuffle()
 
     # deal players cards from the pickup pile
@@ -582,7 +588,8 @@ def main():
         player.get_deck().add_cards(cards)
 
     # create and play the game
-    game = UnoGame(pickup_pile, players)
+    game = UnoGame(pickup_pile, players, recycle=RecyclePolicy.reshuffle,
+                   rng=rng)
     app = UnoApp(root, game)
     app.play()
 
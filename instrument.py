@@ -0,0 +1,223 @@
+"""
+UNO++ Turn Instrumentation
+
+Measures where the time of a turn goes: the player choosing a card, matching
+it against the top of the putdown pile, the card's effect, the operations on
+the piles and hands, checking for a winner, and the game's recorder, with
+card effects broken down by the class of the card played.
+
+A TurnProfile is attached to a game by setting it as the game's profile,
+after which UnoGame.take_turn, finish_turn and select_card read a
+nanosecond clock around each phase and add the times to the profile, so
+cards selected from the GUI are timed as well as the turns of a simulation.
+A game without a profile only checks that it has none, once a turn.
+
+Run "python simulation.py <games> profile" for the summary of a simulation,
+or "python loadtest.py <tables> profile" for the summary of a server's
+tables.
+"""
+from a2_support import TurnAction
+
+# the phases of a turn
+PHASES = ("pick_card", "match", "effect", "pile", "win_check", "record")
+PICK_CARD, MATCH, EFFECT, PILE, WIN_CHECK, RECORD = range(len(PHASES))
+# what a player can do with a turn, in the order they are counted
+ACTIONS = (TurnAction.play, TurnAction.draw, TurnAction.discard)
+PLAY, DRAW, DISCARD = range(len(ACTIONS))
+
+
+class TurnProfile:
+    """
+    Accumulates the time spent in each phase of the turns of games.
+    """
+    __slots__ = ("turns", "turn_ns", "actions", "calls", "times", "cards")
+
+    def __init__(self):
+        """
+        Construct an empty profile.
+        """
+        self.turns = 0
+        self.turn_ns = 0
+        self.actions = [0] * len(ACTIONS)
+        self.calls = [0] * len(PHASES)
+        self.times = [0] * len(PHASES)
+        # the amount of effects, and nanoseconds spent in them, by card class
+        self.cards = {}
+
+    def attach(self, game):
+        """
+        Time every turn taken, and card selected, in a game from now on.
+
+        Parameters:
+            game (UnoGame): The game to time.
+        """
+        game.profile = self
+
+    @staticmethod
+    def detach(game):
+        """
+        Stop timing the turns of a game.
+
+        Parameters:
+            game (UnoGame): The game to stop timing.
+        """
+        game.profile = None
+
+    def _add(self, phase, start, end):
+        """
+        Add a call of a phase, if it was timed.
+
+        Parameters:
+            phase (int): The index of the phase in PHASES.
+            start (int): The clock, in nanoseconds, when the phase started.
+            end (int): The clock when the phase ended, None if the phase was
+                       not run.
+        """
+        if end is not None:
+            self.calls[phase] += 1
+            self.times[phase] += end - start
+
+    def add_turn(self, start, picked, end):
+        """
+        Add a turn taken by UnoGame.take_turn, whose other phases were added
+        by add_play, add_draw or add_discard.
+
+        Parameters:
+            start (int): The clock, in nanoseconds, when the turn started.
+            picked (int): The clock when the player had picked their card.
+            end (int): The clock when the turn was finished.
+        """
+        self.turns += 1
+        self.turn_ns += end - start
+        self._add(PICK_CARD, start, picked)
+
+    def add_play(self, card, start, matched, played, piled, checked,
+                 recorded):
+        """
+        Add the phases of a card being played.
+
+        Parameters:
+            card (Card): The card played.
+            start (int): The clock, in nanoseconds, when the play started.
+            matched (int): The clock when the card was matched, None if the
+                           card was selected without being matched.
+            played (int): The clock when the card's effect was finished.
+            piled (int): The clock when the card was placed on its pile.
+            checked (int): The clock when the winner was checked for.
+            recorded (int): The clock when the recorder was told of the play,
+                            None if the game has no recorder.
+        """
+        self.actions[PLAY] += 1
+        self._add(MATCH, start, matched)
+        effect_start = start if matched is None else matched
+        self._add(EFFECT, effect_start, played)
+        self._add(PILE, played, piled)
+        self._add(WIN_CHECK, piled, checked)
+        self._add(RECORD, checked, recorded)
+
+        name = card.__class__.__name__
+        effects = self.cards.get(name)
+        if effects is None:
+            effects = self.cards[name] = [0, 0]
+        effects[0] += 1
+        effects[1] += played - effect_start
+
+    def add_draw(self, start, piled, recorded):
+        """
+        Add the phases of a player picking up a card instead of playing one.
+
+        Parameters:
+            start (int): The clock, in nanoseconds, when the draw started.
+            piled (int): The clock when the card was added to the hand.
+            recorded (int): The clock when the recorder was told of the draw,
+                            None if the game has no recorder.
+        """
+        self.actions[DRAW] += 1
+        self._add(PILE, start, piled)
+        self._add(RECORD, piled, recorded)
+
+    def add_discard(self, start, matched, checked, recorded):
+        """
+        Add the phases of a player discarding a card which does not match.
+
+        Parameters:
+            start (int): The clock, in nanoseconds, when the discard started.
+            matched (int): The clock when the card was matched.
+            checked (int): The clock when the winner was checked for.
+            recorded (int): The clock when the recorder was told of the
+                            discard, None if the game has no recorder.
+        """
+        self.actions[DISCARD] += 1
+        self._add(MATCH, start, matched)
+        self._add(WIN_CHECK, matched, checked)
+        self._add(RECORD, checked, recorded)
+
+    def merge(self, other):
+        """
+        Include the timings of another profile in this one.
+
+        Parameters:
+            other (TurnProfile): The profile to include.
+        """
+        self.turns += other.turns
+        self.turn_ns += other.turn_ns
+        for action in range(len(ACTIONS)):
+            self.actions[action] += other.actions[action]
+        for phase in range(len(PHASES)):
+            self.calls[phase] += other.calls[phase]
+            self.times[phase] += other.times[phase]
+        for name, (calls, times) in other.cards.items():
+            effects = self.cards.setdefault(name, [0, 0])
+            effects[0] += calls
+            effects[1] += times
+
+    @staticmethod
+    def _stats(calls, total, timed_ns):
+        """
+        (dict) Returns the calls, total and mean nanoseconds, and share of
+        the time spent in every phase, of a phase.
+        """
+        return {"calls": calls, "total_ns": total,
+                "mean_ns": total / calls if calls else 0.0,
+                "share": total / timed_ns if timed_ns else 0.0}
+
+    def summary(self):
+        """
+        Summarise the profile, in a form which can be saved as JSON.
+
+        Returns:
+            (dict): The amount of turns taken by take_turn and the
+                    nanoseconds spent in them, the amount of each action,
+                    and the stats of each phase, and of the effect of each
+                    class of card, as their calls, total and mean
+                    nanoseconds and share of the time spent in every phase.
+        """
+        timed_ns = sum(self.times)
+        return {"turns": self.turns, "turn_ns": self.turn_ns,
+                "mean_turn_ns": (self.turn_ns / self.turns if self.turns
+                                 else 0.0),
+                "actions": {action.name: self.actions[index]
+                            for index, action in enumerate(ACTIONS)},
+                "phases": {name: self._stats(self.calls[phase],
+                                             self.times[phase], timed_ns)
+                           for phase, name in enumerate(PHASES)},
+                "cards": {name: self._stats(calls, total, timed_ns)
+                          for name, (calls, total)
+                          in sorted(self.cards.items())}}
+
+    def format_summary(self):
+        """
+        (str) Returns the summary of the profile as a table.
+        """
+        summary = self.summary()
+        actions = ", ".join(f"{amount} {name}s"
+                            for name, amount in summary["actions"].items())
+        lines = [f"{summary['turns']} turns, "
+                 f"{summary['mean_turn_ns']:,.0f}ns per turn ({actions})"]
+        rows = list(summary["phases"].items()) + [
+            (f"  {name}", stats) for name, stats in summary["cards"].items()]
+        for name, stats in rows:
+            lines.append(f"    {name:14} {stats['calls']:10,} calls "
+                         f"{stats['mean_ns']:10,.0f}ns mean "
+                         f"{stats['share']:7.1%} of timed phases")
+        return "\n".join(lines)
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+UNO++ Server Load Test
+
+Opens many tables on a server at once, from a single event loop, and plays
+every remote seat as a ComputerPlayer would, playing the first card in hand
+which matches the top of the putdown pile. The latency of a turn is the time
+from a move being sent until the server next asks for a move, or ends the
+game, which includes the computer players' turns in between. Pass the path
+of a database to checkpoint every table to it as it is played, and "profile"
+to time the phases of every turn the server takes.
+"""
+import asyncio
+import json
+import sys
+import time
+
+from a2_support import MATCH_TABLE
+from instrument import TurnProfile
+from persistence import GameStore
+from server import HOST, GameServer
+
+TABLES = 2000
+CONNECT_LIMIT = 500
+
+
+def percentile(values, fraction):
+    """
+    Find a percentile of some values, by the nearest rank.
+
+    Parameters:
+        values (list<float>): The values, sorted in increasing order.
+        fraction (float): The fraction of values at or below the percentile.
+
+    Returns:
+        (float): The percentile, 0 if there are no values.
+    """
+    if not values:
+        return 0.0
+    rank = min(len(values) - 1, max(0, round(fraction * len(values)) - 1))
+    return values[rank]
+
+
+async def play_table(reader, writer, name, latencies):
+    """
+    Play out a table over a new connection to a server.
+
+    Parameters:
+        reader (asyncio.StreamReader): The connection's input.
+        writer (asyncio.StreamWriter): The connection's output.
+        name (str): The name to play as.
+        latencies (list<float>): The list the latency of each turn is
+                                 appended to.
+
+    Returns:
+        (dict): The message ending the game.
+    """
+    try:
+        writer.write(json.dumps({"name": name}).encode() + b"\n")
+        sent = None
+
+        while True:
+            line = await reader.readline()
+            if not line:
+                raise ConnectionError("the server closed the connection")
+            message = json.loads(line)
+            kind = message["type"]
+
+            if kind in ("turn", "over") and sent is not None:
+                latencies.append(time.perf_counter() - sent)
+                sent = None
+
+            if kind == "turn":
+                matches = MATCH_TABLE[message["top"]]
+                play = next((position for position, code
+                             in enumerate(message["hand"]) if matches[code]),
+                            None)
+                writer.write(json.dumps({"play": play}).encode() + b"\n")
+                sent = time.perf_counter()
+            elif kind == "over":
+                return message
+            elif kind == "error":
+                raise ValueError(message["message"])
+    finally:
+        writer.close()
+
+
+async def run_clients(host, port, tables, connect_limit=CONNECT_LIMIT):
+    """
+    Play many tables at once on a running server.
+
+    Parameters:
+        host (str): The address of the server.
+        port (int): The port of the server.
+        tables (int): The amount of tables to play.
+        connect_limit (int): The most connections being opened at once.
+
+    Returns:
+        (tuple<list<float>, list<dict>>): The latency of every turn, in the
+                                          order measured, and the message
+                                          ending each table.
+    """
+    connecting = asyncio.Semaphore(connect_limit)
+    latencies = []
+
+    async def play(number):
+        # connections are opened a limited amount at a time, so the listen
+        # backlog does not overflow
+        async with connecting:
+            reader, writer = await asyncio.open_connection(host, port)
+        return await play_table(reader, writer, f"Client {number}",
+                                latencies)
+
+    results = await asyncio.gather(*[play(number) for number in range(tables)])
+    return latencies, results
+
+
+async def load_test(tables=TABLES, seed=0, connect_limit=CONNECT_LIMIT,
+                    store=None, profile=None):
+    """
+    Serve and play many tables at once, in the same event loop.
+
+    Parameters:
+        tables (int): The amount of tables to play.
+        seed (int): The seed of the server.
+        connect_limit (int): The most connections being opened at once.
+        store (GameStore): The store the server checkpoints tables to.
+        profile (TurnProfile): The profile the server times turns in.
+
+    Returns:
+        (tuple<list<float>, list<dict>, float, int>): The sorted latency of
+                every turn, the message ending each table, the seconds taken,
+                and the most tables which were open at once.
+    """
+    server = GameServer(seed, store=store, profile=profile)
+    port = await server.start(HOST, 0)
+    peak = 0
+
+    async def watch():
+        nonlocal peak
+        while True:
+            peak = max(peak, server.open_tables)
+            await asyncio.sleep(0.01)
+
+    watcher = asyncio.ensure_future(watch())
+    start = time.perf_counter()
+    try:
+        latencies, results = await run_clients(HOST, port, tables,
+                                               connect_limit)
+    finally:
+        watcher.cancel()
+        await server.close()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return latencies, results, elapsed, peak
+
+
+def main():
+    args = [arg for arg in sys.argv[1:] if arg != "profile"]
+    tables = int(args[0]) if len(args) > 0 else TABLES
+    path = args[1] if len(args) > 1 else None
+    profile = TurnProfile() if "profile" in sys.argv[1:] else None
+
+    store = None if path is None else GameStore(path)
+    try:
+        latencies, results, elapsed, peak = asyncio.run(
+            load_test(tables, store=store, profile=profile))
+    finally:
+        if store is not None:
+            store.close()
+    turns = sum(result["turns"] for result in results)
+
+    print(f"Played {len(results)} tables, {turns} turns, in {elapsed:.2f}s "
+          f"({turns / elapsed:,.0f} turns/s, up to {peak} tables open)")
+    print("Turn latency: " + ", ".join(
+        f"p{label} {percentile(latencies, fraction) * 1000:.2f}ms"
+        for label, fraction in (("50", 0.5), ("90", 0.9), ("99", 0.99),
+                                ("100", 1.0))))
+    if profile is not None:
+        print(profile.format_summary())
+
+
+if __name__ == "__main__":
+    main()
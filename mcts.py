@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+UNO++ Monte Carlo Tree Search Player
+
+A computer player which chooses between the cards it could play by playing
+out random rollouts of the rest of the game. The cards it cannot see, the
+pickup pile and the other players' hands, are dealt afresh for every rollout,
+after which every player plays the first matching card in their hand, as a
+ComputerPlayer does. Moves are chosen between with UCB1 until the player's
+budget of time or rollouts runs out.
+"""
+import math
+import sys
+import time
+
+from a2 import Deck, ComputerPlayer
+from a2_support import FULL_DECK_CODES, decode_cards, make_rng
+from a2_support import UnoGame, RecyclePolicy
+from simulation import PLAYER_COUNT, MAX_TURNS, deal, new_game, play_game
+
+BUDGET = 0.05
+HORIZON = 200
+EXPLORATION = math.sqrt(2)
+
+
+class MCTSPlayer(ComputerPlayer):
+    """
+    A computer player which searches for its best move with rollouts.
+
+    The player must be given the game it is playing with set_game, otherwise
+    it plays the first matching card in its hand, as a ComputerPlayer does.
+    """
+    __slots__ = ("_game", "_rng", "budget", "rollouts", "horizon",
+                 "last_rollouts", "last_elapsed")
+
+    def __init__(self, name, game=None, budget=BUDGET, rollouts=None,
+                 rng=None):
+        """
+        Construct a searching computer player.
+
+        Parameters:
+            name (str): The player's name.
+            game (UnoGame): The game the player is playing.
+            budget (float): The seconds spent searching for each move,
+                            if None, only the amount of rollouts is limited.
+            rollouts (int): The most rollouts played for each move,
+                            if None, only the time spent is limited.
+            rng (random.Random|int): The random number generator, or seed,
+                                     hidden cards are dealt with.
+        """
+        super().__init__(name)
+        self._game = game
+        self._rng = make_rng(rng)
+        self.budget = budget
+        self.rollouts = rollouts
+        self.horizon = HORIZON
+
+        self.last_rollouts = 0
+        self.last_elapsed = 0.0
+
+    def set_game(self, game):
+        """
+        Set the game the player is playing, which is searched for moves.
+
+        Parameters:
+            game (UnoGame): The game the player is playing.
+        """
+        self._game = game
+
+    def rollouts_per_second(self):
+        """
+        (float) Returns the rate of rollouts played when choosing the last
+        move which was searched for.
+        """
+        if self.last_elapsed == 0:
+            return 0.0
+        return self.last_rollouts / self.last_elapsed
+
+    def pick_card(self, putdown_pile):
+        """
+        Select the card to play from the player's hand by searching the game.
+
+        Parameters:
+            putdown_pile (Deck): The pile the player has to play a card onto.
+
+        Returns:
+            (Card): The card taken from the player's hand,
+                    None if no card in the hand can be played.
+        """
+        top = putdown_pile.top()
+
+        # equal cards are equal moves
+        moves = {}
+        for card in self._deck.get_cards():
+            if card.matches(top):
+                key = (card.__class__, card.get_colour(), card.get_number())
+                moves.setdefault(key, card)
+        moves = list(moves.values())
+
+        if len(moves) > 1 and self._game is not None:
+            card = self._search(moves)
+        elif moves:
+            card = moves[0]
+        else:
+            return None
+
+        self._deck.pick_at(self._deck.get_cards().index(card))
+        return card
+
+    def _search(self, moves):
+        """
+        Play rollouts of each move until the budget runs out.
+
+        Parameters:
+            moves (list<Card>): The distinct cards the player can play.
+
+        Returns:
+            (Card): The move with the most rollouts.
+        """
+        game = self._game
+        start = time.perf_counter()
+        deadline = None if self.budget is None else start + self.budget
+        limit = self.rollouts
+
+        root = game.snapshot()
+        opponents = [player for player in game.players if player is not self]
+        hidden = list(game.pickup_pile.get_cards())
+        for player in opponents:
+            hidden.extend(player.get_deck().get_cards())
+
+        # rollouts recycle the pickup pile with the player's own generator,
+        # so searching does not change how the real game is shuffled, and
+        # are not recorded as turns of the real game
+        game_rng = game.pickup_pile.get_rng()
+        game.pickup_pile.set_rng(self._rng)
+        recorder = game.recorder
+        game.recorder = None
+
+        visits = [0] * len(moves)
+        scores = [0.0] * len(moves)
+        total = 0
+
+        try:
+            while limit is None or total < limit:
+                if total >= len(moves) and deadline is not None \
+                        and time.perf_counter() >= deadline:
+                    break
+
+                if total < len(moves):
+                    # every move is played once before any is preferred
+                    choice = total
+                else:
+                    log_total = math.log(total)
+                    choice = max(range(len(moves)), key=lambda i:
+                                 scores[i] / visits[i] + EXPLORATION
+                                 * math.sqrt(log_total / visits[i]))
+
+                game.restore(root)
+                self._determinize(opponents, hidden)
+                scores[choice] += self._rollout(moves[choice])
+                visits[choice] += 1
+                total += 1
+        finally:
+            game.restore(root)
+            game.pickup_pile.set_rng(game_rng)
+            game.recorder = recorder
+
+        self.last_rollouts = total
+        self.last_elapsed = time.perf_counter() - start
+
+        best = max(range(len(moves)), key=lambda i: (visits[i], scores[i]))
+        return moves[best]
+
+    def _determinize(self, opponents, hidden):
+        """
+        Deal the cards the player cannot see at random, keeping the size of
+        the pickup pile and of every opponent's hand.
+
+        Parameters:
+            opponents (list<Player>): The other players in the game.
+            hidden (list<Card>): The cards in the pickup pile and the
+                                 opponents' hands.
+        """
+        self._rng.shuffle(hidden)
+        dealt = 0
+
+        for deck in [self._game.pickup_pile] + [player.get_deck()
+                                                for player in opponents]:
+            amount = deck.get_amount()
+            deck.pick(amount)
+            deck.add_cards(hidden[dealt:dealt + amount])
+            dealt += amount
+
+    def _rollout(self, card):
+        """
+        Play a move, then play out the game with every player playing the
+        first matching card in their hand.
+
+        Parameters:
+            card (Card): The card the player plays.
+
+        Returns:
+            (float): 1 if the player won, 0 if another player won,
+                     or an even share if the game was not finished.
+        """
+        game = self._game
+
+        try:
+            self._deck.pick_at(self._deck.get_cards().index(card))
+            game.select_card(self, card)
+
+            turns = 0
+            while not game.is_over() and turns < self.horizon:
+                player = game.next_player()
+                hand = player.get_deck()
+                played = hand.pick_match(game.putdown_pile.top())
+                if played is None:
+                    hand.add_cards(game.pickup())
+                else:
+                    game.select_card(player, played)
+                turns += 1
+        except IndexError:
+            # the pickup pile ran out of cards
+            pass
+
+        if game.winner is None:
+            return 1 / len(game.players)
+        return 1.0 if game.winner is self else 0.0
+
+
+def main():
+    games = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    budget = float(sys.argv[2]) if len(sys.argv) > 2 else BUDGET
+
+    cards = decode_cards(FULL_DECK_CODES)
+    wins = 0
+    baseline = 0
+    rates = []
+    searched = []
+    other = []
+
+    for seed in range(games):
+        rng = make_rng(seed)
+        searcher = MCTSPlayer("MCTS", budget=budget, rng=seed)
+        players = [searcher] + [ComputerPlayer(f"Computer {seat}")
+                                for seat in range(1, PLAYER_COUNT)]
+
+        pickup_pile = Deck(list(cards))
+        pickup_pile.set_rng(rng)
+        pickup_pile.shuffle()
+        deal(players, pickup_pile)
+        game = UnoGame(pickup_pile, players, RecyclePolicy.reshuffle, rng)
+        searcher.set_game(game)
+
+        # turns are taken and timed as in UnoApp.take_turn
+        turns = 0
+        while not game.is_over() and turns < MAX_TURNS:
+            player = game.next_player()
+            searcher.last_rollouts = 0
+
+            start = time.perf_counter()
+            game.take_turn(player)
+            elapsed = time.perf_counter() - start
+
+            if player is searcher:
+                searched.append(elapsed)
+                if searcher.last_rollouts:
+                    rates.append(searcher.rollouts_per_second())
+            else:
+                other.append(elapsed)
+            turns += 1
+
+        if game.winner is searcher:
+            wins += 1
+
+        # the same deal, with a ComputerPlayer in the searcher's seat
+        if play_game(new_game(cards, rng=seed)).winner == 0:
+            baseline += 1
+
+    print(f"MCTS won {wins} of {games} games ({wins / games:.1%}), "
+          f"a ComputerPlayer won {baseline} ({baseline / games:.1%}) "
+          f"from the same seat and deals")
+    print(f"Mean turn time: {sum(searched) / len(searched) * 1000:.2f}ms "
+          f"(ComputerPlayer {sum(other) / len(other) * 1000:.3f}ms), "
+          f"longest {max(searched) * 1000:.1f}ms")
+    if rates:
+        print(f"Searched {len(rates)} of {len(searched)} turns, "
+              f"{sum(rates) / len(rates):,.0f} rollouts per second")
+
+
+if __name__ == "__main__":
+    main()
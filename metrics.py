@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+UNO++ Server Metrics
+
+Serves the metrics of a GameServer over HTTP, in the Prometheus text format,
+from the event loop running its tables.
+
+Every counter is a plain attribute of the server, changed only by the event
+loop playing its games, so no turn ever waits on a lock, and a scrape reads
+them between turns without stopping any table for longer than it takes to
+format the reply. When tables are spread across the shards of a Router, each
+shard serves its own metrics on a port of its own, and Prometheus scrapes
+every shard as a separate target.
+"""
+import asyncio
+import os
+import sys
+import time
+from bisect import bisect_left
+from collections import deque
+
+METRICS_PORT = 9045
+CONTENT_TYPE = b"text/plain; version=0.0.4; charset=utf-8"
+
+# the upper bounds, in seconds, of the buckets of the time computer players
+# take over their turns
+DECISION_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4,
+                    1e-3, 1e-2)
+# seconds between samples of the turns taken, and the amount of samples
+# turns per second is measured over
+SAMPLE_INTERVAL = 1.0
+RATE_WINDOW = 10
+
+
+class Histogram:
+    """
+    Counts observations in buckets of fixed upper bounds.
+    """
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds):
+        """
+        Construct an empty histogram.
+
+        Parameters:
+            bounds (tuple<float>): The upper bound of each bucket,
+                                   in increasing order.
+        """
+        self.bounds = bounds
+        # the last bucket counts observations above every bound
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        """
+        Count an observation in the first bucket whose bound it is within.
+
+        Parameters:
+            value (float): The value observed.
+        """
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name):
+        """
+        (list<str>) Returns the samples of the histogram, in the Prometheus
+        text format, with cumulative buckets.
+
+        Parameters:
+            name (str): The name of the metric.
+        """
+        lines = []
+        total = 0
+        for bound, count in zip(self.bounds, self.counts):
+            total += count
+            lines.append(f'{name}_bucket{{le="{bound:g}"}} {total}')
+        lines.append(f'{name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{name}_sum {self.sum!r}")
+        lines.append(f"{name}_count {self.count}")
+        return lines
+
+
+def resident_memory():
+    """
+    (int) Returns the bytes of memory resident for this process,
+    None if it cannot be read.
+    """
+    try:
+        with open("/proc/self/statm") as file:
+            pages = int(file.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError, IndexError):
+        return None
+
+
+class ServerMetrics:
+    """
+    Serves the metrics of a GameServer to Prometheus.
+    """
+    def __init__(self, server):
+        """
+        Construct the metrics of a server, and start counting the time
+        computer players take over their turns.
+
+        Parameters:
+            server (GameServer): The server to report on.
+        """
+        self.server = server
+        server.decisions = Histogram(DECISION_BUCKETS)
+
+        self._listener = None
+        self._sampling = None
+        self._samples = deque(maxlen=RATE_WINDOW + 1)
+        # memory in use before any table was opened
+        self._base_memory = resident_memory()
+
+    async def start(self, host, port=METRICS_PORT):
+        """
+        Start serving metrics, and sampling the turns taken.
+
+        Parameters:
+            host (str): The address to listen on.
+            port (int): The port to listen on, if 0, any free port.
+
+        Returns:
+            (int): The port listened on.
+        """
+        self._samples.append((time.monotonic(), self.server.turns))
+        self._sampling = asyncio.ensure_future(self._sample())
+        self._listener = await asyncio.start_server(self._scrape, host, port)
+        return self._listener.sockets[0].getsockname()[1]
+
+    async def close(self):
+        """
+        Stop serving metrics.
+        """
+        self._sampling.cancel()
+        self._listener.close()
+        await self._listener.wait_closed()
+
+    async def _sample(self):
+        """
+        Sample the turns taken every SAMPLE_INTERVAL seconds.
+        """
+        while True:
+            await asyncio.sleep(SAMPLE_INTERVAL)
+            self._samples.append((time.monotonic(), self.server.turns))
+
+    def turn_rate(self):
+        """
+        (float) Returns the turns taken per second, over the last
+        RATE_WINDOW samples.
+        """
+        sampled, turns = self._samples[0]
+        elapsed = time.monotonic() - sampled
+        return (self.server.turns - turns) / elapsed if elapsed > 0 else 0.0
+
+    def render(self):
+        """
+        (str) Returns every metric, in the Prometheus text format.
+        """
+        server = self.server
+        metrics = [
+            ("uno_tables_active", "gauge", "Tables being played.",
+             server.open_tables),
+            ("uno_tables_opened_total", "counter", "Tables opened.",
+             server.tables),
+            ("uno_tables_suspended", "gauge",
+             "Tables left or resumed from checkpoints, waiting for their "
+             "client.",
+             server.suspended()),
+            ("uno_turns_total", "counter", "Turns taken.", server.turns),
+            ("uno_turns_per_second", "gauge",
+             f"Turns taken per second, over the last {RATE_WINDOW} samples.",
+             self.turn_rate()),
+            ("uno_recycles_total", "counter",
+             "Putdown piles recycled into empty pickup piles.",
+             server.recycles),
+            ("uno_write_buffer_bytes", "gauge",
+             "Bytes waiting to be sent to clients.",
+             sum(writer.transport.get_write_buffer_size()
+                 for writer in server.writers)),
+        ]
+        if server.store is not None:
+            metrics.append(("uno_checkpoint_queue_depth", "gauge",
+                            "Tables waiting for their checkpoint to be "
+                            "written.", server.store.queued()))
+
+        memory = resident_memory()
+        if memory is not None:
+            metrics.append(("uno_resident_memory_bytes", "gauge",
+                            "Memory resident for the server's process.",
+                            memory))
+            if self._base_memory is not None:
+                gained = max(0, memory - self._base_memory)
+                metrics.append(("uno_memory_per_table_bytes", "gauge",
+                                "Memory gained since the server started, "
+                                "per active table.",
+                                gained / server.open_tables
+                                if server.open_tables else 0))
+
+        lines = []
+        for name, kind, description, value in metrics:
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name} {value}")
+
+        name = "uno_ai_turn_seconds"
+        lines.append(f"# HELP {name} Seconds computer players took over "
+                     f"their turns, from choosing a card to playing it.")
+        lines.append(f"# TYPE {name} histogram")
+        lines.extend(server.decisions.lines(name))
+        return "\n".join(lines) + "\n"
+
+    async def _scrape(self, reader, writer):
+        """
+        Answer a single HTTP request, with every metric for GET /metrics.
+
+        Parameters:
+            reader (asyncio.StreamReader): The connection's input.
+            writer (asyncio.StreamWriter): The connection's output.
+        """
+        try:
+            request = (await reader.readline()).split()
+            # skip the headers
+            while (await reader.readline()).strip():
+                pass
+
+            if len(request) >= 2 and request[0] == b"GET" \
+                    and request[1].split(b"?")[0] == b"/metrics":
+                status, content_type = b"200 OK", CONTENT_TYPE
+                body = self.render().encode()
+            else:
+                status, content_type = b"404 Not Found", b"text/plain"
+                body = b"not found\n"
+
+            writer.write(b"HTTP/1.1 %s\r\nContent-Type: %s\r\n"
+                         b"Content-Length: %d\r\nConnection: close\r\n\r\n"
+                         % (status, content_type, len(body)) + body)
+            await writer.drain()
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+async def scrape(host, port=METRICS_PORT):
+    """
+    Fetch the metrics of a running server.
+
+    Parameters:
+        host (str): The address metrics are served on.
+        port (int): The port metrics are served on.
+
+    Returns:
+        (dict<str, float>): The value of every sample, by its name and labels.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(b"GET /metrics HTTP/1.1\r\nHost: %s\r\n\r\n"
+                     % host.encode())
+        response = await reader.read()
+    finally:
+        writer.close()
+
+    _, body = response.split(b"\r\n\r\n", 1)
+    samples = {}
+    for line in body.decode().splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+
+def main():
+    host = sys.argv[1] if len(sys.argv) > 1 else "127.0.0.1"
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else METRICS_PORT
+
+    samples = asyncio.run(scrape(host, port))
+    for name, value in samples.items():
+        print(f"{name} {value:g}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""
+UNO++ Move Log
+
+Records games of UNO++ as compact, append-only binary logs, and replays a
+log to rebuild the game as it was after any amount of turns.
+
+A log starts with a header holding the seed the game was played with, its
+recycle policy, the names and hands of its players and the cards of its
+piles. Every turn then appends a single varint: the code of the card played,
+or a marker for a card being drawn. When played cards are recycled, the new
+order of the pickup pile is appended, so replaying a log never needs the
+game's random number generator, nor the players' choices of card.
+"""
+import sys
+import time
+from collections import deque
+
+from a2 import Deck, ComputerPlayer
+from a2_support import FULL_DECK_CODES, RecyclePolicy, UnoGame
+from a2_support import encode_card, decode_card, decode_cards
+from simulation import MAX_TURNS, new_game, play_game
+
+MAGIC = b"UNO\x01"
+
+# the kind of an event, held in the low bits of its varint
+PLAY, DRAW, PASS, RECYCLE = range(4)
+EVENT_BITS = 2
+
+POLICIES = tuple(RecyclePolicy)
+
+
+def write_varint(buffer, value):
+    """
+    Append a non-negative integer to a buffer, seven bits to a byte.
+
+    Parameters:
+        buffer (bytearray): The buffer to append to.
+        value (int): The integer to append.
+    """
+    while value > 0x7F:
+        buffer.append(value & 0x7F | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def read_varint(data, offset):
+    """
+    Read a non-negative integer written by write_varint.
+
+    Parameters:
+        data (bytes): The data to read from.
+        offset (int): The position of the integer in the data.
+
+    Returns:
+        (tuple<int, int>): The integer, and the position after it.
+    """
+    byte = data[offset]
+    offset += 1
+    if byte < 0x80:
+        return byte, offset
+
+    value = byte & 0x7F
+    shift = 7
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def write_cards(buffer, cards):
+    """
+    Append the amount and codes of a list of cards to a buffer.
+
+    Parameters:
+        buffer (bytearray): The buffer to append to.
+        cards (list<Card>): The cards to append, in order.
+    """
+    write_varint(buffer, len(cards))
+    for card in cards:
+        write_varint(buffer, encode_card(card))
+
+
+def read_cards(data, offset):
+    """
+    Read a list of cards written by write_cards.
+
+    Parameters:
+        data (bytes): The data to read from.
+        offset (int): The position of the cards in the data.
+
+    Returns:
+        (tuple<list<Card>, int>): The shared cards, and the position after them.
+    """
+    amount, offset = read_varint(data, offset)
+    codes = []
+    for _ in range(amount):
+        code, offset = read_varint(data, offset)
+        codes.append(code)
+    return decode_cards(codes), offset
+
+
+class MoveLog:
+    """
+    An append-only binary log of the turns of a game.
+
+    Constructing a log writes the game's header and sets the log as the
+    game's recorder, which appends an event for every turn taken afterwards.
+    """
+    __slots__ = ("_buffer", "turns")
+
+    def __init__(self, game, seed=None):
+        """
+        Start logging a game from its current state.
+
+        Parameters:
+            game (UnoGame): The game to log.
+            seed (int): The seed the game was constructed with, if known.
+
+        Raises:
+            ValueError: If the seed is a negative integer, which a log
+                        cannot record.
+        """
+        if isinstance(seed, int) and seed < 0:
+            raise ValueError(f"cannot log the negative seed {seed}")
+
+        self._buffer = buffer = bytearray(MAGIC)
+        self.turns = 0
+
+        write_varint(buffer, seed + 1 if isinstance(seed, int) else 0)
+        write_varint(buffer, POLICIES.index(game.recycle))
+
+        location, direction = game.get_turns().snapshot()
+        write_varint(buffer, location)
+        write_varint(buffer, direction)
+
+        write_varint(buffer, len(game.players))
+        for player in game.players:
+            name = player.get_name().encode("utf-8")
+            write_varint(buffer, len(name))
+            buffer += name
+            write_cards(buffer, player.get_deck().get_cards())
+
+        for pile in (game.pickup_pile, game.putdown_pile, game.special_pile):
+            write_cards(buffer, pile.get_cards())
+
+        game.recorder = self
+
+    def played(self, card):
+        """
+        Record the current player playing a card.
+
+        Parameters:
+            card (Card): The card played.
+        """
+        write_varint(self._buffer, encode_card(card) << EVENT_BITS | PLAY)
+        self.turns += 1
+
+    def drew(self):
+        """
+        Record the current player picking up a card instead of playing one.
+        """
+        self._buffer.append(DRAW)
+        self.turns += 1
+
+    def passed(self, card):
+        """
+        Record the current player picking a card which could not be played.
+
+        Parameters:
+            card (Card): The card which could not be played.
+        """
+        write_varint(self._buffer, encode_card(card) << EVENT_BITS | PASS)
+        self.turns += 1
+
+    def recycled(self, cards):
+        """
+        Record the order of the pickup pile after played cards were recycled.
+
+        Parameters:
+            cards (list<Card>): The cards of the pickup pile, in order.
+        """
+        self._buffer.append(RECYCLE)
+        write_cards(self._buffer, cards)
+
+    def to_bytes(self):
+        """
+        (bytes) Returns the log of the game so far.
+        """
+        return bytes(self._buffer)
+
+
+class RecordedShuffles:
+    """
+    Stands in for the random number generator of a replayed game, shuffling
+    cards into the orders which were recorded in its log.
+    """
+    __slots__ = ("_orders",)
+
+    def __init__(self):
+        """
+        Construct a generator with no recorded orders.
+        """
+        self._orders = deque()
+
+    def add_order(self, cards):
+        """
+        Queue the order of the next shuffle.
+
+        Parameters:
+            cards (list<Card>): The cards in the order they are shuffled into.
+        """
+        self._orders.append(cards)
+
+    def shuffle(self, cards):
+        """
+        Put cards into the next recorded order.
+
+        Parameters:
+            cards (list<Card>): The cards to shuffle.
+        """
+        cards[:] = self._orders.popleft()
+
+
+def read_seed(data):
+    """
+    (int) Returns the seed recorded in a log, None if it was not recorded.
+
+    Parameters:
+        data (bytes): The log.
+    """
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError("not an UNO++ move log")
+
+    seed, _ = read_varint(data, len(MAGIC))
+    return seed - 1 if seed else None
+
+
+def replay(data, turns=None, player_class=ComputerPlayer):
+    """
+    Rebuild the game recorded in a log.
+
+    Parameters:
+        data (bytes): The log.
+        turns (int): The amount of turns to replay,
+                     if None, every recorded turn is replayed.
+        player_class (type): The class of the players constructed for the game.
+
+    Returns:
+        (UnoGame): The game as it was after the turns were taken.
+
+    Raises:
+        ValueError: If the data is not a move log.
+    """
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError("not an UNO++ move log")
+
+    offset = len(MAGIC)
+    _, offset = read_varint(data, offset)
+    policy, offset = read_varint(data, offset)
+    location, offset = read_varint(data, offset)
+    direction, offset = read_varint(data, offset)
+
+    player_count, offset = read_varint(data, offset)
+    players = []
+    for _ in range(player_count):
+        length, offset = read_varint(data, offset)
+        player = player_class(data[offset:offset + length].decode("utf-8"))
+        offset += length
+
+        hand, offset = read_cards(data, offset)
+        player.get_deck().add_cards(hand)
+        players.append(player)
+
+    pickup, offset = read_cards(data, offset)
+    putdown, offset = read_cards(data, offset)
+    special, offset = read_cards(data, offset)
+
+    # the game turns over the top of the putdown pile, before it is replaced
+    shuffles = RecordedShuffles()
+    game = UnoGame(Deck(pickup + putdown[-1:]), players, POLICIES[policy],
+                   shuffles)
+    game.putdown_pile.restore(tuple(putdown))
+    game.special_pile.restore(tuple(special))
+    game.get_turns().restore((location, bool(direction)))
+
+    taken = 0
+    end = len(data)
+    while offset < end:
+        event = data[offset]
+        if event < 0x80:
+            offset += 1
+        else:
+            event, offset = read_varint(data, offset)
+        kind = event & 3
+
+        if kind == RECYCLE:
+            # recorded before the turn which recycled the played cards
+            cards, offset = read_cards(data, offset)
+            shuffles.add_order(cards)
+            continue
+
+        if turns is not None and taken >= turns:
+            break
+        taken += 1
+
+        player = game.next_player()
+        if kind == DRAW:
+            game.draw(player)
+            continue
+
+        # the card is played if it matches, and discarded otherwise, as it
+        # was when the turn was logged
+        card = decode_card(event >> EVENT_BITS)
+        hand = player.get_deck()
+        hand.pick_at(hand.get_cards().index(card))
+        game.finish_turn(player, card)
+
+    return game
+
+
+def record_games(games, max_turns=MAX_TURNS):
+    """
+    Play and log seeded games between computer players.
+
+    Parameters:
+        games (int): The amount of games to play, seeded 0 upwards.
+        max_turns (int): The amount of turns after which a game is abandoned.
+
+    Returns:
+        (list<bytes>): The log of each game.
+    """
+    cards = decode_cards(FULL_DECK_CODES)
+    logs = []
+    for seed in range(games):
+        game = new_game(cards, rng=seed)
+        log = MoveLog(game, seed)
+        play_game(game, max_turns)
+        logs.append(log.to_bytes())
+    return logs
+
+
+def main():
+    games = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    cards = decode_cards(FULL_DECK_CODES)
+
+    start = time.perf_counter()
+    logs = record_games(games)
+    record_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = [play_game(new_game(cards, rng=seed)) for seed in range(games)]
+    simulate_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for log in logs:
+        replay(log)
+    replay_time = time.perf_counter() - start
+
+    size = sum(map(len, logs))
+    turns = sum(result.turns for result in results)
+    print(f"Logged {games} games, {turns} turns, in {size:,} bytes "
+          f"({size / games:.0f} bytes per game, {size / turns:.2f} per turn)")
+    print(f"Simulating: {games / simulate_time:,.0f} games/s")
+    print(f"Simulating and logging: {games / record_time:,.0f} games/s")
+    print(f"Replaying: {games / replay_time:,.0f} games/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+"""
+UNO++ Game Persistence
+
+Checkpoints games to SQLite, so the tables of a server which stops or
+crashes can be resumed where they left off.
+
+Checkpoints are written behind the game: checkpoint only captures a
+snapshot of the game and hands it to a writer thread, which writes the
+latest snapshot of every table changed since its last write in a single
+transaction. The database is kept in WAL mode with synchronous=NORMAL, so a
+transaction is not synced to disk when it commits, and no turn ever waits
+for the disk. A crash loses at most the last FLUSH_INTERVAL of turns of
+each table.
+"""
+import json
+import sqlite3
+import sys
+import threading
+import time
+from array import array
+from collections import namedtuple
+from operator import attrgetter
+
+from a2 import Deck, ComputerPlayer
+from a2_support import FULL_DECK_CODES, encode_card, decode_cards, make_rng
+from a2_support import UnoGame
+from movelog import POLICIES
+from simulation import PLAYER_COUNT, MAX_TURNS, new_game
+
+# the most seconds a checkpoint waits before it is written
+FLUSH_INTERVAL = 0.05
+# the most tables written in one transaction
+BATCH_SIZE = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tables (
+    id INTEGER PRIMARY KEY,
+    seed TEXT,
+    names TEXT NOT NULL,
+    policy INTEGER NOT NULL,
+    location INTEGER NOT NULL,
+    direction INTEGER NOT NULL,
+    recycles INTEGER NOT NULL,
+    turns INTEGER NOT NULL,
+    over INTEGER NOT NULL,
+    winner INTEGER,
+    cards BLOB NOT NULL
+)
+"""
+
+SAVE = """
+INSERT OR REPLACE INTO tables (id, seed, names, policy, location, direction,
+                               recycles, turns, over, winner, cards)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# reads the code of a shared card, or None for a card which is not shared
+CARD_CODE = attrgetter("_code")
+
+SavedTable = namedtuple("SavedTable", ["table_id", "seed", "turns", "game"])
+SavedTable.__doc__ = """
+A game resumed from its last checkpoint.
+
+Attributes:
+    table_id (int): The identifier the game was checkpointed with.
+    seed (int): The seed the game was checkpointed with, None if it had none.
+    turns (int): The amount of turns taken in the game.
+    game (UnoGame): The game as it was when it was checkpointed.
+"""
+
+
+def connect(path):
+    """
+    Open a database of checkpoints, creating it if needed.
+
+    Parameters:
+        path (str): The path of the database.
+
+    Returns:
+        (sqlite3.Connection): The connection to the database.
+    """
+    connection = sqlite3.connect(path, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.execute(SCHEMA)
+    connection.commit()
+    return connection
+
+
+def encode_piles(piles):
+    """
+    Encode piles of cards as the amount and codes of each pile, as unsigned
+    16 bit little-endian integers.
+
+    Parameters:
+        piles (list<tuple<Card>|bytes>): The cards of each pile, in order,
+                                         or the snapshot of a CodeDeck, which
+                                         holds the codes themselves.
+
+    Returns:
+        (bytes): The encoded piles.
+    """
+    codes = array("H")
+    for pile in piles:
+        if isinstance(pile, bytes):
+            # the codes of a CodeDeck, in the machine's byte order
+            pile = array("H", pile)
+            codes.append(len(pile))
+            codes.extend(pile)
+            continue
+
+        codes.append(len(pile))
+        start = len(codes)
+        try:
+            codes.extend(map(CARD_CODE, pile))
+        except TypeError:
+            # a card is not shared, so its code is None and the pile is
+            # encoded one card at a time
+            del codes[start:]
+            codes.extend(map(encode_card, pile))
+
+    if sys.byteorder != "little":
+        codes.byteswap()
+    return codes.tobytes()
+
+
+def decode_piles(data):
+    """
+    Decode piles of cards written by encode_piles.
+
+    Parameters:
+        data (bytes): The encoded piles.
+
+    Returns:
+        (list<tuple<Card>>): The shared cards of each pile, in order.
+    """
+    codes = array("H", data)
+    if sys.byteorder != "little":
+        codes.byteswap()
+
+    piles = []
+    offset = 0
+    while offset < len(codes):
+        amount = codes[offset]
+        offset += 1
+        piles.append(tuple(decode_cards(codes[offset:offset + amount])))
+        offset += amount
+    return piles
+
+
+def encode_state(table_id, seed, turns, game, snapshot):
+    """
+    Encode a snapshot of a game as a row of the tables table.
+
+    Parameters:
+        table_id (int): The identifier of the table.
+        seed (int): The seed the game was constructed with, or None.
+        turns (int): The amount of turns taken in the game.
+        game (UnoGame): The game the snapshot was taken of.
+        snapshot (tuple): The state returned by game.snapshot().
+
+    Returns:
+        (tuple): The values of the row.
+    """
+    (pickup, putdown, special, hands, (location, direction), recycles,
+     is_over, _, winner) = snapshot
+
+    names = json.dumps([player.get_name() for player in game.players])
+    return (table_id, None if seed is None else str(seed), names,
+            POLICIES.index(game.recycle), location, int(direction),
+            recycles, turns, int(is_over),
+            None if winner is None else game.players.index(winner),
+            encode_piles((pickup, putdown, special) + hands))
+
+
+def decode_state(row, make_player=None):
+    """
+    Rebuild a game from a row of the tables table.
+
+    Parameters:
+        row (tuple): The values of the row, in the order of SCHEMA.
+        make_player (callable): Constructs the player of a seat, given the
+                                seat and the player's name. If None, every
+                                seat is a ComputerPlayer.
+
+    Returns:
+        (SavedTable): The game, as it was checkpointed.
+    """
+    (table_id, seed, names, policy, location, direction, recycles, turns,
+     over, winner, data) = row
+
+    names = json.loads(names)
+    if make_player is None:
+        players = [ComputerPlayer(name) for name in names]
+    else:
+        players = [make_player(seat, name) for seat, name in enumerate(names)]
+
+    piles = decode_piles(data)
+    pickup, putdown, special = piles[:3]
+
+    seed = None if seed is None else int(seed)
+    # the generator's state is not checkpointed, so a resumed game shuffles
+    # recycled cards differently from the game it was resumed from
+    rng = None if seed is None else make_rng(f"{seed}:{turns}")
+
+    # the game turns over the top of the putdown pile, before it is replaced
+    game = UnoGame(Deck(list(pickup + putdown[-1:])), players,
+                   POLICIES[policy], rng)
+    game.restore((pickup, putdown, special, tuple(piles[3:]),
+                  (location, bool(direction)), recycles, bool(over), True,
+                  None if winner is None else players[winner]))
+    return SavedTable(table_id, seed, turns, game)
+
+
+class GameStore:
+    """
+    Checkpoints games to a SQLite database, from a writer thread.
+    """
+    def __init__(self, path, flush_interval=FLUSH_INTERVAL,
+                 batch_size=BATCH_SIZE):
+        """
+        Open a database of checkpoints and start its writer thread.
+
+        Parameters:
+            path (str): The path of the database.
+            flush_interval (float): The most seconds a checkpoint waits
+                                    before it is written.
+            batch_size (int): The most tables written in one transaction.
+        """
+        self._connection = connect(path)
+        # checkpoints are read through a connection of their own, which only
+        # sees transactions the writer thread has committed
+        self._reader = connect(path)
+        self._lock = threading.Condition(threading.Lock())
+        self._pending = {}
+        self._written = 0
+        self._requested = 0
+        self._closed = False
+        # the exception which stopped the writer thread, if any
+        self._error = None
+
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.transactions = 0
+        self.rows = 0
+
+        self._writer = threading.Thread(target=self._write_behind,
+                                        daemon=True)
+        self._writer.start()
+
+    def checkpoint(self, table_id, game, seed=None, turns=0):
+        """
+        Queue the current state of a game to be written, replacing any state
+        of the same table which has not been written yet.
+
+        Parameters:
+            table_id (int): The identifier of the table.
+            game (UnoGame): The game to checkpoint.
+            seed (int): The seed the game was constructed with, if known.
+            turns (int): The amount of turns taken in the game.
+        """
+        state = (seed, turns, game, game.snapshot())
+        with self._lock:
+            self._pending[table_id] = state
+
+    def queued(self):
+        """
+        (int) Returns the amount of tables whose latest checkpoint has not
+        been handed to the writer thread yet.
+
+        Read without the lock, so a caller never waits on the writer thread.
+        """
+        return len(self._pending)
+
+    def flush(self):
+        """
+        Wait until every checkpoint queued so far has been written.
+
+        Raises:
+            Exception: The exception which stopped the writer thread, if a
+                       checkpoint could not be written.
+        """
+        with self._lock:
+            self._requested += 1
+            target = self._requested
+            self._lock.notify_all()
+            self._lock.wait_for(lambda: self._written >= target
+                                or self._closed or self._error is not None)
+            if self._error is not None:
+                raise self._error
+
+    def close(self):
+        """
+        Write every queued checkpoint, stop the writer thread and close the
+        database.
+
+        Raises:
+            Exception: The exception which stopped the writer thread, if a
+                       checkpoint could not be written.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._lock.notify_all()
+        self._writer.join()
+        self._connection.close()
+        self._reader.close()
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _write_behind(self):
+        """
+        Write queued checkpoints in batches until the store is closed, or a
+        checkpoint cannot be written, in which case the exception is kept to
+        be raised by flush and close.
+        """
+        try:
+            self._write_batches()
+        except Exception as error:
+            with self._lock:
+                self._error = error
+                self._lock.notify_all()
+
+    def _write_batches(self):
+        """
+        Write queued checkpoints in batches until the store is closed.
+        """
+        while True:
+            with self._lock:
+                self._lock.wait_for(
+                    lambda: self._closed or self._requested > self._written
+                    or len(self._pending) >= self.batch_size,
+                    timeout=self.flush_interval)
+                pending, self._pending = self._pending, {}
+                requested = self._requested
+                closed = self._closed
+
+            items = list(pending.items())
+            for start in range(0, len(items), self.batch_size):
+                rows = [encode_state(table_id, *state)
+                        for table_id, state in items[start:start
+                                                     + self.batch_size]]
+                with self._connection:
+                    self._connection.executemany(SAVE, rows)
+                self.transactions += 1
+                self.rows += len(rows)
+
+            with self._lock:
+                self._written = requested
+                self._lock.notify_all()
+
+            if closed:
+                return
+
+    def load(self, table_id, make_player=None):
+        """
+        Resume a game from the last checkpoint written of its table.
+
+        Parameters:
+            table_id (int): The identifier of the table.
+            make_player (callable): Constructs the player of a seat, given the
+                                    seat and the player's name.
+
+        Returns:
+            (SavedTable): The game, None if its table was never written.
+        """
+        row = self._reader.execute("SELECT * FROM tables WHERE id = ?",
+                                   (table_id,)).fetchone()
+        return None if row is None else decode_state(row, make_player)
+
+    def unfinished(self, make_player=None):
+        """
+        Resume every game whose last checkpoint written was not over.
+
+        Parameters:
+            make_player (callable): Constructs the player of a seat, given the
+                                    seat and the player's name.
+
+        Returns:
+            (list<SavedTable>): The games, in the order of their table.
+        """
+        rows = self._reader.execute(
+            "SELECT * FROM tables WHERE over = 0 ORDER BY id").fetchall()
+        return [decode_state(row, make_player) for row in rows]
+
+    def last_table(self):
+        """
+        (int) Returns the greatest identifier of a table written, 0 if none.
+        """
+        row = self._reader.execute("SELECT MAX(id) FROM tables").fetchone()
+        return row[0] or 0
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else "tables.sqlite"
+    tables = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    rounds = 50
+
+    cards = decode_cards(FULL_DECK_CODES)
+    games = [new_game(cards, PLAYER_COUNT, rng=seed) for seed in range(tables)]
+
+    with GameStore(path) as store:
+        taken = [0] * tables
+        start = time.perf_counter()
+        for _ in range(min(rounds, MAX_TURNS)):
+            for table, game in enumerate(games):
+                if not game.is_over():
+                    game.take_turn(game.next_player())
+                    taken[table] += 1
+                    store.checkpoint(table + 1, game, table, taken[table])
+        elapsed = time.perf_counter() - start
+        store.flush()
+        written = time.perf_counter() - start
+
+        turns = sum(taken)
+        print(f"Took {turns} turns across {tables} tables with a checkpoint "
+              f"after each, {elapsed / turns * 1e6:.1f}us per turn")
+        print(f"Wrote {store.rows} checkpoints in {store.transactions} "
+              f"transactions, all written {written:.2f}s after the first turn")
+
+        start = time.perf_counter()
+        resumed = store.unfinished()
+        elapsed = time.perf_counter() - start
+        print(f"Resumed {len(resumed)} unfinished tables in "
+              f"{elapsed * 1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,489 @@
+#!/usr/bin/env python3
+"""
+UNO++ Table Router
+
+Spreads the tables of a GameServer across worker processes, so tables are
+not limited to the single core of one event loop.
+
+A front router accepts every connection and reads the client's opening
+line. A client rejoining a table is routed to the shard, a worker process
+running its own GameServer, which owns the table, and any other client opens
+a table on the shard with the fewest open tables. The connection itself is
+handed to the table's shard over a Unix socket, along with the bytes already
+read, so the shard talks to the client directly and the router never copies
+a byte of the game. Shards tell the router when a table closes, so new
+tables keep being assigned to the least loaded shard. A table stays on the
+shard it was opened on until it closes, so tables are balanced only as they
+are opened, and never moved between shards.
+
+A table whose client leaves before its game ends stays with its shard,
+until the client rejoins it. Given a directory, each shard checkpoints its
+tables to a GameStore of its own, and a router restarted with the same
+directory and amount of shards resumes every unfinished table on the shard
+it was played on.
+
+Handing over connections requires a Unix system.
+"""
+import asyncio
+import json
+import os
+import socket
+import struct
+import sys
+import time
+from multiprocessing import Pool, Process, cpu_count
+
+from loadtest import percentile, run_clients
+from metrics import ServerMetrics
+from persistence import GameStore
+from server import HOST, PORT, BACKLOG, LINE_LIMIT, GameServer
+from simulation import PLAYER_COUNT, MAX_TURNS
+from tournament import shard_seeds
+
+# sent by a shard to the router: the identifier of a table and what
+# happened to it, or the greatest identifier the shard has used once it has
+# resumed its tables
+REPORT = struct.Struct("<QB")
+CLOSED, RESUMED, READY = range(3)
+# sent with a connection to its shard: the identifier of its table, whether
+# the connection opens the table, and then the bytes the router has read
+HANDOVER = struct.Struct("<Q?")
+
+
+def run_shard(channel, seed, player_count=PLAYER_COUNT, max_turns=MAX_TURNS,
+              metrics_port=None, path=None):
+    """
+    Serve the tables handed to a shard until the router closes its channel.
+
+    Parameters:
+        channel (socket.socket): The shard's end of its channel to the router.
+        seed (int): The seed each table's seed is drawn from.
+        player_count (int): The amount of players at each table.
+        max_turns (int): The amount of turns after which a game is abandoned.
+        metrics_port (int): The port the shard's metrics are served on,
+                            if None, metrics are not served.
+        path (str): The path of the shard's database of checkpoints,
+                    if None, tables are only kept in memory.
+    """
+    asyncio.run(serve_shard(channel, seed, player_count, max_turns,
+                            metrics_port, path))
+
+
+async def serve_shard(channel, seed, player_count=PLAYER_COUNT,
+                      max_turns=MAX_TURNS, metrics_port=None, path=None):
+    """
+    Serve the tables handed to a shard, in the shard's event loop.
+
+    Every unfinished table in the shard's database is resumed, and reported
+    to the router, before the first connection is served.
+
+    Parameters:
+        channel (socket.socket): The shard's end of its channel to the router.
+        seed (int): The seed each table's seed is drawn from.
+        player_count (int): The amount of players at each table.
+        max_turns (int): The amount of turns after which a game is abandoned.
+        metrics_port (int): The port the shard's metrics are served on,
+                            if None, metrics are not served.
+        path (str): The path of the shard's database of checkpoints,
+                    if None, tables are only kept in memory.
+    """
+    loop = asyncio.get_running_loop()
+    store = None if path is None else GameStore(path)
+    server = GameServer(seed, player_count, max_turns, store)
+    if store is not None:
+        server.resume()
+    closed = loop.create_future()
+    tables = set()
+
+    metrics = None
+    if metrics_port is not None:
+        metrics = ServerMetrics(server)
+        await metrics.start(HOST, metrics_port)
+
+    async def serve(connection, table_id, opens, received):
+        finished = False
+        try:
+            # the bytes the router read are fed to the reader before the
+            # connection is read from, so none are lost or reordered
+            reader = asyncio.StreamReader(limit=LINE_LIMIT)
+            reader.feed_data(received)
+            protocol = asyncio.StreamReaderProtocol(reader)
+            transport, _ = await loop.connect_accepted_socket(
+                lambda: protocol, sock=connection)
+            writer = asyncio.StreamWriter(transport, protocol, reader, loop)
+            finished = await server.serve_table(reader, writer, table_id)
+        finally:
+            # a table left before its end stays with the shard, and a refused
+            # rejoin leaves the table it named as it was
+            if not server.is_suspended(table_id) and (opens or finished):
+                await loop.sock_sendall(channel,
+                                        REPORT.pack(table_id, CLOSED))
+
+    def receive():
+        try:
+            message, fds, _, _ = socket.recv_fds(
+                channel, HANDOVER.size + LINE_LIMIT, 1)
+        except BlockingIOError:
+            return
+
+        if not message:
+            if not closed.done():
+                closed.set_result(None)
+            return
+
+        table_id, opens = HANDOVER.unpack_from(message)
+        task = loop.create_task(serve(socket.socket(fileno=fds[0]), table_id,
+                                      opens, message[HANDOVER.size:]))
+        tables.add(task)
+        task.add_done_callback(tables.discard)
+
+    channel.setblocking(False)
+    for table_id in server.suspended_tables():
+        await loop.sock_sendall(channel, REPORT.pack(table_id, RESUMED))
+    await loop.sock_sendall(channel, REPORT.pack(server.tables, READY))
+
+    loop.add_reader(channel.fileno(), receive)
+    try:
+        await closed
+        if tables:
+            await asyncio.wait(tables)
+    finally:
+        loop.remove_reader(channel.fileno())
+        channel.close()
+        if metrics is not None:
+            await metrics.close()
+        if store is not None:
+            store.close()
+
+
+class Router:
+    """
+    Accepts connections, and hands each one to the shard hosting its table.
+    """
+    def __init__(self, shards=None, seed=None, player_count=PLAYER_COUNT,
+                 max_turns=MAX_TURNS, metrics_port=None, directory=None):
+        """
+        Construct a router which has not started its shards.
+
+        Parameters:
+            shards (int): The amount of worker processes,
+                          if None, one per available core.
+            seed (int): The seed each shard's seed is derived from,
+                        if None, tables are not reproducible.
+            player_count (int): The amount of players at each table.
+            max_turns (int): The amount of turns after which a game is
+                             abandoned.
+            metrics_port (int): The port the first shard's metrics are
+                                served on, each following shard serving on
+                                the next port, if None, metrics are not
+                                served.
+            directory (str): The directory of each shard's database of
+                             checkpoints, which is created if needed,
+                             if None, tables are only kept in memory.
+        """
+        self.shards = shards or cpu_count()
+        self._seeds = ([None] * self.shards if seed is None
+                       else shard_seeds(seed, self.shards))
+        self.player_count = player_count
+        self.max_turns = max_turns
+        self.metrics_port = metrics_port
+        self.directory = directory
+
+        self._channels = []
+        # a handover waits for its channel's lock while the channel is full
+        self._sending = []
+        self._processes = []
+        self._listener = None
+        self._accepting = None
+        self._handovers = set()
+        # resolved once each shard has resumed its tables
+        self._ready = []
+
+        self.tables = 0
+        # the shard of each open table, and the amount open on each shard
+        self.owners = {}
+        self.open_tables = [0] * self.shards
+
+    async def start(self, host=HOST, port=PORT):
+        """
+        Start the shards, and start listening for connections once every
+        shard has resumed its tables.
+
+        Parameters:
+            host (str): The address to listen on.
+            port (int): The port to listen on, if 0, any free port.
+
+        Returns:
+            (int): The port listened on.
+        """
+        loop = asyncio.get_running_loop()
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+
+        for shard, seed in enumerate(self._seeds):
+            ours, theirs = socket.socketpair(socket.AF_UNIX,
+                                             socket.SOCK_SEQPACKET)
+            metrics_port = (None if self.metrics_port is None
+                            else self.metrics_port + shard)
+            path = (None if self.directory is None
+                    else os.path.join(self.directory,
+                                      f"shard-{shard:03d}.sqlite"))
+            process = Process(target=run_shard, daemon=True,
+                              args=(theirs, seed, self.player_count,
+                                    self.max_turns, metrics_port, path))
+            process.start()
+            theirs.close()
+
+            ours.setblocking(False)
+            self._channels.append(ours)
+            self._sending.append(asyncio.Lock())
+            self._processes.append(process)
+            self._ready.append(loop.create_future())
+            loop.add_reader(ours.fileno(), self._report, shard)
+
+        await asyncio.gather(*self._ready)
+
+        self._listener = socket.create_server((host, port), backlog=BACKLOG)
+        self._listener.setblocking(False)
+        self._accepting = asyncio.ensure_future(self._accept())
+        return self._listener.getsockname()[1]
+
+    def least_loaded(self):
+        """
+        (int) Returns the shard with the fewest open tables.
+        """
+        return min(range(self.shards), key=self.open_tables.__getitem__)
+
+    def route(self):
+        """
+        Open a table on the shard with the fewest open tables.
+
+        Returns:
+            (tuple<int, int>): The identifier of the table, and its shard.
+        """
+        shard = self.least_loaded()
+        self.tables += 1
+        self.owners[self.tables] = shard
+        self.open_tables[shard] += 1
+        return self.tables, shard
+
+    def route_hello(self, line):
+        """
+        Route a connection by its client's opening line.
+
+        A client rejoining a table is sent to the table's owner, or, if no
+        shard owns the table, to the least loaded shard, which refuses it.
+        Every other client opens a table, see route.
+
+        Parameters:
+            line (bytes): The client's opening line.
+
+        Returns:
+            (tuple<int, int, bool>): The identifier of the table, its shard,
+                                     and whether the connection opens it.
+        """
+        try:
+            hello = json.loads(line)
+        except ValueError:
+            hello = None
+        rejoin = hello.get("table") if isinstance(hello, dict) else None
+
+        if rejoin is None:
+            return (*self.route(), True)
+        shard = self.owners.get(rejoin) if type(rejoin) is int else None
+        if shard is None:
+            # no shard owns the table, so any shard can refuse it
+            return 0, self.least_loaded(), False
+        return rejoin, shard, False
+
+    async def _accept(self):
+        """
+        Hand every connection accepted to the shard of its table.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            connection, _ = await loop.sock_accept(self._listener)
+            # a client slow to send its opening line holds up no other
+            task = asyncio.ensure_future(self._hand_over(connection))
+            self._handovers.add(task)
+            task.add_done_callback(self._handovers.discard)
+
+    async def _hand_over(self, connection):
+        """
+        Read a connection's opening line, and hand the connection, with the
+        bytes read, to the shard of its table.
+
+        Parameters:
+            connection (socket.socket): The accepted, non-blocking, connection.
+        """
+        loop = asyncio.get_running_loop()
+        with connection:
+            received = b""
+            while b"\n" not in received and len(received) < LINE_LIMIT:
+                try:
+                    data = await loop.sock_recv(connection,
+                                                LINE_LIMIT - len(received))
+                except ConnectionError:
+                    return
+                if not data:
+                    # the client left before opening a table
+                    return
+                received += data
+
+            # a line too long is handed over, for the shard to refuse
+            table_id, shard, opens = self.route_hello(
+                received.split(b"\n", 1)[0])
+            async with self._sending[shard]:
+                await self._send(self._channels[shard],
+                                 HANDOVER.pack(table_id, opens) + received,
+                                 connection)
+
+    @staticmethod
+    async def _send(channel, message, connection):
+        """
+        Send a message and a connection over a shard's channel, waiting,
+        without blocking the event loop, while the channel is full.
+
+        Parameters:
+            channel (socket.socket): The router's end of a shard's channel.
+            message (bytes): The message to send.
+            connection (socket.socket): The connection to send.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                socket.send_fds(channel, [message], [connection.fileno()])
+                return
+            except BlockingIOError:
+                pass
+
+            writable = loop.create_future()
+            loop.add_writer(channel.fileno(), lambda: writable.done()
+                            or writable.set_result(None))
+            try:
+                await writable
+            finally:
+                loop.remove_writer(channel.fileno())
+
+    def _report(self, shard):
+        """
+        Read what a shard reports: a table it has resumed or closed, or that
+        it has resumed every table it had.
+
+        Parameters:
+            shard (int): The shard whose channel can be read.
+        """
+        channel = self._channels[shard]
+        ready = self._ready[shard]
+        try:
+            message = channel.recv(REPORT.size, socket.MSG_DONTWAIT)
+        except BlockingIOError:
+            return
+
+        if not message:
+            # the shard has stopped
+            asyncio.get_running_loop().remove_reader(channel.fileno())
+            if not ready.done():
+                ready.set_exception(
+                    ConnectionError(f"shard {shard} stopped before starting"))
+            return
+
+        table_id, kind = REPORT.unpack(message)
+        if kind == CLOSED:
+            if self.owners.pop(table_id, None) == shard:
+                self.open_tables[shard] -= 1
+        elif kind == RESUMED:
+            self.owners[table_id] = shard
+            self.open_tables[shard] += 1
+        elif not ready.done():
+            # identifiers stay unique across the tables of every shard
+            self.tables = max(self.tables, table_id)
+            ready.set_result(None)
+
+    async def close(self):
+        """
+        Stop listening, and stop every shard once its open tables end.
+        """
+        loop = asyncio.get_running_loop()
+
+        self._accepting.cancel()
+        for task in self._handovers:
+            task.cancel()
+        self._listener.close()
+
+        for channel in self._channels:
+            loop.remove_reader(channel.fileno())
+            channel.shutdown(socket.SHUT_WR)
+        for process in self._processes:
+            await loop.run_in_executor(None, process.join)
+        for channel in self._channels:
+            channel.close()
+
+
+def run_client_shard(shard):
+    """
+    Play tables against a running router from a client process.
+
+    Parameters:
+        shard (tuple<int, int>): The port of the router, and the amount of
+                                 tables to play.
+
+    Returns:
+        (tuple<list<float>, int>): The latency of every turn, and the amount
+                                   of turns taken.
+    """
+    port, tables = shard
+    latencies, results = asyncio.run(run_clients(HOST, port, tables))
+    return latencies, sum(result["turns"] for result in results)
+
+
+async def measure(shards, tables, clients):
+    """
+    Play tables against a router with a given amount of shards.
+
+    Parameters:
+        shards (int): The amount of shards.
+        tables (int): The amount of tables to play.
+        clients (int): The amount of client processes playing the tables.
+
+    Returns:
+        (tuple<list<float>, int, float>): The sorted latency of every turn,
+                                          the amount of turns taken, and the
+                                          seconds taken.
+    """
+    router = Router(shards, seed=0)
+    port = await router.start(HOST, 0)
+    loop = asyncio.get_running_loop()
+
+    sizes = [tables // clients + (client < tables % clients)
+             for client in range(clients)]
+    start = time.perf_counter()
+    try:
+        with Pool(clients) as pool:
+            outcomes = await loop.run_in_executor(
+                None, pool.map, run_client_shard,
+                [(port, size) for size in sizes])
+    finally:
+        await router.close()
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for outcome in outcomes
+                       for latency in outcome[0])
+    return latencies, sum(outcome[1] for outcome in outcomes), elapsed
+
+
+def main():
+    tables = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    cores = os.cpu_count() or 1
+    print(f"{tables} tables, {cores} cores")
+
+    for shards in sorted({1, max(1, cores // 4), max(1, cores // 2)}):
+        latencies, turns, elapsed = asyncio.run(
+            measure(shards, tables, clients=max(1, cores - shards)))
+        print(f"{shards} shards: {turns / elapsed:,.0f} turns/s, "
+              f"p50 {percentile(latencies, 0.5) * 1000:.1f}ms, "
+              f"p99 {percentile(latencies, 0.99) * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,567 @@
+#!/usr/bin/env python3
+"""
+UNO++ Table Server
+
+Hosts many games of UNO++ in a single asyncio event loop. Every connection
+opens a table, where the connected player takes the first seat and the other
+seats are played in-process by computer players.
+
+The protocol is one JSON object per line. The client opens with
+    {"name": "<player name>"}
+or, to rejoin a table left before its game ended, or resumed from a
+GameStore after the server restarted, under the name it was joined with,
+    {"name": "<player name>", "table": <id>}
+and the server replies with
+    {"type": "start", "table": <id>, "seed": <seed>, "seat": 0,
+     "players": [<names>]}
+followed, as the game is played, by
+    {"type": "turn", "top": <code>, "hand": [<codes>]}
+        when it is the client's turn, which the client answers with
+        {"play": <position in hand>} or {"play": null} to pick up a card,
+    {"type": "event", "seat": <seat>, "action": "play"|"draw"|"discard",
+     "card": <code>|null, "target": <seat>|null, "pickups": [<codes>],
+     "reversed": <bool>}
+        after every turn,
+    {"type": "error", "message": <text>}
+        for a move which cannot be made, after which the turn is asked again,
+    {"type": "over", "winner": <seat>|null, "turns": <turns>}
+        when the game ends, after which the connection is closed.
+Cards are sent as their codes, see a2_support.encode_card.
+
+Messages are written in batches without waiting for the client, and a table
+only waits for its client to read them once the connection's write buffer
+holds HIGH_WATER bytes, so a slow client holds up its own table and no other.
+"""
+import asyncio
+import json
+import sys
+import time
+
+from a2 import Deck, HumanPlayer, ComputerPlayer
+from a2_support import FULL_DECK_CODES, RecyclePolicy, UnoGame
+from a2_support import encode_card, card_matches, decode_cards, make_rng
+from metrics import ServerMetrics
+from persistence import GameStore
+from simulation import PLAYER_COUNT, MAX_TURNS, deal
+
+HOST = "127.0.0.1"
+PORT = 8045
+
+# the most bytes buffered for a client before its table waits for it
+HIGH_WATER = 64 * 1024
+# the longest line accepted from a client
+LINE_LIMIT = 4096
+# the most messages buffered for a client before they are written
+FLUSH_LINES = 64
+BACKLOG = 1024
+
+ENCODER = json.JSONEncoder(separators=(",", ":"))
+
+
+class RemotePlayer(HumanPlayer):
+    """
+    A human player whose cards are chosen by a client of the server.
+    """
+    __slots__ = ("_choice",)
+
+    def __init__(self, name):
+        """
+        Construct a player who has not chosen a card.
+
+        Parameters:
+            name (str): The player's name.
+        """
+        super().__init__(name)
+        self._choice = None
+
+    def choose(self, position):
+        """
+        Choose the card played in the player's next turn.
+
+        Parameters:
+            position (int): The position of the card in the player's hand,
+                            if None, the player picks up a card instead.
+        """
+        self._choice = position
+
+    def pick_card(self, putdown_pile):
+        """
+        Take the chosen card from the player's hand.
+
+        Parameters:
+            putdown_pile (Deck): The pile the player has to play a card onto.
+
+        Returns:
+            (Card): The card taken, None if the player chose to pick up a card.
+        """
+        position, self._choice = self._choice, None
+        if position is None:
+            return None
+        return self._deck.pick_at(position)
+
+
+def make_player(seat, name):
+    """
+    Construct the player of a seat at a table.
+
+    Parameters:
+        seat (int): The seat of the player.
+        name (str): The player's name, if None, a computer player is named
+                    after their seat.
+
+    Returns:
+        (Player): A RemotePlayer in the first seat, otherwise a
+                  ComputerPlayer.
+    """
+    if seat == 0:
+        return RemotePlayer(name)
+    return ComputerPlayer(f"Computer {seat}" if name is None else name)
+
+
+class Table:
+    """
+    A game between one remote player and computer players.
+    """
+    def __init__(self, table_id, seed, name, player_count=PLAYER_COUNT,
+                 max_turns=MAX_TURNS, saved=None):
+        """
+        Deal a new game, with the remote player in the first seat.
+
+        Parameters:
+            table_id (int): The identifier of the table.
+            seed (int): The seed the game is shuffled with.
+            name (str): The remote player's name.
+            player_count (int): The amount of players at the table.
+            max_turns (int): The amount of turns after which the game is
+                             abandoned.
+            saved (SavedTable): A game resumed by a GameStore, whose players
+                                were made by make_player, to continue instead
+                                of dealing a new game.
+        """
+        self.table_id = table_id
+        self.seed = seed
+        self.max_turns = max_turns
+        self.turns = 0
+
+        if saved is not None:
+            self.game = saved.game
+            self.players = self.game.players
+            self.remote = self.players[0]
+            self.turns = saved.turns
+        else:
+            self.remote = RemotePlayer(name)
+            self.players = [self.remote] + [make_player(seat, None)
+                                            for seat in range(1, player_count)]
+
+            rng = make_rng(seed)
+            pickup_pile = Deck(decode_cards(FULL_DECK_CODES))
+            pickup_pile.set_rng(rng)
+            pickup_pile.shuffle()
+            deal(self.players, pickup_pile)
+            self.game = UnoGame(pickup_pile, self.players,
+                                RecyclePolicy.reshuffle, rng)
+
+        self._seats = {player: seat
+                       for seat, player in enumerate(self.players)}
+
+    def seat(self, player):
+        """
+        (int) Returns the seat of a player at the table, None for None.
+
+        Parameters:
+            player (Player): A player at the table.
+        """
+        return None if player is None else self._seats[player]
+
+    def start_message(self):
+        """
+        (dict) Returns the message which opens the table.
+        """
+        return {"type": "start", "table": self.table_id, "seed": self.seed,
+                "seat": 0,
+                "players": [player.get_name() for player in self.players]}
+
+    def turn_message(self):
+        """
+        (dict) Returns the message asking the remote player for their card.
+        """
+        return {"type": "turn",
+                "top": encode_card(self.game.putdown_pile.top()),
+                "hand": [encode_card(card)
+                         for card in self.remote.get_deck().get_cards()]}
+
+    def event_message(self, event):
+        """
+        (dict) Returns the message describing a turn.
+
+        Parameters:
+            event (TurnEvent): The turn taken.
+        """
+        return {"type": "event", "seat": self.seat(event.player),
+                "action": event.action.value,
+                "card": None if event.card is None
+                else encode_card(event.card),
+                "target": self.seat(event.target),
+                "pickups": [encode_card(card) for card in event.pickups],
+                "reversed": event.reversed}
+
+    def check_move(self, message):
+        """
+        Check a move sent by the remote player, and choose it if it is valid.
+
+        Parameters:
+            message (dict): The move sent by the client.
+
+        Returns:
+            (str): Why the move cannot be made, None if it was chosen.
+        """
+        if not isinstance(message, dict) or "play" not in message:
+            return "expected a play"
+
+        position = message["play"]
+        if position is None:
+            self.remote.choose(None)
+            return None
+
+        cards = self.remote.get_deck().get_cards()
+        if not isinstance(position, int) or isinstance(position, bool) \
+                or not 0 <= position < len(cards):
+            return "play must be the position of a card in your hand, or null"
+        if not card_matches(cards[position], self.game.putdown_pile.top()):
+            return "that card does not match the top of the putdown pile"
+
+        self.remote.choose(position)
+        return None
+
+
+class GameServer:
+    """
+    Serves a table to every connection, in a single event loop.
+    """
+    def __init__(self, seed=None, player_count=PLAYER_COUNT,
+                 max_turns=MAX_TURNS, store=None, profile=None):
+        """
+        Construct a server which has not started listening.
+
+        Parameters:
+            seed (int): The seed each table's seed is drawn from,
+                        if None, tables are not reproducible.
+            player_count (int): The amount of players at each table.
+            max_turns (int): The amount of turns after which a game is
+                             abandoned.
+            store (GameStore): The store every table is checkpointed to
+                               after each turn, if None, tables are only
+                               kept in memory.
+            profile (TurnProfile): The profile every turn is timed in,
+                                   if None, turns are not timed.
+        """
+        self._rng = make_rng(seed)
+        self.player_count = player_count
+        self.max_turns = max_turns
+        self.store = store
+        self.profile = profile
+        self._server = None
+        # tables resumed from the store, waiting for their client to return
+        self._suspended = {}
+
+        self.tables = 0
+        self.open_tables = 0
+        self.turns = 0
+        self.recycles = 0
+        # the output of every open connection
+        self.writers = set()
+        # the seconds computer players take over their turns, if counted,
+        # see metrics.ServerMetrics
+        self.decisions = None
+
+    def resume(self):
+        """
+        Resume every unfinished table in the store, to be rejoined by its
+        client sending {"name": <name>, "table": <id>}.
+
+        Returns:
+            (int): The amount of tables resumed.
+        """
+        for saved in self.store.unfinished(make_player):
+            self._suspended[saved.table_id] = Table(
+                saved.table_id, saved.seed, None, max_turns=self.max_turns,
+                saved=saved)
+        self.tables = max(self.tables, self.store.last_table())
+        return len(self._suspended)
+
+    def suspended(self):
+        """
+        (int) Returns the amount of tables waiting for their client to
+        rejoin them.
+        """
+        return len(self._suspended)
+
+    def suspended_tables(self):
+        """
+        (list<int>) Returns the identifiers of the tables waiting for their
+        client to rejoin them, in order.
+        """
+        return sorted(self._suspended)
+
+    def is_suspended(self, table_id):
+        """
+        (bool) Returns True iff a table is waiting for its client to rejoin it.
+
+        Parameters:
+            table_id (int): The identifier of the table.
+        """
+        return table_id in self._suspended
+
+    async def start(self, host=HOST, port=PORT):
+        """
+        Start listening for connections.
+
+        Parameters:
+            host (str): The address to listen on.
+            port (int): The port to listen on, if 0, any free port.
+
+        Returns:
+            (int): The port listened on.
+        """
+        self._server = await asyncio.start_server(
+            self.serve_table, host, port, limit=LINE_LIMIT, backlog=BACKLOG)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        """
+        Stop listening for connections.
+        """
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def serve_table(self, reader, writer, table_id=None):
+        """
+        Play a game with the client of a connection, until it ends or the
+        client leaves.
+
+        A table whose client leaves before its game ends is suspended, to be
+        rejoined by a client with the name of the player in its first seat,
+        see resume. Suspended tables are kept until they are rejoined.
+
+        Parameters:
+            reader (asyncio.StreamReader): The connection's input.
+            writer (asyncio.StreamWriter): The connection's output.
+            table_id (int): The identifier of the table, if None, tables are
+                            numbered in the order they are opened.
+
+        Returns:
+            (bool): Whether a table was played to its end.
+        """
+        writer.transport.set_write_buffer_limits(high=HIGH_WATER)
+        self.open_tables += 1
+        self.writers.add(writer)
+        # the table being played, until it has been played to its end
+        table = None
+
+        try:
+            hello = await self._read(reader)
+            name = hello.get("name") if isinstance(hello, dict) else None
+            if not isinstance(name, str):
+                message = {"type": "error", "message": "expected a name"}
+                await self._flush(writer, [encode(message)])
+                return False
+
+            rejoin = hello.get("table")
+            if rejoin is not None:
+                suspended = (self._suspended.get(rejoin)
+                             if type(rejoin) is int else None)
+                if suspended is None \
+                        or suspended.remote.get_name() != name:
+                    # a table is only rejoined by the player in its seat
+                    message = {"type": "error",
+                               "message": f"no table {rejoin} to rejoin"}
+                    await self._flush(writer, [encode(message)])
+                    return False
+                table = self._suspended.pop(rejoin)
+            else:
+                self.tables += 1
+                table = Table(self.tables if table_id is None else table_id,
+                              self._rng.getrandbits(64), name,
+                              self.player_count, self.max_turns)
+
+            await self._play(table, reader, writer)
+            table = None
+            return True
+        except (ConnectionError, EOFError, ValueError):
+            # the client left, or sent something which is not a line of JSON
+            pass
+        finally:
+            if table is not None:
+                # the client left before the end, so the table waits for
+                # them to rejoin it
+                self._suspended[table.table_id] = table
+            self.open_tables -= 1
+            self.writers.discard(writer)
+            writer.close()
+        return False
+
+    async def _play(self, table, reader, writer):
+        """
+        Play out a table's game, asking the client for the remote player's
+        cards.
+
+        Messages are buffered, and written together when the client is asked
+        for a card, or the buffer reaches FLUSH_LINES messages.
+
+        Parameters:
+            table (Table): The table to play.
+            reader (asyncio.StreamReader): The connection's input.
+            writer (asyncio.StreamWriter): The connection's output.
+        """
+        game = table.game
+        if self.profile is not None:
+            self.profile.attach(game)
+        turns = game.get_turns()
+        events = game.iter_turns(table.max_turns - table.turns)
+        lines = [encode(table.start_message())]
+        store = self.store
+        decisions = self.decisions
+        recycles = game.recycles
+        if store is not None:
+            store.checkpoint(table.table_id, game, table.seed, table.turns)
+
+        while True:
+            if turns.peak() is table.remote and not game.is_over():
+                lines.append(encode(table.turn_message()))
+                await self._flush(writer, lines)
+
+                while True:
+                    problem = table.check_move(await self._read(reader))
+                    if problem is None:
+                        break
+                    lines.append(encode({"type": "error",
+                                         "message": problem}))
+                    await self._flush(writer, lines)
+            elif table.turns % len(table.players) == 0:
+                # let other tables take their turns between rounds
+                await asyncio.sleep(0)
+
+            if decisions is not None and turns.peak() is not table.remote:
+                start = time.perf_counter()
+                event = next(events, None)
+                decisions.observe(time.perf_counter() - start)
+            else:
+                event = next(events, None)
+            if event is None:
+                break
+            table.turns += 1
+            self.turns += 1
+            if game.recycles != recycles:
+                self.recycles += game.recycles - recycles
+                recycles = game.recycles
+            if store is not None:
+                store.checkpoint(table.table_id, game, table.seed,
+                                 table.turns)
+
+            lines.append(encode(table.event_message(event)))
+            if len(lines) >= FLUSH_LINES:
+                await self._flush(writer, lines)
+
+        lines.append(encode({"type": "over",
+                             "winner": table.seat(game.winner),
+                             "turns": table.turns}))
+        await self._flush(writer, lines)
+
+    @staticmethod
+    async def _read(reader):
+        """
+        Read a message from a client.
+
+        Parameters:
+            reader (asyncio.StreamReader): The connection's input.
+
+        Returns:
+            (object): The decoded message.
+
+        Raises:
+            EOFError: If the client closed the connection.
+            ValueError: If the line is too long, or is not JSON.
+        """
+        line = await reader.readline()
+        if not line:
+            raise EOFError("the client closed the connection")
+        return json.loads(line)
+
+    @staticmethod
+    async def _flush(writer, lines):
+        """
+        Write buffered messages to a client, waiting while its write buffer
+        is full.
+
+        Parameters:
+            writer (asyncio.StreamWriter): The connection's output.
+            lines (list<bytes>): The encoded messages, which are cleared.
+        """
+        writer.write(b"".join(lines))
+        lines.clear()
+        await writer.drain()
+
+
+def encode(message):
+    """
+    (bytes) Returns a message encoded as a line of JSON.
+
+    Parameters:
+        message (dict): The message to encode.
+    """
+    return ENCODER.encode(message).encode() + b"\n"
+
+
+async def serve(host=HOST, port=PORT, seed=None, path=None,
+                metrics_port=None):
+    """
+    Run a server until it is interrupted.
+
+    Parameters:
+        host (str): The address to listen on.
+        port (int): The port to listen on.
+        seed (int): The seed each table's seed is drawn from.
+        path (str): The database tables are checkpointed to, and resumed
+                    from, if None, tables are only kept in memory.
+        metrics_port (int): The port metrics are served on, over HTTP,
+                            if None, metrics are not served.
+    """
+    store = None if path is None else GameStore(path)
+    server = GameServer(seed, store=store)
+    if store is not None:
+        print(f"Resumed {server.resume()} tables from {path}")
+
+    metrics = None
+    if metrics_port is not None:
+        metrics = ServerMetrics(server)
+        metrics_port = await metrics.start(host, metrics_port)
+        print(f"Serving metrics on http://{host}:{metrics_port}/metrics")
+
+    port = await server.start(host, port)
+    print(f"Serving UNO++ tables on {host}:{port}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        if metrics is not None:
+            await metrics.close()
+        if store is not None:
+            store.close()
+
+
+def main():
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else PORT
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    path = sys.argv[3] if len(sys.argv) > 3 else None
+    if not path:
+        # an empty path serves metrics without a database
+        path = None
+    metrics_port = int(sys.argv[4]) if len(sys.argv) > 4 else None
+
+    try:
+        asyncio.run(serve(HOST, port, seed, path, metrics_port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
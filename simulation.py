@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+UNO++ Headless Simulation
+
+Plays complete games of UNO++ between computer players without the GUI.
+Turns are taken in the same order as UnoApp.step, but without waiting on
+tkinter callbacks, so many games can be run for strategy evaluation.
+"""
+import sys
+import time
+from collections import namedtuple
+
+from a2 import Deck, ComputerPlayer
+from a2_support import FULL_DECK_CODES, decode_cards, UnoGame, RecyclePolicy
+from a2_support import make_rng
+from instrument import TurnProfile
+
+PLAYER_COUNT = 3
+HAND_SIZE = 7
+MAX_TURNS = 1000
+
+GameResult = namedtuple("GameResult", ["winner", "turns", "hand_sizes"])
+GameResult.__doc__ = """
+The outcome of a single simulated game.
+
+Attributes:
+    winner (int): The seat index of the winning player,
+                  None if the game could not be finished.
+    turns (int): The amount of turns taken in the game.
+    hand_sizes (tuple<int>): The amount of cards left in each seat's hand.
+"""
+
+
+def deal(players, pickup_pile, hand_size=HAND_SIZE):
+    """
+    Deal a hand of cards to each player from the pickup pile.
+
+    Parameters:
+        players (list<Player>): The players to deal cards to.
+        pickup_pile (Deck): The pile of cards to deal from.
+        hand_size (int): The amount of cards dealt to each player.
+    """
+    for player in players:
+        player.get_deck().add_cards(pickup_pile.pick(hand_size))
+
+
+def new_game(cards, player_count=PLAYER_COUNT, rng=None,
+             recycle=RecyclePolicy.reshuffle, player_class=ComputerPlayer):
+    """
+    Construct a shuffled, dealt game of computer players.
+
+    The cards are never modified by playing a game, so the same list of cards,
+    such as the shared cards of decode_cards(FULL_DECK_CODES), may be used to
+    construct many games. Games constructed with the same seed are identical.
+
+    Parameters:
+        cards (list<Card>): The cards to build the pickup pile from.
+        player_count (int): The amount of computer players in the game.
+        rng (random.Random|int): The random number generator, or seed, the
+                                 game shuffles with. If None, the global
+                                 random module is used.
+        recycle (RecyclePolicy): What the game does when its pickup pile
+                                 runs out.
+        player_class (type): The class of the computer players.
+
+    Returns:
+        (UnoGame): A game ready to be played.
+    """
+    players = [player_class(f"Computer {seat}")
+               for seat in range(player_count)]
+
+    rng = make_rng(rng)
+
+    pickup_pile = Deck(list(cards))
+    pickup_pile.set_rng(rng)
+    pickup_pile.shuffle()
+    deal(players, pickup_pile)
+
+    return UnoGame(pickup_pile, players, recycle, rng)
+
+
+def play_game(game, max_turns=MAX_TURNS):
+    """
+    Play a game until a player has won.
+
+    Turns are taken in the same order as UnoApp.step. A game is abandoned if
+    it exceeds the maximum amount of turns, or its pickup pile runs out of
+    cards and the game's recycle policy is to fail.
+
+    Parameters:
+        game (UnoGame): The game to play.
+        max_turns (int): The amount of turns after which the game is abandoned.
+
+    Returns:
+        (GameResult): The outcome of the game.
+    """
+    turns = 0
+    winner = None
+
+    try:
+        while not game.is_over() and turns < max_turns:
+            game.take_turn(game.next_player())
+            turns += 1
+    except IndexError:
+        # the pickup pile ran out of cards, leave the game unfinished
+        pass
+    else:
+        if game.winner is not None:
+            winner = game.players.index(game.winner)
+
+    hand_sizes = tuple(player.get_deck().get_amount()
+                       for player in game.players)
+    return GameResult(winner, turns, hand_sizes)
+
+
+def simulate(games, player_count=PLAYER_COUNT, max_turns=MAX_TURNS,
+             rng=None, recycle=RecyclePolicy.reshuffle, profile=None):
+    """
+    Play many games between computer players.
+
+    Parameters:
+        games (int): The amount of games to play.
+        player_count (int): The amount of computer players in each game.
+        max_turns (int): The amount of turns after which a game is abandoned.
+        rng (random.Random|int): The random number generator, or seed, every
+                                 game shuffles with in turn. If None, the
+                                 global random module is used.
+        recycle (RecyclePolicy): What a game does when its pickup pile runs out.
+        profile (TurnProfile): The profile every turn is timed in,
+                               if None, turns are not timed.
+
+    Returns:
+        (list<GameResult>): The outcome of each game, in the order played.
+    """
+    cards = decode_cards(FULL_DECK_CODES)
+    rng = make_rng(rng)
+
+    results = []
+    for _ in range(games):
+        game = new_game(cards, player_count, rng, recycle)
+        if profile is not None:
+            profile.attach(game)
+        results.append(play_game(game, max_turns))
+    return results
+
+
+def main():
+    games = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    profile = TurnProfile() if "profile" in sys.argv[2:] else None
+
+    start = time.perf_counter()
+    results = simulate(games, profile=profile)
+    elapsed = time.perf_counter() - start
+
+    wins = [0] * PLAYER_COUNT
+    unfinished = 0
+    for result in results:
+        if result.winner is None:
+            unfinished += 1
+        else:
+            wins[result.winner] += 1
+
+    print(f"Played {games} games in {elapsed:.2f}s "
+          f"({games / elapsed:.0f} games/s)")
+    for seat, count in enumerate(wins):
+        print(f"Seat {seat}: {count} wins")
+    print(f"Unfinished: {unfinished}")
+    if profile is not None:
+        print(profile.format_summary())
+
+
+if __name__ == "__main__":
+    main()
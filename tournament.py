@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+UNO++ Tournament Runner
+
+Shards a large amount of simulated games across a pool of worker processes.
+Every shard plays with its own random.Random stream, seeded from the
+tournament seed, so a tournament is reproducible for a given seed and shard
+count, and shards are independent of each other.
+"""
+import random
+import sys
+import time
+from collections import Counter
+from multiprocessing import Pool, cpu_count
+
+from simulation import PLAYER_COUNT, MAX_TURNS, simulate
+
+SHARD_SIZE = 5000
+
+
+class TournamentResult:
+    """
+    The merged statistics of a collection of simulated games.
+    """
+    def __init__(self, player_count=PLAYER_COUNT):
+        """
+        Construct an empty set of tournament statistics.
+
+        Parameters:
+            player_count (int): The amount of seats in each game.
+        """
+        self.games = 0
+        self.unfinished = 0
+        self.wins = [0] * player_count
+        self.cards_left = [0] * player_count
+        self.lengths = Counter()
+
+    def add_result(self, result):
+        """
+        Include the outcome of a single game in the statistics.
+
+        Parameters:
+            result (GameResult): The outcome to include.
+        """
+        self.games += 1
+        self.lengths[result.turns] += 1
+
+        if result.winner is None:
+            self.unfinished += 1
+        else:
+            self.wins[result.winner] += 1
+
+        for seat, amount in enumerate(result.hand_sizes):
+            self.cards_left[seat] += amount
+
+    def merge(self, other):
+        """
+        Include the statistics of another tournament result in this one.
+
+        Parameters:
+            other (TournamentResult): The statistics to include.
+        """
+        self.games += other.games
+        self.unfinished += other.unfinished
+        self.lengths.update(other.lengths)
+
+        for seat in range(len(self.wins)):
+            self.wins[seat] += other.wins[seat]
+            self.cards_left[seat] += other.cards_left[seat]
+
+    def average_length(self):
+        """
+        (float) Returns the mean amount of turns taken per game.
+        """
+        if self.games == 0:
+            return 0.0
+        return sum(turns * count for turns, count
+                   in self.lengths.items()) / self.games
+
+    def win_rates(self):
+        """
+        (list<float>) Returns the proportion of games won by each seat.
+        """
+        if self.games == 0:
+            return [0.0] * len(self.wins)
+        return [wins / self.games for wins in self.wins]
+
+
+def shard_seeds(seed, shards):
+    """
+    Derive an independent seed for each shard of a tournament.
+
+    Parameters:
+        seed (int): The seed of the whole tournament.
+        shards (int): The amount of shards to derive seeds for.
+
+    Returns:
+        (list<int>): A seed for each shard.
+    """
+    rng = random.Random(seed)
+    return [rng.getrandbits(64) for _ in range(shards)]
+
+
+def play_shard(shard):
+    """
+    Play a shard of games with a random number generator of its own.
+
+    Parameters:
+        shard (tuple<int, int, int, int>): The seed, amount of games,
+                                           player count and maximum turns.
+
+    Returns:
+        (TournamentResult): The statistics of the shard's games.
+    """
+    seed, games, player_count, max_turns = shard
+
+    result = TournamentResult(player_count)
+    for game in simulate(games, player_count, max_turns, rng=seed):
+        result.add_result(game)
+
+    return result
+
+
+def run_tournament(games, seed=0, workers=None, player_count=PLAYER_COUNT,
+                   max_turns=MAX_TURNS, shard_size=SHARD_SIZE):
+    """
+    Play a tournament of games across a pool of worker processes.
+
+    Parameters:
+        games (int): The amount of games to play.
+        seed (int): The seed the tournament is reproduced from.
+        workers (int): The amount of worker processes,
+                       if None, one per available core.
+        player_count (int): The amount of computer players in each game.
+        max_turns (int): The amount of turns after which a game is abandoned.
+        shard_size (int): The amount of games played by each shard.
+
+    Returns:
+        (TournamentResult): The merged statistics of every game.
+    """
+    sizes = [shard_size] * (games // shard_size)
+    if games % shard_size:
+        sizes.append(games % shard_size)
+
+    shards = [(shard_seed, size, player_count, max_turns)
+              for shard_seed, size in zip(shard_seeds(seed, len(sizes)), sizes)]
+
+    result = TournamentResult(player_count)
+    with Pool(workers or cpu_count()) as pool:
+        # merging in shard order keeps the result independent of scheduling
+        for shard_result in pool.imap(play_shard, shards):
+            result.merge(shard_result)
+
+    return result
+
+
+def main():
+    games = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+
+    start = time.perf_counter()
+    result = run_tournament(games, seed)
+    elapsed = time.perf_counter() - start
+
+    print(f"Played {result.games} games in {elapsed:.2f}s "
+          f"({result.games / elapsed:.0f} games/s)")
+    for seat, rate in enumerate(result.win_rates()):
+        print(f"Seat {seat}: {rate:.2%} wins, "
+              f"{result.cards_left[seat] / result.games:.2f} cards left")
+    print(f"Unfinished: {result.unfinished}")
+    print(f"Average length: {result.average_length():.1f} turns")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""
+UNO++ Vectorised Simulation
+
+Plays thousands of games of UNO++ in lockstep, storing the state of every
+game in NumPy arrays. Each call to VectorGames.step advances every unfinished
+game by one turn.
+
+Cards are represented by their kind, an index into KINDS, the distinct cards
+of build_deck(FULL_DECK) in order of their code. Hands are stored as counts
+of each kind, so the computer players choose the playable kind with the
+lowest index rather than the first playable card in their hand.
+LowestKindPlayer plays the same way in the object engine, which allows the
+two engines to be checked against each other turn for turn.
+"""
+import sys
+import time
+
+import numpy as np
+
+from a2 import ComputerPlayer, SkipCard, ReverseCard, Pickup2Card, Pickup4Card
+from a2_support import FULL_DECK_CODES, CARD_CODES, CARD_TYPES, MATCH_TABLE
+from a2_support import encode_card, decode_card, RecyclePolicy
+from simulation import PLAYER_COUNT, HAND_SIZE, MAX_TURNS, GameResult
+
+# type codes of KIND_TYPE
+SKIP, REVERSE, PICKUP2, PICKUP4 = (CARD_TYPES.index(card_type) for card_type
+                                   in (SkipCard, ReverseCard, Pickup2Card,
+                                       Pickup4Card))
+
+# the distinct cards of a full deck, ordered by their code
+KINDS = [decode_card(code) for code in sorted(set(FULL_DECK_CODES))]
+
+KIND_CODES = [encode_card(card) for card in KINDS]
+
+# KIND_OF_CODE[code] is the kind of the card with code, or -1
+KIND_OF_CODE = np.full(CARD_CODES, -1, dtype=np.int16)
+KIND_OF_CODE[KIND_CODES] = np.arange(len(KINDS))
+
+KIND_TYPE = np.array([CARD_TYPES.index(card.__class__) for card in KINDS],
+                     dtype=np.int8)
+KIND_PICKUP = np.array([card.get_pickup_amount() for card in KINDS],
+                       dtype=np.int8)
+
+# MATCHES[top, kind] is True iff a card of kind can be placed on top
+MATCHES = np.frombuffer(b"".join(MATCH_TABLE), dtype=np.uint8) \
+    .reshape(CARD_CODES, CARD_CODES)[np.ix_(KIND_CODES, KIND_CODES)] \
+    .astype(bool)
+
+DECK_KINDS = KIND_OF_CODE[list(FULL_DECK_CODES)]
+
+
+def card_kind(card):
+    """
+    (int) Returns the kind of a card.
+
+    Parameters:
+        card (Card): A card from a full deck.
+
+    Raises:
+        ValueError: If the card does not appear in a full deck.
+    """
+    kind = KIND_OF_CODE[encode_card(card)]
+    if kind < 0:
+        raise ValueError(f"{card!r} is not in a full deck")
+    return int(kind)
+
+
+class LowestKindPlayer(ComputerPlayer):
+    """
+    A computer player which plays the playable card of the lowest kind.
+
+    Plays the same moves as the computer players of VectorGames.
+    """
+    __slots__ = ()
+
+    def pick_card(self, putdown_pile):
+        """
+        Selects the playable card of the lowest kind and removes it from the
+        deck. Returns None when no card can be played.
+
+        Parameters:
+            putdown_pile (Deck): pile where the player has to play his cards
+        """
+        top = putdown_pile.top()
+        cards = self.get_deck().get_cards()
+
+        best = None
+        for i, card in enumerate(cards):
+            if card.matches(top):
+                kind = card_kind(card)
+                if best is None or kind < best[0]:
+                    best = (kind, i)
+
+        if best is None:
+            return None
+        return self.get_deck().pick_at(best[1])
+
+
+class VectorGames:
+    """
+    Many games of UNO++ between computer players, played in lockstep.
+    """
+    def __init__(self, pickup, player_count=PLAYER_COUNT,
+                 hand_size=HAND_SIZE, recycle=RecyclePolicy.fail, rng=None):
+        """
+        Deal games from the pickup piles of each game.
+
+        Dealing follows simulation.new_game: each player in turn picks a hand
+        off the top of the pile, then the next card starts the putdown pile.
+
+        Parameters:
+            pickup (np.ndarray): The kinds of cards in each game's pickup
+                                 pile, shape (games, cards), the top of each
+                                 pile being the last card.
+            player_count (int): The amount of players in each game.
+            hand_size (int): The amount of cards dealt to each player.
+            recycle (RecyclePolicy): What a game does when its pickup pile
+                                     runs out, as in UnoGame.
+            rng (np.random.Generator): The generator to recycle piles with.
+        """
+        games, cards = pickup.shape
+        rows = np.arange(games)
+
+        self.pickup = np.array(pickup, dtype=np.int16)
+        self.pickup_size = np.full(games, cards, dtype=np.int32)
+        self.hands = np.zeros((games, player_count, len(KINDS)),
+                              dtype=np.int16)
+        self.hand_sizes = np.zeros((games, player_count), dtype=np.int32)
+
+        for seat in range(player_count):
+            for _ in range(hand_size):
+                self.pickup_size -= 1
+                top = self.pickup[rows, self.pickup_size]
+                self.hands[rows, seat, top] += 1
+            self.hand_sizes[:, seat] = hand_size
+
+        self.pickup_size -= 1
+        self.top = self.pickup[rows, self.pickup_size].astype(np.int16)
+
+        # every card on the putdown and special piles, in the order played
+        self.played = np.zeros((games, cards), dtype=np.int16)
+        self.played[:, 0] = self.top
+        self.played_size = np.ones(games, dtype=np.int32)
+
+        self.location = np.zeros(games, dtype=np.int32)
+        self.direction = np.ones(games, dtype=np.int32)
+        self.turns = np.zeros(games, dtype=np.int32)
+        self.recycles = np.zeros(games, dtype=np.int32)
+        self.winner = np.full(games, -1, dtype=np.int32)
+        # a game is active until it is over or cannot continue
+        self.active = np.ones(games, dtype=bool)
+        # a game has failed if it ran out of cards with RecyclePolicy.fail
+        self.failed = np.zeros(games, dtype=bool)
+
+        self._players = player_count
+        self._recycle = recycle
+        self._rng = np.random.default_rng() if rng is None else rng
+
+    @classmethod
+    def shuffled(cls, games, rng, player_count=PLAYER_COUNT,
+                 hand_size=HAND_SIZE, recycle=RecyclePolicy.fail):
+        """
+        Construct games from independently shuffled full decks.
+
+        Parameters:
+            games (int): The amount of games to play.
+            rng (np.random.Generator): The generator to shuffle with.
+            player_count (int): The amount of players in each game.
+            hand_size (int): The amount of cards dealt to each player.
+            recycle (RecyclePolicy): What a game does when its pickup pile
+                                     runs out.
+
+        Returns:
+            (VectorGames): The dealt games.
+        """
+        pickup = rng.permuted(np.tile(DECK_KINDS, (games, 1)), axis=1)
+        return cls(pickup, player_count, hand_size, recycle, rng)
+
+    @classmethod
+    def from_pickup_piles(cls, piles, player_count=PLAYER_COUNT,
+                          hand_size=HAND_SIZE, recycle=RecyclePolicy.fail):
+        """
+        Construct games from undealt pickup piles of the object engine.
+
+        Parameters:
+            piles (list<Deck>): An undealt pickup pile for each game,
+                                all of the same size.
+            player_count (int): The amount of players in each game.
+            hand_size (int): The amount of cards dealt to each player.
+            recycle (RecyclePolicy): What a game does when its pickup pile
+                                     runs out.
+
+        Returns:
+            (VectorGames): The dealt games.
+        """
+        pickup = np.array([[card_kind(card) for card in pile.get_cards()]
+                           for pile in piles], dtype=np.int16)
+        return cls(pickup, player_count, hand_size, recycle)
+
+    def _recycle_piles(self, games):
+        """
+        Shuffle every played card, except the top of the putdown pile, back
+        into the pickup piles of some games, as UnoGame.recycle_piles does.
+        Games with no such cards are left unchanged.
+
+        Parameters:
+            games (np.ndarray): The indices of the games.
+        """
+        games = games[self.played_size[games] > 1]
+        if len(games) == 0:
+            return
+
+        pickup_size = self.pickup_size[games, None]
+        played_size = self.played_size[games, None]
+        pickup_width = int(pickup_size.max())
+        played_width = int(played_size.max())
+        rows = np.arange(len(games))[:, None]
+
+        # the top card stays on the putdown pile, as its last played copy
+        played = self.played[games, :played_width]
+        in_pile = np.arange(played_width) < played_size
+        is_top = (played == self.top[games, None]) & in_pile
+        keep = played_width - 1 - is_top[:, ::-1].argmax(axis=1)
+        in_pile[rows[:, 0], keep] = False
+
+        # each game's cards are padded to the widest game, and shuffled by
+        # sorting random keys, with the padding's keys sorted last
+        cards = np.concatenate((self.pickup[games, :pickup_width], played),
+                               axis=1)
+        valid = np.concatenate((np.arange(pickup_width) < pickup_size,
+                                in_pile), axis=1)
+        keys = self._rng.random(cards.shape)
+        keys[~valid] = 2.0
+        order = np.argsort(keys, axis=1)
+
+        sizes = pickup_size[:, 0] + played_size[:, 0] - 1
+        width = int(sizes.max())
+        self.pickup[games, :width] = cards[rows, order[:, :width]]
+        self.pickup_size[games] = sizes
+        self.played[games, 0] = self.top[games]
+        self.played_size[games] = 1
+
+        self.recycles[games] += 1
+
+    def _pickup(self, games, seats, amount):
+        """
+        Move cards from the pickup piles into the hands of players.
+
+        Games without enough cards to pickup follow their recycle policy, as
+        UnoGame.pickup does.
+
+        Parameters:
+            games (np.ndarray): The indices of the games.
+            seats (np.ndarray): The seat picking up in each game.
+            amount (int): The amount of cards to pickup.
+        """
+        short = self.pickup_size[games] < amount
+        if short.any():
+            if self._recycle is RecyclePolicy.reshuffle:
+                self._recycle_piles(games[short])
+            else:
+                self.active[games[short]] = False
+                self.failed[games[short]] = \
+                    self._recycle is RecyclePolicy.fail
+                games = games[~short]
+                seats = seats[~short]
+
+        # a pile still short after recycling gives up the cards it has
+        amounts = np.minimum(self.pickup_size[games], amount)
+        for picked in range(amount):
+            some = amounts > picked
+            if not some.all():
+                games, seats, amounts = games[some], seats[some], amounts[some]
+            self.pickup_size[games] -= 1
+            kinds = self.pickup[games, self.pickup_size[games]]
+            self.hands[games, seats, kinds] += 1
+            self.hand_sizes[games, seats] += 1
+
+    def step(self, max_turns=MAX_TURNS):
+        """
+        Take a turn in every active game.
+
+        Parameters:
+            max_turns (int): The amount of turns after which a game is
+                             abandoned.
+
+        Returns:
+            (int): The amount of games still active after this turn.
+        """
+        self.active &= self.turns < max_turns
+        games = np.flatnonzero(self.active)
+        if len(games) == 0:
+            return 0
+
+        players = self._players
+        direction = self.direction[games]
+        location = (self.location[games] + direction) % players
+        self.location[games] = location
+        stepped = games
+
+        playable = (self.hands[games, location] > 0) & MATCHES[self.top[games]]
+        plays = playable.any(axis=1)
+        kinds = playable.argmax(axis=1)
+
+        # players with no playable card pickup a single card
+        self._pickup(games[~plays], location[~plays], 1)
+
+        games = games[plays]
+        location = location[plays]
+        direction = direction[plays]
+        kinds = kinds[plays]
+        types = KIND_TYPE[kinds]
+
+        self.hands[games, location, kinds] -= 1
+        self.hand_sizes[games, location] -= 1
+
+        skips = types == SKIP
+        self.location[games[skips]] = (location[skips] + direction[skips]) \
+            % players
+
+        reverses = types == REVERSE
+        self.direction[games[reverses]] = -direction[reverses]
+
+        for card_type in (PICKUP2, PICKUP4):
+            pickups = types == card_type
+            if pickups.any():
+                nexts = (location[pickups] + direction[pickups]) % players
+                self._pickup(games[pickups], nexts,
+                             int(KIND_PICKUP[kinds[pickups][0]]))
+
+        # pickup 4 cards are placed on the special pile
+        putdown = types != PICKUP4
+        self.top[games[putdown]] = kinds[putdown]
+        self.played[games, self.played_size[games]] = kinds
+        self.played_size[games] += 1
+
+        won = (self.hand_sizes[games, location] == 0) & ~self.failed[games]
+        self.winner[games[won]] = location[won]
+        self.active[games[won]] = False
+
+        # turns which ran out of cards to pickup are not counted
+        self.turns[stepped[~self.failed[stepped]]] += 1
+
+        return int(self.active.sum())
+
+    def play(self, max_turns=MAX_TURNS):
+        """
+        Take turns until every game has finished or been abandoned.
+
+        Parameters:
+            max_turns (int): The amount of turns after which a game is
+                             abandoned.
+        """
+        while self.step(max_turns):
+            pass
+
+    def results(self):
+        """
+        (list<GameResult>) Returns the outcome of every game.
+        """
+        return [GameResult(None if winner < 0 else winner, turns,
+                           tuple(sizes))
+                for winner, turns, sizes in zip(self.winner.tolist(),
+                                                self.turns.tolist(),
+                                                self.hand_sizes.tolist())]
+
+
+def simulate(games, player_count=PLAYER_COUNT, max_turns=MAX_TURNS,
+             seed=None, recycle=RecyclePolicy.reshuffle):
+    """
+    Play many games between computer players in lockstep.
+
+    Parameters:
+        games (int): The amount of games to play.
+        player_count (int): The amount of computer players in each game.
+        max_turns (int): The amount of turns after which a game is abandoned.
+        seed (int): The seed to shuffle decks with.
+        recycle (RecyclePolicy): What a game does when its pickup pile runs out.
+
+    Returns:
+        (VectorGames): The played games.
+    """
+    vector = VectorGames.shuffled(games, np.random.default_rng(seed),
+                                  player_count, recycle=recycle)
+    vector.play(max_turns)
+    return vector
+
+
+def main():
+    games = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    start = time.perf_counter()
+    vector = simulate(games)
+    elapsed = time.perf_counter() - start
+
+    print(f"Played {games} games in {elapsed:.2f}s "
+          f"({games / elapsed:.0f} games/s)")
+    for seat in range(PLAYER_COUNT):
+        print(f"Seat {seat}: {(vector.winner == seat).sum()} wins")
+    print(f"Unfinished: {(vector.winner < 0).sum()}")
+
+
+if __name__ == "__main__":
+    main()